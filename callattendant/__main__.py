@@ -15,6 +15,11 @@ def main():
     currentdir = os.path.dirname(os.path.realpath(__file__))
     sys.path.append(currentdir)
 
+    # Time the application's imports, too
+    if "--profile-startup" in sys.argv:
+        from profiling import startup
+        startup.start()
+
     # Launch the app with the command line args.
     from app import main
     sys.exit(main(sys.argv))
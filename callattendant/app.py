@@ -26,51 +26,107 @@
 #import pydevd_pycharm
 #pydevd_pycharm.settrace('m4800', port=6969, stdoutToServer=True, stderrToServer=True)
 
+import logging
 import os
 import sys
 import queue
 import signal
-import sqlite3
+import threading
 import time
 
 from datetime import datetime
-from pprint import pprint
+from functools import partial
+from pprint import pformat
 from shutil import copyfile
 
+import database
 from config import Config
+from eventbus import event_bus
+from logconfig import get_logger, setup_logging, shutdown_logging
 from screening.calllogger import CallLogger
+from screening.callrate import CallRateDetector
 from screening.callscreener import CallScreener
+from screening.calltiming import CallTimer, CallTiming
+from screening.dataversion import DASHBOARD_TABLES, install_version_triggers
 from hardware.modem import Modem
 from messaging.voicemail import VoiceMail
-import userinterface.webapp as webapp
+from postcall import PostCallExecutor
+from profiling import startup
 from screening.nextcall import NextCall
+from screening.verdictcache import VerdictCache
+
+log = get_logger("app")
+
+
+class CallLine(object):
+    """
+    A phone line: the modem attached to the line, the queue of incoming
+    callers from the modem, the line's settings and its call statistics.
+    """
+
+    def __init__(self, number, config, modem, voice_mail):
+        """
+        Constructor.
+            :param number:
+                The line number, starting at 1
+            :param config:
+                The line's config object, i.e., the application config
+                with the line's MODEM_LINES overrides applied
+            :param modem:
+                The modem attached to the line
+            :param voice_mail:
+                The voice mail interface that uses the line's modem
+        """
+        self.number = number
+        self.name = config.get("LINE_NAME") or "Line {}".format(number)
+        self.config = config
+        self.modem = modem
+        self.voice_mail = voice_mail
+        self.caller_queue = queue.Queue()
+        self.exit_code = 0
+        self._thread = None
+
+        # Per-line metrics
+        self.stats = {
+            "calls": 0,
+            "permitted": 0,
+            "screened": 0,
+            "blocked": 0,
+            "answered": 0,
+            "ignored": 0,
+            "errors": 0,
+            "last_call": None,
+        }
 
 
 class CallAttendant(object):
     """The CallAttendant provides call logging and call screening services."""
 
-    def __init__(self, config):
+    def __init__(self, config, start_webapp=True):
         """
         The constructor initializes and starts the Call Attendant.
             :param config:
                 the application config dict
+            :param start_webapp:
+                if False, the webapp is not started, e.g., when benchmarking
         """
         # The application-wide configuration
         self.config = config
 
-        # Thread synchonization object
-        self._stop_flag = False
+        # Thread synchonization objects
+        self._stop_event = threading.Event()
+        self._next_call_lock = threading.Lock()
 
-        # Open the database
+        # Open the database. The connection is shared with worker threads, e.g.,
+        # the phone lines and the voice mail audio processor, which hold its lock while using it.
         if self.config["TESTING"]:
-            self.db = sqlite3.connect(":memory:")
+            self.db = database.connect(":memory:")
         else:
-            self.db = sqlite3.connect(self.config['DB_FILE'])
-
-        # Create a synchronized queue for incoming callers from the modem
-        self._caller_queue = queue.Queue()
+            self.db = database.connect(self.config['DB_FILE'])
+        startup.mark("database")
 
         #  Hardware subsystem
+        self.mqtt_client = None
         status_indicators = self.config["STATUS_INDICATORS"]
         if status_indicators == "GPIO":
             from hardware.indicators import ApprovedIndicator, BlockedIndicator
@@ -85,13 +141,16 @@ class CallAttendant(object):
             from hardware.mqttindicators import MQTTIndicator, MQTTIndicatorClient
             #  Initialize the MQTT client
             try:
-                MQTTIndicatorClient(self.config['MQTT_BROKER'],
+                self.mqtt_client = MQTTIndicatorClient(self.config['MQTT_BROKER'],
                                 port=self.config['MQTT_PORT'],
                                 topic_prefix=self.config['MQTT_TOPIC_PREFIX'],
                                 username=self.config['MQTT_USERNAME'],
-                                password=self.config['MQTT_PASSWORD'])
+                                password=self.config['MQTT_PASSWORD'],
+                                qos=self.config['MQTT_QOS'],
+                                retain=self.config['MQTT_RETAIN'],
+                                queue_size=self.config['MQTT_QUEUE_SIZE'])
             except KeyError as e:
-                print("MQTT Indicator configuration missing: {}".format(e))
+                log.critical("MQTT Indicator configuration missing: %s", e)
                 sys.exit(1)
 
             self.approved_indicator = MQTTIndicator('Approved')
@@ -100,188 +159,359 @@ class CallAttendant(object):
             from hardware.nullgpio import DummyLED
             self.approved_indicator = DummyLED('Approved')
             self.blocked_indicator = DummyLED('Blocked')
-
-        #  Create (and open) the modem
-        self.modem = Modem(self.config)
-        self.config["MODEM_ONLINE"] = self.modem.is_open  # signal the webapp not online
-
-        # Screening subsystem
-        self.logger = CallLogger(self.db, self.config)
-        self.screener = CallScreener(self.db, self.config)
+        startup.mark("indicators")
+
+        #  Create (and open) a modem for each phone line. The first line
+        #  uses the top-level settings when MODEM_LINES is not specified.
+        line_configs = [self.config.for_line(overrides) for overrides in self.config["MODEM_LINES"]]
+        if not line_configs:
+            line_configs = [self.config]
+        modems = [Modem(line_config) for line_config in line_configs]
+        self.modem = modems[0]
+        self.config["MODEM_ONLINE"] = all(modem.is_open for modem in modems)  # signal the webapp not online
+        startup.mark("modems")
+
+        # Worker pool for the work deferred until the line is free
+        self.post_call = PostCallExecutor(self.config)
+
+        # Screening subsystem: shared by all the lines
+        self.call_rate = CallRateDetector(self.config)
+        self.logger = CallLogger(self.db, self.config, self.call_rate)
+        self.call_rate.load(self.db)
+        self.call_timing = CallTiming(self.db, self.config)
+        self.screener = CallScreener(self.db, self.config, self.call_rate)
         self.nextcall = NextCall(self.config)
+        self.verdict_cache = VerdictCache(self.db, self.config)
+        startup.mark("screening")
 
-        # Messaging subsystem
+        # Messaging subsystem: the other lines share the first line's messages and indicators
         self.voice_mail = VoiceMail(self.db, self.config, self.modem)
 
+        self.lines = [CallLine(1, line_configs[0], self.modem, self.voice_mail)]
+        for n, modem in enumerate(modems[1:], start=2):
+            self.lines.append(CallLine(n, line_configs[n - 1], modem, self.voice_mail.for_modem(modem)))
+
+        # Count the changes to the tables cached by the webapp's dashboard
+        install_version_triggers(self.db, DASHBOARD_TABLES)
+        startup.mark("messaging")
+
         # Start the User Interface subsystem (Flask)
         # Skip if we're running functional tests, because when testing
         # we use a memory database which can't be shared between threads.
-        if not self.config["TESTING"]:
-            print("Starting the Flask webapp")
-            webapp.start(self.config)
-
-    def handle_caller(self, caller):
+        self.webapp_server = None
+        if start_webapp and not self.config["TESTING"]:
+            log.info("Starting the Flask webapp")
+            # Imported here, after the modem is open: Flask and its extensions are slow to load
+            import userinterface.webapp as webapp
+            self.webapp_server = webapp.start(self.config)
+            startup.mark("webapp")
+
+    def handle_caller(self, caller, line=None):
         """
         A callback function used by the modem that places the given
-        caller object into the synchronized queue for processing by the
-        run method.
+        caller object into the line's synchronized queue for processing
+        by the line's worker.
             :param caller:
                 a dict object with caller ID information
+            :param line:
+                the CallLine that received the call; defaults to the first line
         """
-        if self.config["DEBUG"]:
-            print("Adding to caller queue:")
-            pprint(caller)
-        self._caller_queue.put(caller)
+        line = line or self.lines[0]
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("Adding to %s caller queue:\n%s", line.name, pformat(caller))
+        line.caller_queue.put(caller)
 
     def run(self):
         """
         Processes incoming callers by logging, screening, blocking
-        and/or recording messages.
+        and/or recording messages. Each line is processed by its own
+        worker so that a call on one line never delays another line.
+        The first line is processed in the calling thread.
             :returns: exit code 1 on error otherwise 0
         """
-        # Get relevant config settings
-        screening_mode = self.config['SCREENING_MODE']
-        blocked = self.config.get_namespace("BLOCKED_")
-        screened = self.config.get_namespace("SCREENED_")
-        permitted = self.config.get_namespace("PERMITTED_")
-        blocked_greeting_file = blocked['greeting_file']
-        screened_greeting_file = screened['greeting_file']
-        permitted_greeting_file = permitted['greeting_file']
-
-        # Instruct the modem to start feeding calls into the caller queue
-        self.modem.start(self.handle_caller)
+        # Instruct the modems to start feeding calls into the caller queues
+        for line in self.lines:
+            line.modem.start(partial(self.handle_caller, line=line))
 
         # If testing, allow queue to be filled before processing for clean, readable logs
         if self.config["TESTING"]:
             time.sleep(1)
 
-        # Process incoming calls
-        exit_code = 0
-        caller = {}
         # Blink to confirm we have started
         self.approved_indicator.blink(2)
-        signal.signal(signal.SIGTERM, lambda sig, frame: self.set_stop_flag())
+        # Signal handlers can only be installed by the main thread
+        if threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGTERM, lambda sig, frame: self.set_stop_flag())
+
+        for line in self.lines[1:]:
+            line._thread = threading.Thread(target=self._line_worker, args=(line,))
+            line._thread.name = "call_line_{}".format(line.number)
+            line._thread.start()
+
+        exit_code = self._process_calls(self.lines[0])
+
+        # Stop the other lines when the first line exits
+        self._stop_lines()
+        for line in self.lines[1:]:
+            line._thread.join()
+            exit_code = max(exit_code, line.exit_code)
+
+        return exit_code
+
+    def _line_worker(self, line):
+        """
+        Thread function that processes the incoming callers on a line.
+            :param line:
+                the CallLine to process
+        """
+        line.exit_code = self._process_calls(line)
 
-        print("Waiting for call...", flush=True)
-        while not self._stop_flag:
+    def _process_calls(self, line):
+        """
+        Processes the incoming callers on the given line until stopped.
+            :param line:
+                the CallLine to process
+            :returns: exit code 1 on error otherwise 0
+        """
+        # Get relevant config settings
+        screening_mode = self.config['SCREENING_MODE']
+        blocked = line.config.get_namespace("BLOCKED_")
+        screened = line.config.get_namespace("SCREENED_")
+        permitted = line.config.get_namespace("PERMITTED_")
+
+        exit_code = 0
+        caller = {}
+        log.info("Waiting for call on %s...", line.name)
+        while not self._stop_event.is_set():
             try:
                 # Wait (blocking) for a caller
                 try:
-                    caller = self._caller_queue.get()
+                    caller = line.caller_queue.get(True, 1.0)
                 except queue.Empty:
                     continue
                 # if caller data is empty, we exit the loop
                 if caller == {}:
                     break
 
+                # Record the call's timeline, starting with the modem's timestamps
+                timer = CallTimer()
+                if "RING_TIME" in caller:
+                    timer.mark("ring", caller["RING_TIME"])
+                    timer.mark("cid", caller["CID_TIME"])
+                timer.mark("dequeue")
+
                 # An incoming call has occurred, log it
                 number = caller["NMBR"]
-                print("Incoming call from {}".format(number))
-
-                # Vars used in the call screening
-                caller_permitted = False
-                caller_screened = False
-                caller_blocked = False
-                action = ""
-                reason = ""
-
-                # Check the Next Call Permitted
-                print("> Checking next-call-permitted")
-                if self.nextcall.is_next_call_permitted():
-                    # Reset the flag
-                    self.nextcall.toggle_next_call_permitted()
-                    caller_permitted = True
-                    action = "Permitted"
-                    reason = "Next Caller Flag"
-                    self.approved_indicator.blink()
-
-                # Check the whitelist
-                if not caller_permitted and "whitelist" in screening_mode:
-                    print("> Checking whitelist(s)")
-                    is_whitelisted, reason = self.screener.is_whitelisted(caller)
-                    if is_whitelisted:
-                        caller_permitted = True
-                        action = "Permitted"
-                        self.approved_indicator.blink()
-
-                # Now check the blacklist if not preempted by whitelist
-                if not caller_permitted and "blacklist" in screening_mode:
-                    print("> Checking blacklist(s)")
-                    is_blacklisted, reason = self.screener.is_blacklisted(caller)
-                    if is_blacklisted:
-                        caller_blocked = True
-                        action = "Blocked"
-                        self.blocked_indicator.blink()
-
-                if not caller_permitted and not caller_blocked:
-                    caller_screened = True
-                    action = "Screened"
+                log.info("Incoming call on %s from %s", line.name, number)
+                line.stats["calls"] += 1
+                line.stats["last_call"] = datetime.now()
+                self.publish_line_state(line, "screening", caller)
+
+                # Screen the caller
+                action, reason = self.screen_caller(caller, screening_mode, timer)
+                line.stats[action.lower()] += 1
 
                 # Log every call to the database (and console)
                 call_no = self.logger.log_caller(caller, action, reason)
-                print("--> {} {}: {}".format(number, action, reason))
+                timer.mark("logged")
+                log.info("--> %s %s: %s", number, action, reason)
 
                 # Gather the data used to answer the call
-                if caller_permitted:
-                    actions = permitted["actions"]
-                    greeting = permitted_greeting_file
-                    rings_before_answer = permitted["rings_before_answer"]
-                elif caller_screened:
-                    actions = screened["actions"]
-                    greeting = screened_greeting_file
-                    rings_before_answer = screened["rings_before_answer"]
-                elif caller_blocked:
-                    actions = blocked["actions"]
-                    greeting = blocked_greeting_file
-                    rings_before_answer = blocked["rings_before_answer"]
+                if action == "Permitted":
+                    settings = permitted
+                elif action == "Screened":
+                    settings = screened
+                else:
+                    settings = blocked
+                actions = settings["actions"]
+                greeting = settings["greeting_file"]
+                rings_before_answer = settings["rings_before_answer"]
 
                 # Waits for the callee to answer the phone, if configured to do so.
-                ok_to_answer = self.wait_for_rings(rings_before_answer)
+                ok_to_answer = self.wait_for_rings(rings_before_answer, line)
 
                 # Answer the call!
                 if ok_to_answer and "answer" in actions:
-                    self.answer_call(actions, greeting, call_no, caller)
+                    line.stats["answered"] += 1
+                    self.publish_line_state(line, "answered", caller)
+                    self.answer_call(actions, greeting, call_no, caller, line, timer)
                 else:
+                    line.stats["ignored"] += 1
                     self.ignore_call(caller)
+                self.publish_line_state(line, "idle")
+                self.call_timing.record(call_no, timer)
 
-                print("Waiting for next call...", flush=True)
+                if log.isEnabledFor(logging.DEBUG):
+                    stats = self.post_call.get_stats()
+                    log.debug("Post-call queue depth: %d, avg latency: %.3fs",
+                              stats["queue_depth"], stats["avg_latency"])
+                log.info("Waiting for next call on %s...", line.name)
 
             except KeyboardInterrupt:
-                print("** User initiated shutdown")
+                log.warning("** User initiated shutdown")
                 break
             except Exception as e:
-                pprint(e)
-                print("** Error running callattendant")
+                log.exception("** Error running callattendant on %s: %s", line.name, e)
+                line.stats["errors"] += 1
                 exit_code = 1
                 break
 
         return exit_code
 
+    def screen_caller(self, caller, screening_mode, timer=None):
+        """
+        Screens the caller with the next-call flag, the whitelist and the
+        blacklist, and flashes the corresponding indicator.
+            :param caller:
+                The caller ID data
+            :param screening_mode:
+                The SCREENING_MODE setting
+            :param timer:
+                The optional CallTimer that records the screening stages
+            :return:
+                action ("Permitted", "Blocked" or "Screened"), reason
+        """
+        # Check the Next Call Permitted; only one line may consume the flag
+        timer = timer or CallTimer()
+        log.debug("> Checking next-call-permitted")
+        with self._next_call_lock:
+            next_call_permitted = self.nextcall.is_next_call_permitted()
+            if next_call_permitted:
+                # Reset the flag
+                self.nextcall.toggle_next_call_permitted()
+                event_bus.publish("permit_next", {"on": False})
+        timer.mark("next_call")
+        if next_call_permitted:
+            self.post_call.submit(self.approved_indicator.blink)
+            return "Permitted", "Next Caller Flag"
+
+        # A repeat caller is decided by the cached verdict
+        verdict = self.verdict_cache.get(caller)
+        if verdict is not None:
+            log.debug("> Using the cached verdict")
+        else:
+            verdict = self.check_lists(caller, screening_mode, timer)
+            self.verdict_cache.put(caller, verdict)
+
+        action, reason = verdict
+
+        # An unknown caller calling too often is blocked while the rate is high
+        if action == "Screened" and "blacklist" in screening_mode:
+            is_flood, flood_reason = self.screener.is_call_flood(caller)
+            if is_flood:
+                action, reason = "Blocked", flood_reason
+
+        if action == "Permitted":
+            self.post_call.submit(self.approved_indicator.blink)
+        elif action == "Blocked":
+            self.post_call.submit(self.blocked_indicator.blink)
+        return action, reason
+
+    def check_lists(self, caller, screening_mode, timer):
+        """
+        Screens the caller with the whitelist and the blacklist.
+            :param caller:
+                The caller ID data
+            :param screening_mode:
+                The SCREENING_MODE setting
+            :param timer:
+                The CallTimer that records the screening stages
+            :return:
+                action ("Permitted", "Blocked" or "Screened"), reason
+        """
+        # Check the whitelist
+        if "whitelist" in screening_mode:
+            log.debug("> Checking whitelist(s)")
+            is_whitelisted, reason = self.screener.is_whitelisted(caller, timer)
+            if is_whitelisted:
+                return "Permitted", reason
+
+        # Now check the blacklist if not preempted by whitelist
+        if "blacklist" in screening_mode:
+            log.debug("> Checking blacklist(s)")
+            is_blacklisted, reason = self.screener.is_blacklisted(caller, timer)
+            if is_blacklisted:
+                return "Blocked", reason
+
+        return "Screened", ""
+
+    def publish_line_state(self, line, state, caller=None, **data):
+        """
+        Publishes a line's state, e.g., "screening" or "idle", to the web pages.
+            :param line:
+                the CallLine
+            :param state:
+                "screening", "ringing", "answered" or "idle"
+            :param caller:
+                the optional caller ID data of the call on the line
+            :param data:
+                additional event data, e.g., the ring count
+        """
+        data.update(line=line.number, name=line.name, state=state)
+        if caller is not None:
+            data.update(caller_name=caller["NAME"], number=caller["NMBR"])
+        event_bus.publish("line", data)
+
     def set_stop_flag(self):
         """
         Called by the signal handler (SIGTERM) to set the stop flag.
         Systemd uses signal to shutdown the service.
         """
-        print("** Received SIGTERM")
-        self._stop_flag = True
-        self._caller_queue.put({})
+        log.warning("** Received SIGTERM")
+        self._stop_lines()
+
+    def _stop_lines(self):
+        """
+        Signals the line workers to stop and wakes them up.
+        """
+        self._stop_event.set()
+        for line in self.lines:
+            line.caller_queue.put({})
+
+    def get_post_call_stats(self):
+        """
+        Returns the post-call executor's queue depth, task counts and latencies.
+        """
+        return self.post_call.get_stats()
+
+    def get_verdict_cache_stats(self):
+        """
+        Returns the verdict cache's hit, miss and invalidation counts.
+        """
+        return self.verdict_cache.get_stats()
+
+    def get_line_stats(self):
+        """
+        Returns the call statistics for each line.
+            :return:
+                a list of dicts with the line number, name and stats
+        """
+        return [dict(line.stats, line=line.number, name=line.name) for line in self.lines]
 
     def shutdown(self):
         """
         Shuts down threads and releases resources.
         """
-        print("Shutting down...")
-        self._stop_flag = True
-        print("-> Stopping modem")
-        self.modem.stop()
-        print("-> Stopping voice mail")
+        log.info("Shutting down...")
+        self._stop_lines()
+        log.info("-> Stopping modem")
+        for line in self.lines:
+            line.modem.stop()
+        log.info("-> Stopping voice mail")
         self.voice_mail.stop()
-        print("-> Releasing resources")
+        log.info("-> Finishing post-call tasks")
+        self.post_call.shutdown()
+        if self.webapp_server is not None:
+            log.info("-> Stopping webapp")
+            self.webapp_server.stop()
+        log.info("-> Releasing resources")
         self.approved_indicator.close()
         self.blocked_indicator.close()
-        print("Shutdown finished")
+        if self.mqtt_client is not None:
+            self.mqtt_client.close()
+        log.info("Shutdown finished")
 
-    def answer_call(self, actions, greeting, call_no, caller):
+    def answer_call(self, actions, greeting, call_no, caller, line=None, timer=None):
         """
         Answer the call with the supplied actions, e.g, voice mail,
         record message, or simply pickup and hang up.
@@ -293,37 +523,49 @@ class CallAttendant(object):
                 The unique call number identifying this call
             :param caller:
                 The caller ID data
+            :param line:
+                The CallLine that received the call; defaults to the first line
+            :param timer:
+                The optional CallTimer that records the answer and first audio times
         """
+        line = line or self.lines[0]
+        modem = line.modem
+        voice_mail = line.voice_mail
+        timer = timer or CallTimer()
+
         # Go "off-hook" - Acquires a lock on the modem - MUST follow with hang_up()
-        if self.modem.pick_up():
+        if modem.pick_up():
+            timer.mark("answered")
             try:
                 # Play greeting
                 if "greeting" in actions:
-                    print(">> Playing greeting...", flush=True)
-                    success, retval = self.modem.play_audio(greeting)
+                    log.info(">> Playing greeting...")
+                    success, retval = modem.play_audio(greeting)
+                    if modem.audio_started is not None and modem.audio_started > timer.marks["answered"]:
+                        timer.mark("first_audio", modem.audio_started)
                     if not success or (retval == 'off-hook'):
                         return
 
                 # Record message
                 if "record_message" in actions:
-                    print(">> Recording message...", flush=True)
-                    self.voice_mail.record_message(call_no, caller)
-                    self.voice_mail.message_event.set()
+                    log.info(">> Recording message...")
+                    voice_mail.record_message(call_no, caller)
+                    voice_mail.message_event.set()
                     return
 
                 # Enter voice mail menu
                 elif "voice_mail" in actions:
-                    print(">> Starting voice mail...", flush=True)
+                    log.info(">> Starting voice mail...")
                     # Message indicator is reset by message_menu()
-                    self.voice_mail.voice_messaging_menu(call_no, caller)
+                    voice_mail.voice_messaging_menu(call_no, caller)
                     return
 
             except Exception as e:
-                print("** Error answering a call: {}".format(e))
+                log.error("** Error answering a call: %s", e)
 
             finally:
                 # Go "on-hook"
-                self.modem.hang_up()
+                modem.hang_up()
 
     def ignore_call(self, caller):
         """
@@ -333,15 +575,19 @@ class CallAttendant(object):
         """
         pass
 
-    def wait_for_rings(self, rings_before_answer):
+    def wait_for_rings(self, rings_before_answer, line=None):
         """
         Waits for the given number of rings to occur.
         :param rings_before_answer:
             the number of rings to wait for.
+        :param line:
+            the CallLine that received the call; defaults to the first line
         :return:
             True if the ring count meets or exceeds the rings before answer;
             False if the rings stop or if another call comes in.
         """
+        line = line or self.lines[0]
+
         # In North America, the standard ring cadence is "2-4", or two seconds
         # of ringing followed by four seconds of silence (33% Duty Cycle).
         RING_CADENCE = 6.0  # secs
@@ -350,23 +596,24 @@ class CallAttendant(object):
         ring_count = 1  # Already had at least 1 ring to get here
         last_ring = datetime.now()
         while ring_count < rings_before_answer:
-            if not self._caller_queue.empty():
+            if not line.caller_queue.empty():
                 # Skip this call and process the next one
-                print(" > > > Another call has come in")
+                log.info(" > > > Another call has come in")
                 ok_to_answer = False
                 break
             # Wait for a ring
-            elif self.modem.ring_event.wait(1.0):
+            elif line.modem.ring_event.wait(1.0):
                 # Increment the ring count and time of last ring
                 ring_count += 1
                 last_ring = datetime.now()
-                print(" > > > Ring count: {}".format(ring_count))
-                self.modem.ring_event.clear()
+                log.info(" > > > Ring count: %d", ring_count)
+                self.publish_line_state(line, "ringing", rings=ring_count)
+                line.modem.ring_event.clear()
             # On wait timeout, test for ringing stopped
             elif (datetime.now() - last_ring).total_seconds() > RING_WAIT_SECS:
                 # Assume ringing has stopped before the ring count
                 # was reached because either the callee answered or caller hung up.
-                print(" > > > Ringing stopped: Caller hung up or callee answered")
+                log.info(" > > > Ringing stopped: Caller hung up or callee answered")
                 ok_to_answer = False
                 break
         return ok_to_answer
@@ -436,16 +683,6 @@ def init_data_path(config):
         print("The VOICE_MAIL_MESSAGE_FOLDER folder is not present. Creating {}".format(msgpath))
         os.mkdir(msgpath)
 
-    # Create a softlink/symlink to messages within the static folder
-    # so that the HTML pages have access to the .wav files
-    symlink_path = os.path.join(config.root_path, "userinterface/static/messages")
-
-    # TODO validate and/or delete the existing link and then create a new one for this session
-    # TODO could use os.readlink to test the viability of the symlink in case the data_path moved
-    if not os.path.exists(symlink_path):
-        print("The VOICE_MAIL_MESSAGE_FOLDER symlink is not present. Creating {} symlink".format(symlink_path))
-        os.symlink(config["VOICE_MAIL_MESSAGE_FOLDER"], symlink_path)
-
     # Create folder for recorded notifications (populate default from kit "resources")
     wavpath = config["NOTIFICATIONS_FOLDER"]
     if not os.path.isdir(wavpath):
@@ -459,15 +696,18 @@ def get_args(argv):
         :return:
             string: config filename,
             string: datapath folder,
-            boolean: create folder flag
+            boolean: create folder flag,
+            boolean: profile startup flag
     """
     import sys
     import getopt
     config_file = None
     data_path = None
     create_folder = False
+    profile_startup = False
     try:
-        opts, args = getopt.getopt(argv[1:], "hc:d:f", ["help", "config=", "data-path=", "create-folder"])
+        opts, args = getopt.getopt(argv[1:], "hc:d:f",
+                                   ["help", "config=", "data-path=", "create-folder", "profile-startup"])
         if args:
             raise getopt.GetoptError("unhandled arguments: {}".format(args))
     except getopt.GetoptError as e:
@@ -484,10 +724,12 @@ def get_args(argv):
             data_path = arg
         elif opt in ("-f", "--create-folder"):
             create_folder = True
+        elif opt == "--profile-startup":
+            profile_startup = True
         else:
             raise RuntimeError("Invalid command line option: {} {}".format(opt, arg))
 
-    return config_file, data_path, create_folder
+    return config_file, data_path, create_folder, profile_startup
 
 
 def show_syntax():
@@ -499,6 +741,7 @@ def show_syntax():
     print("-c, --config [FILE]\t\t load a python configuration file")
     print("-d, --data-path [FOLDER]\t path to data and configuration files")
     print("-f, --create-folder\t\t create the data-path folder if it does not exist")
+    print("--profile-startup\t\t report the time spent in each startup phase and import")
     print("-h, --help\t\t\t displays this help text")
 
 
@@ -509,7 +752,11 @@ def main(argv):
             The command line arguments, e.g., --config [FILE] --data-path [FOLDER]
     """
     # Process command line arguments
-    config_file, data_path, create_folder = get_args(argv)
+    config_file, data_path, create_folder, profile_startup = get_args(argv)
+    if profile_startup:
+        # Already started by __main__ if the imports are to be timed
+        startup.start()
+        startup.mark("imports")
     print("Command line options:")
     print("  --config={}".format(config_file))
     print("  --data-path={}".format(data_path))
@@ -517,19 +764,28 @@ def main(argv):
 
     # Create the application-wide config dict
     config = make_config(config_file, data_path, create_folder)
+    startup.mark("config")
 
     # Ensure all specified files exist and that values are conformant
     if not config.validate():
         print("ERROR: Configuration is invalid. Please check {}".format(config_file))
         return 1
 
+    # Log from a background thread from here on
+    setup_logging(config)
+    startup.mark("logging")
+
     # Create and start the application
     app = CallAttendant(config)
+    if profile_startup:
+        startup.stop()
+        print(startup.report())
     exit_code = 0
     try:
         exit_code = app.run()
     finally:
         app.shutdown()
+        shutdown_logging()
     return exit_code
 
 
@@ -0,0 +1,276 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#  benchmark.py
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+
+
+# ==============================================================================
+# Replays recorded or synthetic modem transcripts through the call pipeline:
+# the Modem's call handler, CallAttendant.run, the screener and the logger.
+# The modem is simulated on a pseudo-terminal with an accelerated clock, and
+# the calls are logged to an on-disk database. The throughput and the per-stage
+# latency percentiles come from the CallTiming table.
+#
+# Usage: python benchmark.py [--calls N] [--transcript FILE] [--repeat N]
+#                            [--speed N] [--data-path FOLDER] [--config FILE]
+#
+# A transcript file contains the modem output, one line per line, in the
+# format of TEST_DATA in modem.py; blank lines are pauses of one ring cadence
+# and lines starting with '#' are ignored.
+# ==============================================================================
+
+import contextlib
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from shutil import copyfile
+
+from app import CallAttendant
+from config import Config
+from hardware.modemsim import ModemSimulator
+from logconfig import setup_logging, shutdown_logging
+from screening.calltiming import CallTiming, STAGES, SCREENING_STAGES
+
+# Names of synthetic callers; some match the sample caller ID patterns
+CALLER_NAMES = ("Unknown", "V123456789012345", "WIRELESS CALLER", "SMITH JOHN",
+                "O", "TOLL FREE", "DOE JANE", "PRIVATE")
+
+PERCENTILES = (50, 90, 99)
+
+
+def synthetic_transcript(calls, seed=None):
+    """
+    Generates a transcript of calls with random numbers and names.
+        :param calls:
+            The number of calls
+        :param seed:
+            Optional random seed for a reproducible transcript
+        :return:
+            A list of modem output lines
+    """
+    rand = random.Random(seed)
+    now = datetime.now()
+    lines = []
+    for n in range(calls):
+        date = now + timedelta(minutes=n)
+        lines.extend([
+            "RING",
+            "DATE={}".format(date.strftime("%m%d")),
+            "TIME={}".format(date.strftime("%H%M")),
+            "NMBR={}".format(rand.choice(("800", "805", "360", "562")) + "{:07d}".format(rand.randint(0, 9999999))),
+            "NAME={}".format(rand.choice(CALLER_NAMES)),
+        ])
+    return lines
+
+
+def read_transcript(filename):
+    """
+    Reads a transcript file.
+        :return:
+            A list of modem output lines
+    """
+    with open(filename, "r") as file:
+        lines = [line.strip() for line in file]
+    return [line for line in lines if not line.startswith("#")]
+
+
+def make_benchmark_config(data_path, config_file=None):
+    """
+    Creates the config for a benchmark run. All the calls are ignored,
+    without waiting for rings, so the run measures the screening and
+    logging rather than the telephone's ring cadence.
+    """
+    config = Config(data_path=data_path)
+    if config_file is not None:
+        config.from_pyfile(config_file)
+    config.normalize_paths()
+    for prefix in ("BLOCKED", "SCREENED", "PERMITTED"):
+        config[prefix + "_ACTIONS"] = ("ignore",)
+        config[prefix + "_RINGS_BEFORE_ANSWER"] = 0
+    config["STATUS_INDICATORS"] = "NULL"
+    config["EMAIL_ENABLE"] = False
+
+    if not os.path.isdir(config["VOICE_MAIL_MESSAGE_FOLDER"]):
+        os.makedirs(config["VOICE_MAIL_MESSAGE_FOLDER"])
+    if not os.path.exists(config["CALLERID_PATTERNS_FILE"]):
+        copyfile(os.path.join(config.root_path, "cid_patterns.yaml"), config["CALLERID_PATTERNS_FILE"])
+    return config
+
+
+def percentile(values, pct):
+    """
+    Returns the nearest-rank percentile of the given values.
+    """
+    ordered = sorted(values)
+    rank = max(1, int(round(pct / 100.0 * len(ordered))))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def summarize(timers):
+    """
+    Computes the latency percentiles (secs) of each stage, plus the
+    "screening" and "total" (caller ID to call logged) latencies.
+    """
+    samples = {stage: [] for stage in STAGES if stage != "ring"}
+    samples["screening"] = []
+    samples["total"] = []
+    for timer in timers:
+        durations = timer.durations()
+        for stage, secs in durations.items():
+            samples[stage].append(secs)
+        marks = timer.marks
+        if "dequeue" in marks and "logged" in marks:
+            screening_ends = [t for stage, t in marks.items() if stage in SCREENING_STAGES]
+            if screening_ends:
+                samples["screening"].append(max(screening_ends) - marks["dequeue"])
+        if "cid" in marks and "logged" in marks:
+            samples["total"].append(marks["logged"] - marks["cid"])
+
+    stats = {}
+    for stage, values in samples.items():
+        if not values:
+            continue
+        stats[stage] = dict(count=len(values), max=max(values),
+                            **{"p{}".format(pct): percentile(values, pct) for pct in PERCENTILES})
+    return stats
+
+
+def run_benchmark(transcript, speed=100.0, data_path=None, config_file=None, timeout=600.0, verbose=False):
+    """
+    Replays a transcript through the call pipeline.
+        :param transcript:
+            A list of modem output lines
+        :param speed:
+            The simulated modem's clock acceleration factor
+        :param data_path:
+            The folder for the database; a temporary folder if None
+        :param config_file:
+            Optional configuration file, e.g., to benchmark the screening settings
+        :param timeout:
+            Maximum secs to wait for the calls to be processed
+        :param verbose:
+            If True, the call attendant's log is written to the console
+        :return:
+            a dict with the number of calls processed, the elapsed time,
+            the calls/sec and the per-stage latency percentiles
+    """
+    expected = sum(1 for line in transcript if line.replace(" ", "").startswith("NMBR="))
+    with contextlib.ExitStack() as stack:
+        if data_path is None:
+            data_path = stack.enter_context(tempfile.TemporaryDirectory())
+        if not verbose:
+            devnull = stack.enter_context(open(os.devnull, "w"))
+            stack.enter_context(contextlib.redirect_stdout(devnull))
+
+        simulator = ModemSimulator(speed=speed)
+        simulator.start()
+        stack.callback(simulator.stop)
+
+        config = make_benchmark_config(data_path, config_file)
+        config["MODEM_DEVICE"] = simulator.device
+        if verbose:
+            setup_logging(config)
+            stack.callback(shutdown_logging)
+        app = CallAttendant(config, start_webapp=False)
+        thread = threading.Thread(target=app.run)
+        thread.name = "benchmark_run"
+        thread.start()
+
+        start = time.monotonic()
+        simulator.add_transcript(transcript)
+        processed = 0
+        try:
+            while processed < expected and time.monotonic() - start < timeout:
+                time.sleep(0.05)
+                processed = sum(line["answered"] + line["ignored"] for line in app.get_line_stats())
+            elapsed = time.monotonic() - start
+            cache_stats = app.get_verdict_cache_stats()
+        finally:
+            app.shutdown()
+            thread.join()
+
+        db = sqlite3.connect(config["DB_FILE"])
+        try:
+            timers = CallTiming(db, {}).get_timers()
+        finally:
+            db.close()
+
+    return {
+        "calls": processed,
+        "expected": expected,
+        "elapsed": elapsed,
+        "calls_per_sec": processed / elapsed if elapsed else 0.0,
+        "stages": summarize(timers),
+        "verdict_cache": cache_stats,
+    }
+
+
+def print_report(results):
+    """
+    Prints the benchmark results.
+    """
+    print("Calls processed: {} of {} in {:.2f} secs ({:.1f} calls/sec)".format(
+        results["calls"], results["expected"], results["elapsed"], results["calls_per_sec"]))
+    print("Verdict cache: {hits} hits, {misses} misses, {invalidations} invalidations".format(
+        **results["verdict_cache"]))
+    print("{:<16} {:>7} {:>10} {:>10} {:>10} {:>10}".format(
+        "Stage (ms)", "Count", *["p{}".format(pct) for pct in PERCENTILES], "max"))
+    for stage, stats in results["stages"].items():
+        print("{:<16} {:>7} {:>10.3f} {:>10.3f} {:>10.3f} {:>10.3f}".format(
+            stage, stats["count"], *[stats["p{}".format(pct)] * 1000 for pct in PERCENTILES],
+            stats["max"] * 1000))
+
+
+def main(argv):
+    """
+    Runs the benchmark and prints the report.
+    """
+    import argparse
+    parser = argparse.ArgumentParser(description="Call pipeline benchmark")
+    parser.add_argument("--calls", type=int, default=1000, help="number of synthetic calls")
+    parser.add_argument("--transcript", help="replay a recorded modem transcript file")
+    parser.add_argument("--repeat", type=int, default=1, help="number of times to replay the transcript")
+    parser.add_argument("--speed", type=float, default=100.0, help="modem clock acceleration factor")
+    parser.add_argument("--seed", type=int, help="random seed for the synthetic calls")
+    parser.add_argument("--data-path", help="folder for the database; a temporary folder by default")
+    parser.add_argument("--config", help="load a python configuration file")
+    parser.add_argument("--timeout", type=float, default=600.0, help="maximum run time (secs)")
+    parser.add_argument("--verbose", action="store_true", help="show the call attendant's log")
+    args = parser.parse_args(argv[1:])
+
+    if args.transcript:
+        transcript = read_transcript(args.transcript) * args.repeat
+    else:
+        transcript = synthetic_transcript(args.calls, args.seed)
+
+    results = run_benchmark(transcript, args.speed, args.data_path, args.config, args.timeout, args.verbose)
+    print_report(results)
+    return 0 if results["calls"] == results["expected"] else 1
+
+
+if __name__ == '__main__':
+
+    sys.exit(main(sys.argv))
@@ -13,7 +13,8 @@ import types
 
 from shutil import copyfile
 from tempfile import gettempdir
-from werkzeug.utils import import_string
+
+from logconfig import SUBSYSTEMS
 
 # This default configuration (used when a configuration file is not provided)
 # will record messages from blocked (denied) callers, and will simply pass permitted
@@ -25,11 +26,20 @@ default_config = {
     "DEBUG": False,
     "TESTING": False,
 
+    "LOG_LEVEL": "",
+    "LOG_LEVELS": {},
+    "LOG_FORMAT": "text",
+    "LOG_FILE": "",
+
     "HOST": "0.0.0.0",
     "PORT": 5000,
+    "WEBAPP_SERVER": "waitress",
+    "WEBAPP_WORKERS": 6,
+    "WEBAPP_TIMEOUT": 60,
 
     "MODEM_DEVICE": "",
     "OPTIONAL_MODEM_INIT": "",
+    "MODEM_LINES": (),
 
     "DATABASE": "callattendant.db",
     "NOTIFICATIONS_FOLDER": "notifications",
@@ -46,6 +56,13 @@ default_config = {
 
     "PERMIT_NEXT_CALL_FLAG": 'permitnextcall.flag',
 
+    "VERDICT_CACHE_TTL": 300,
+
+    "CALL_RATE_WINDOW": 3600,
+    "CALL_RATE_MAX_CALLS": 0,
+    "CALL_RATE_MAX_PREFIX_NUMBERS": 0,
+    "CALL_RATE_HOME_PREFIX": "",
+
     "BLOCKED_ACTIONS": ("answer", "greeting", "voice_mail"),
     "BLOCKED_GREETING_FILE": "blocked_greeting.wav",
     "BLOCKED_RINGS_BEFORE_ANSWER": 0,
@@ -64,14 +81,24 @@ default_config = {
     "VOICE_MAIL_CALLBACK_FILE": "thankyou_callback.wav",
     "VOICE_MAIL_MESSAGE_FOLDER": "messages",
     "VOICE_MAIL_RECORD_TIME": 120,
+    "VOICE_MAIL_TRIM_SILENCE": True,
+    "VOICE_MAIL_COMPRESSION": "",
+    "VOICE_MAIL_PROCESSING_WORKERS": 1,
 
+    "POST_CALL_WORKERS": 2,
+    "POST_CALL_QUEUE_SIZE": 100,
+
+    "EMAIL_ENABLE": False,
     "EMAIL_SERVER": "SMTP server",
     "EMAIL_PORT": 465,
+    "EMAIL_SECURITY": "SSL",
     "EMAIL_SERVER_USERNAME": 'user name to log into the SMTP server',
     "EMAIL_SERVER_PASSWORD": 'password to log into the SMTP server',
     "EMAIL_FROM": 'e-mail address to appear in the "From:" header',
     "EMAIL_TO": 'e-mail address to send the voicemail notification to',
     "EMAIL_WAVE_ATTACHMENT": False,
+    "EMAIL_DIGEST_DELAY": 0,
+    "EMAIL_MAX_ATTEMPTS": 8,
 
     "STATUS_INDICATORS": "NULL",
 
@@ -91,9 +118,34 @@ default_config = {
     "MQTT_TOPIC_PREFIX": "callattendant",
     "MQTT_USERNAME": "",
     "MQTT_PASSWORD": "",
+    "MQTT_QOS": 0,
+    "MQTT_RETAIN": True,
+    "MQTT_QUEUE_SIZE": 100,
 
 }
 
+# The settings that can be specified per phone line in MODEM_LINES
+LINE_SETTINGS = (
+    "LINE_NAME",
+    "MODEM_DEVICE",
+    "OPTIONAL_MODEM_INIT",
+    "GPIO_LED_RING_PIN",
+    "GPIO_LED_RING_BRIGHTNESS",
+    "BLOCKED_ACTIONS",
+    "BLOCKED_GREETING_FILE",
+    "BLOCKED_RINGS_BEFORE_ANSWER",
+    "SCREENED_ACTIONS",
+    "SCREENED_GREETING_FILE",
+    "SCREENED_RINGS_BEFORE_ANSWER",
+    "PERMITTED_ACTIONS",
+    "PERMITTED_GREETING_FILE",
+    "PERMITTED_RINGS_BEFORE_ANSWER",
+)
+
+# The permitted LOG_LEVEL and LOG_LEVELS values; an empty LOG_LEVEL
+# selects DEBUG or INFO according to the DEBUG setting
+LOG_LEVELS = ("", "DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL")
+
 CID_PATTERNS_DEFAULT_STRING = b"blocknames: {}\nblocknumbers: {}\n" \
                               b"permitnames: {}\npermitnumbers: {}\n"
 
@@ -143,6 +195,8 @@ class Config(dict):
                 The default configuration values
         """
         dict.__init__(self, defaults or default_config)
+        # Incremented by each change, so that values derived from the config can be cached
+        self.version = 0
         if root_path:
             self.root_path = root_path
         else:
@@ -156,6 +210,50 @@ class Config(dict):
         self["ROOT_PATH"] = self.root_path
         self["DATA_PATH"] = self.data_path
 
+    def __setitem__(self, key, value):
+        self.version += 1
+        dict.__setitem__(self, key, value)
+
+    def __delitem__(self, key):
+        self.version += 1
+        dict.__delitem__(self, key)
+
+    def update(self, *args, **kwargs):
+        self.version += 1
+        dict.update(self, *args, **kwargs)
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self.version += 1
+        return dict.setdefault(self, key, default)
+
+    def pop(self, key, *args):
+        self.version += 1
+        return dict.pop(self, key, *args)
+
+    def mark_changed(self):
+        """
+        Records a change made within a value, e.g., to the CALLERID_PATTERNS dict.
+        """
+        self.version += 1
+
+    def for_line(self, overrides):
+        """
+        Creates the config object for a phone line.
+            :param overrides:
+                A dict of settings that differ from the application settings
+                for the line, e.g., {"MODEM_DEVICE": "/dev/ttyACM1"}
+            :return:
+                A copy of this config with the overrides applied
+        """
+        line_config = Config(self.root_path, self.data_path, defaults=self)
+        line_config.update(overrides)
+        # Greetings are relative to the notifications folder
+        for key in ("BLOCKED_GREETING_FILE", "SCREENED_GREETING_FILE", "PERMITTED_GREETING_FILE"):
+            if key in overrides:
+                line_config[key] = os.path.normpath(os.path.join(self["NOTIFICATIONS_FOLDER"], overrides[key]))
+        return line_config
+
     def default_notification(self, wav_name):
         """
         Checks for default notification file and optionally copies from installed source.
@@ -188,6 +286,9 @@ class Config(dict):
 
         self["DB_FILE"] = os.path.normpath(os.path.join(datapath, self["DATABASE"]))
 
+        if self["LOG_FILE"]:
+            self["LOG_FILE"] = os.path.normpath(os.path.join(datapath, self["LOG_FILE"]))
+
         wavpath = os.path.join(datapath, self["NOTIFICATIONS_FOLDER"])
         self["NOTIFICATIONS_FOLDER"] = os.path.normpath(wavpath)
         self["BLOCKED_GREETING_FILE"] = os.path.normpath(os.path.join(wavpath, self["BLOCKED_GREETING_FILE"]))
@@ -219,6 +320,20 @@ class Config(dict):
         if not isinstance(self["TESTING"], bool):
             print("* TESTING should be bool: {}".format(type(self["TESTING"])))
             success = False
+        if self["LOG_LEVEL"].upper() not in LOG_LEVELS:
+            print("* LOG_LEVEL is invalid: {}".format(self["LOG_LEVEL"]))
+            success = False
+        if not isinstance(self["LOG_LEVELS"], dict):
+            print("* LOG_LEVELS should be a dict: {}".format(type(self["LOG_LEVELS"])))
+            success = False
+        else:
+            for subsystem, level in self["LOG_LEVELS"].items():
+                if subsystem not in SUBSYSTEMS or not isinstance(level, str) or level.upper() not in LOG_LEVELS:
+                    print("* LOG_LEVELS entry is invalid: {}: {}".format(subsystem, level))
+                    success = False
+        if self["LOG_FORMAT"] not in ("text", "json"):
+            print("* LOG_FORMAT is invalid: {}".format(self["LOG_FORMAT"]))
+            success = False
         if not isinstance(self["BLOCK_ENABLED"], bool):
             print("* BLOCK_ENABLED should be a bool: {}".format(type(self["BLOCK_ENABLED"])))
             success = False
@@ -229,6 +344,20 @@ class Config(dict):
                 (self["BLOCK_SERVICE_THRESHOLD"] != 1 and self["BLOCK_SERVICE_THRESHOLD"] != 2)):
             print("* BLOCK_SERVICE_THRESHOLD should be 1 or 2: {}".format(self["BLOCK_SERVICE_THRESHOLD"]))
             success = False
+        if not isinstance(self["VERDICT_CACHE_TTL"], (int, float)) or self["VERDICT_CACHE_TTL"] < 0:
+            print("* VERDICT_CACHE_TTL should be a number of seconds: {}".format(self["VERDICT_CACHE_TTL"]))
+            success = False
+        if not isinstance(self["CALL_RATE_WINDOW"], (int, float)) or self["CALL_RATE_WINDOW"] <= 0:
+            print("* CALL_RATE_WINDOW should be a positive number of seconds: {}".format(self["CALL_RATE_WINDOW"]))
+            success = False
+        for key in ("CALL_RATE_MAX_CALLS", "CALL_RATE_MAX_PREFIX_NUMBERS"):
+            if not isinstance(self[key], int) or self[key] < 0:
+                print("* {} should be a non-negative integer: {}".format(key, self[key]))
+                success = False
+        if (not isinstance(self["CALL_RATE_HOME_PREFIX"], str) or
+                len("".join(filter(str.isdigit, self["CALL_RATE_HOME_PREFIX"]))) not in (0, 6)):
+            print("* CALL_RATE_HOME_PREFIX should be a 6 digit NPA-NXX: {}".format(self["CALL_RATE_HOME_PREFIX"]))
+            success = False
 
         for mode in self["SCREENING_MODE"]:
             if mode not in ("whitelist", "blacklist"):
@@ -246,6 +375,16 @@ class Config(dict):
             print("* STATUS_INDICATORS is invalid: {}".format(self["STATUS_INDICATORS"]))
             success = False
 
+        if self["MQTT_QOS"] not in (0, 1, 2):
+            print("* MQTT_QOS should be 0, 1 or 2: {}".format(self["MQTT_QOS"]))
+            success = False
+        if not isinstance(self["MQTT_RETAIN"], bool):
+            print("* MQTT_RETAIN should be a boolean: {}".format(type(self["MQTT_RETAIN"])))
+            success = False
+        if not isinstance(self["MQTT_QUEUE_SIZE"], int) or self["MQTT_QUEUE_SIZE"] < 1:
+            print("* MQTT_QUEUE_SIZE should be a positive integer: {}".format(self["MQTT_QUEUE_SIZE"]))
+            success = False
+
         if not isinstance(self["BLOCKED_RINGS_BEFORE_ANSWER"], int):
             print("* BLOCKED_RINGS_BEFORE_ANSWER should be an integer: {}".format(type(self["BLOCKED_RINGS_BEFORE_ANSWER"])))
             success = False
@@ -256,6 +395,52 @@ class Config(dict):
             print("* PERMITTED_RINGS_BEFORE_ANSWER should be an integer: {}".format(type(self["PERMITTED_RINGS_BEFORE_ANSWER"])))
             success = False
 
+        if not isinstance(self["MODEM_LINES"], (list, tuple)):
+            print("* MODEM_LINES should be a list of dicts: {}".format(type(self["MODEM_LINES"])))
+            success = False
+        else:
+            for n, overrides in enumerate(self["MODEM_LINES"], start=1):
+                if not self._validate_line(n, overrides):
+                    success = False
+
+        if not isinstance(self["VOICE_MAIL_TRIM_SILENCE"], bool):
+            print("* VOICE_MAIL_TRIM_SILENCE should be a bool: {}".format(type(self["VOICE_MAIL_TRIM_SILENCE"])))
+            success = False
+        if self["VOICE_MAIL_COMPRESSION"] not in ("", "FLAC"):
+            print("* VOICE_MAIL_COMPRESSION is invalid: {}".format(self["VOICE_MAIL_COMPRESSION"]))
+            success = False
+        if not isinstance(self["VOICE_MAIL_PROCESSING_WORKERS"], int) or self["VOICE_MAIL_PROCESSING_WORKERS"] < 1:
+            print("* VOICE_MAIL_PROCESSING_WORKERS should be a positive integer: {}".format(
+                self["VOICE_MAIL_PROCESSING_WORKERS"]))
+            success = False
+
+        if self["WEBAPP_SERVER"] not in ("waitress", "werkzeug"):
+            print("* WEBAPP_SERVER should be 'waitress' or 'werkzeug': {}".format(self["WEBAPP_SERVER"]))
+            success = False
+        if not isinstance(self["WEBAPP_WORKERS"], int) or self["WEBAPP_WORKERS"] < 2:
+            print("* WEBAPP_WORKERS should be an integer of 2 or more: {}".format(self["WEBAPP_WORKERS"]))
+            success = False
+        if not isinstance(self["WEBAPP_TIMEOUT"], (int, float)) or self["WEBAPP_TIMEOUT"] <= 0:
+            print("* WEBAPP_TIMEOUT should be a positive number of seconds: {}".format(self["WEBAPP_TIMEOUT"]))
+            success = False
+
+        if not isinstance(self["POST_CALL_WORKERS"], int) or self["POST_CALL_WORKERS"] < 1:
+            print("* POST_CALL_WORKERS should be a positive integer: {}".format(self["POST_CALL_WORKERS"]))
+            success = False
+        if not isinstance(self["POST_CALL_QUEUE_SIZE"], int) or self["POST_CALL_QUEUE_SIZE"] < 1:
+            print("* POST_CALL_QUEUE_SIZE should be a positive integer: {}".format(self["POST_CALL_QUEUE_SIZE"]))
+            success = False
+
+        if self["EMAIL_SECURITY"] not in ("SSL", "STARTTLS", "NONE"):
+            print("* EMAIL_SECURITY is invalid: {}".format(self["EMAIL_SECURITY"]))
+            success = False
+        if not isinstance(self["EMAIL_DIGEST_DELAY"], (int, float)) or self["EMAIL_DIGEST_DELAY"] < 0:
+            print("* EMAIL_DIGEST_DELAY should be a number of seconds: {}".format(self["EMAIL_DIGEST_DELAY"]))
+            success = False
+        if not isinstance(self["EMAIL_MAX_ATTEMPTS"], int) or self["EMAIL_MAX_ATTEMPTS"] < 1:
+            print("* EMAIL_MAX_ATTEMPTS should be a positive integer: {}".format(self["EMAIL_MAX_ATTEMPTS"]))
+            success = False
+
         filepath = self["CALLERID_PATTERNS_FILE"]
         if not os.path.exists(filepath):
             print("* CALLERID_PATTERNS_FILE does not exist: {}".format(filepath))
@@ -294,6 +479,36 @@ class Config(dict):
 
         return success
 
+    def _validate_line(self, n, overrides):
+        """
+        :param n:
+            The line number
+        :param overrides:
+            A dict of per-line settings from MODEM_LINES
+        """
+        if not isinstance(overrides, dict):
+            print("* MODEM_LINES entry {} must be a dict, not {}".format(n, type(overrides)))
+            return False
+
+        for key in overrides:
+            if key not in LINE_SETTINGS:
+                print("* MODEM_LINES entry {} contains an invalid setting: {}".format(n, key))
+                return False
+
+        line_config = self.for_line(overrides)
+        for key in ("BLOCKED_ACTIONS", "SCREENED_ACTIONS", "PERMITTED_ACTIONS"):
+            if key in overrides and not line_config._validate_actions(key):
+                return False
+        for key in ("BLOCKED_RINGS_BEFORE_ANSWER", "SCREENED_RINGS_BEFORE_ANSWER", "PERMITTED_RINGS_BEFORE_ANSWER"):
+            if not isinstance(line_config[key], int):
+                print("* MODEM_LINES entry {}: {} should be an integer".format(n, key))
+                return False
+        for key in ("BLOCKED_GREETING_FILE", "SCREENED_GREETING_FILE", "PERMITTED_GREETING_FILE"):
+            if key in overrides and not os.path.exists(line_config[key]):
+                print("* MODEM_LINES entry {}: {} not found: {}".format(n, key, line_config[key]))
+                return False
+        return True
+
     def _validate_actions(self, key):
         """
         :param key:
@@ -389,6 +604,8 @@ class Config(dict):
                 an import name or object
         """
         if isinstance(obj, str):
+            # Werkzeug is slow to load; it is only needed here
+            from werkzeug.utils import import_string
             obj = import_string(obj)
         for key in dir(obj):
             if key.isupper():
@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#  database.py
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+
+
+# The database connection opened by the call attendant is shared by the
+# phone lines, the voice mail audio processor and the e-mail notifier.
+# A connection allows one transaction at a time: a commit made by one
+# thread would also commit another thread's unfinished statements. The
+# users of a shared connection hold its lock while they use it.
+
+import sqlite3
+import threading
+from contextlib import nullcontext
+
+# The "lock" of a connection used by a single thread, e.g., the webapp's
+_NO_LOCK = nullcontext()
+
+
+class SharedConnection(sqlite3.Connection):
+    """
+    A connection that can be used by several threads. The statements of
+    a transaction, through to its commit, are run while holding the lock.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.lock = threading.RLock()
+
+
+def connect(database):
+    """
+    Opens a connection that can be shared by threads.
+        :param database: the database file, or ":memory:"
+        :return: a SharedConnection
+    """
+    return sqlite3.connect(database, check_same_thread=False, factory=SharedConnection)
+
+
+def get_lock(db):
+    """
+    Returns the lock that serializes the use of the given connection.
+    A connection not opened by connect() is used by a single thread and
+    is not locked.
+        :param db: the database connection
+        :return: a context manager
+    """
+    return getattr(db, "lock", _NO_LOCK)
@@ -0,0 +1,171 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#  eventbus.py
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+
+
+import itertools
+import queue
+import threading
+import time
+from collections import deque
+
+# The number of recent events replayed to a reconnecting subscriber
+HISTORY_SIZE = 50
+
+# The number of undelivered events held for a slow subscriber; the oldest are dropped
+SUBSCRIBER_QUEUE_SIZE = 100
+
+
+class Event(object):
+    """
+    A call event: the event type, e.g., "call", and its data.
+    """
+
+    def __init__(self, event_id, name, data):
+        self.id = event_id
+        self.name = name
+        self.data = data
+        self.time = time.time()
+
+
+# Wakes a subscriber when its subscription is closed
+_CLOSED = object()
+
+
+class Subscription(object):
+    """
+    A subscriber's queue of events.
+    """
+
+    def __init__(self, events=()):
+        self._queue = queue.Queue(SUBSCRIBER_QUEUE_SIZE)
+        self.dropped = 0
+        self.closed = False
+        for event in events:
+            self.put(event)
+
+    def put(self, event):
+        """
+        Queues an event, dropping the oldest event if the subscriber has fallen behind.
+        """
+        while True:
+            try:
+                self._queue.put_nowait(event)
+                return
+            except queue.Full:
+                try:
+                    self._queue.get_nowait()
+                    self.dropped += 1
+                except queue.Empty:
+                    pass
+
+    def get(self, timeout=None):
+        """
+        Returns the next event, or None if no event arrives within the timeout.
+        """
+        try:
+            event = self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+        return None if event is _CLOSED else event
+
+    def close(self):
+        """
+        Closes the subscription, waking a subscriber waiting for an event.
+        """
+        self.closed = True
+        self.put(_CLOSED)
+
+
+class EventBus(object):
+    """
+    Publishes the call events, e.g., a call being screened or logged or
+    a message being played, to the subscribers, e.g., the webapp's event
+    stream. Publishing never blocks the caller: each subscriber has its
+    own bounded queue.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._history = deque(maxlen=HISTORY_SIZE)
+        self._subscriptions = []
+
+    def publish(self, name, data):
+        """
+        Publishes an event to the subscribers.
+            :param name:
+                The event type, e.g., "call"
+            :param data:
+                A dict with the event data; it must be JSON serializable
+            :return:
+                The Event
+        """
+        with self._lock:
+            event = Event(next(self._ids), name, data)
+            self._history.append(event)
+            subscriptions = list(self._subscriptions)
+        for subscription in subscriptions:
+            subscription.put(event)
+        return event
+
+    def subscribe(self, last_event_id=None):
+        """
+        Returns a new subscription.
+            :param last_event_id:
+                The ID of the last event received before reconnecting; the
+                later events still in the history are replayed
+        """
+        with self._lock:
+            missed = []
+            if last_event_id is not None:
+                missed = [event for event in self._history if event.id > last_event_id]
+            subscription = Subscription(missed)
+            self._subscriptions.append(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        """
+        Removes a subscription.
+        """
+        with self._lock:
+            if subscription in self._subscriptions:
+                self._subscriptions.remove(subscription)
+
+    def close_subscriptions(self):
+        """
+        Closes all the subscriptions, e.g., to end the event streams at shutdown.
+        """
+        with self._lock:
+            subscriptions = self._subscriptions
+            self._subscriptions = []
+        for subscription in subscriptions:
+            subscription.close()
+
+    @property
+    def subscriber_count(self):
+        with self._lock:
+            return len(self._subscriptions)
+
+
+# The application-wide event bus
+event_bus = EventBus()
@@ -28,6 +28,10 @@
 
 from gpiozero import LED, PWMLED, LEDBoard, OutputDeviceError, LEDCollection
 
+from logconfig import get_logger
+
+log = get_logger("indicators")
+
 GPIO_RING = 14
 GPIO_APPROVED = 15
 GPIO_BLOCKED = 17
@@ -263,7 +267,7 @@ class RingIndicator(PWMLEDIndicator):
 
     def ring(self):
         self.blink()
-        print("{RING LED BLINKING}")
+        log.info("{RING LED BLINKING}")
 
 
 class ApprovedIndicator(PWMLEDIndicator):
@@ -292,19 +296,19 @@ class MessageIndicator(PWMLEDIndicator):
         super().__init__(gpio_pin, brightness)
 
     def turn_off(self):
-        print("{MSG LED OFF}")
+        log.info("{MSG LED OFF}")
         super().turn_off()
 
     def turn_on(self):
-        print("{MSG LED ON}")
+        log.info("{MSG LED ON}")
         super().turn_on()
 
     def blink(self):
-        print("{MSG LED Blinking}")
+        log.info("{MSG LED Blinking}")
         super().blink(max_times=None)   # None = forever
 
     def pulse(self):
-        print("{MSG LED Pulsing}")
+        log.info("{MSG LED Pulsing}")
         super().pulse(max_times=None)   # None = forever
 
 
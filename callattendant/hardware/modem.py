@@ -32,6 +32,8 @@
 # ==============================================================================
 
 import atexit
+import json
+import logging
 import os
 import re
 import serial
@@ -40,8 +42,12 @@ import threading
 import time
 import wave
 
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from pprint import pprint
+
+from logconfig import get_logger
+
+log = get_logger("modem")
 
 # ACSII codes
 DLE_CODE = chr(16)      # Data Link Escape (DLE) code
@@ -128,23 +134,182 @@ TEST_DATA = [
 ]
 
 
+# A RING after a longer pause is the first ring of a new call. In North America,
+# the standard ring cadence is 2 secs of ringing followed by 4 secs of silence.
+RING_GAP_SECS = 9.0
+
+# The last known modem device(s), stored in the DATA_PATH folder so the
+# modem is found without probing every serial port at startup
+MODEM_CACHE_FILE = "modem_cache.json"
+
+# Timeout (secs) for each command sent while probing a serial port
+PROBE_TIMEOUT = 2
+PROBE_MAX_WORKERS = 16
+
+# Serializes access to the cache file and the ports opened by the Modem
+# objects, e.g., one per phone line
+_ports_lock = threading.Lock()
+_claimed_ports = set()
+
+
+def show_codes(modem_data):
+    """
+    Returns the modem data with the DLE and ETX codes spelled out.
+    """
+    return "".join(map(lambda x: '<DLE>' if x == DLE_CODE else
+                                 '<ETX>' if x == ETX_CODE else x, modem_data))
+
+
+def configure_serial_port(port, com_port):
+    """
+    Configures the given serial.Serial object for communications with a modem.
+        :param port:
+            A serial.Serial object
+        :param com_port:
+            The OS com port
+    """
+    port.port = com_port
+    port.baudrate = 57600                   # bps
+    port.bytesize = serial.EIGHTBITS        # number of bits per bytes
+    port.parity = serial.PARITY_NONE        # set parity check: no parity
+    port.stopbits = serial.STOPBITS_ONE     # number of stop bits
+    port.timeout = 3                        # timeout for read
+    port.writeTimeout = 3                   # timeout for write
+    port.xonxoff = False                    # disable software flow control
+    port.rtscts = False                     # disable hardware (RTS/CTS) flow control
+    port.dsrdtr = False                     # disable hardware (DSR/DTR) flow control
+
+
+def probe_port(com_port, timeout=PROBE_TIMEOUT):
+    """
+    Tests if a modem responds to AT commands on the given serial port.
+        :param com_port:
+            The OS com port
+        :param timeout:
+            Number of seconds to wait for each response
+        :return:
+            True if a modem responded
+    """
+    port = serial.Serial()
+    configure_serial_port(port, com_port)
+    port.timeout = 0.25
+    try:
+        port.open()
+        port.reset_input_buffer()
+        for command in ("AT", GET_MODEM_PRODUCT_CODE):
+            port.write((command + '\r').encode())
+            response = b''
+            deadline = time.monotonic() + timeout
+            while b'OK' not in response:
+                if b'ERROR' in response or time.monotonic() > deadline:
+                    return False
+                response += port.readline()
+        return True
+    except Exception:
+        return False
+    finally:
+        if port.is_open:
+            port.close()
+
+
+def probe_ports(com_ports, timeout=PROBE_TIMEOUT):
+    """
+    Probes the given serial ports concurrently.
+        :param com_ports:
+            A list of OS com ports
+        :return:
+            The ports that responded like a modem, in the given order
+    """
+    if not com_ports:
+        return []
+    with ThreadPoolExecutor(max_workers=min(len(com_ports), PROBE_MAX_WORKERS),
+                            thread_name_prefix="modem_probe") as executor:
+        results = list(executor.map(lambda com_port: probe_port(com_port, timeout), com_ports))
+    return [com_port for com_port, found in zip(com_ports, results) if found]
+
+
+def read_modem_cache(config):
+    """
+    Reads the last known modem devices.
+        :return:
+            A dict keyed by com port with the model and profile signature
+    """
+    filepath = os.path.join(config["DATA_PATH"], MODEM_CACHE_FILE)
+    with _ports_lock:
+        try:
+            with open(filepath) as f:
+                cache = json.load(f)
+            return cache if isinstance(cache, dict) else {}
+        except (OSError, ValueError):
+            return {}
+
+
+def write_modem_cache(config, com_port, entry):
+    """
+    Saves the given modem device as the last known device.
+        :param com_port:
+            The OS com port
+        :param entry:
+            A dict with the model and profile signature
+    """
+    filepath = os.path.join(config["DATA_PATH"], MODEM_CACHE_FILE)
+    with _ports_lock:
+        try:
+            with open(filepath) as f:
+                cache = json.load(f)
+            if not isinstance(cache, dict):
+                cache = {}
+        except (OSError, ValueError):
+            cache = {}
+        if cache.get(com_port) == entry:
+            return
+        cache[com_port] = entry
+        try:
+            with open(filepath + ".tmp", "w") as f:
+                json.dump(cache, f, indent=2)
+            os.replace(filepath + ".tmp", filepath)
+        except OSError as e:
+            log.warning("* Warning: could not save %s: %s", filepath, e)
+
+
 class Modem(object):
     """
     This class is responsible for serial communications between the
     Raspberry Pi and a voice/data/fax modem.
     """
 
+    # Model specific commands; the USR 5637 commands are the default.
+    # These are set per instance by _detect_modem so that different
+    # modem models can be used on multiple phone lines.
+    SET_VOICE_COMPRESSION = SET_VOICE_COMPRESSION
+    DISABLE_SILENCE_DETECTION = DISABLE_SILENCE_DETECTION
+    ENABLE_SILENCE_DETECTION_5_SECS = ENABLE_SILENCE_DETECTION_5_SECS
+    ENABLE_SILENCE_DETECTION_10_SECS = ENABLE_SILENCE_DETECTION_10_SECS
+    ENABLE_FORMATTED_CID = ENABLE_FORMATTED_CID
+
     def __init__(self, config):
         """
         Constructs a modem object for serial communications.
             :param config:
                 application configuration dict
         """
-        print("Initializing Modem")
+        log.info("Initializing Modem")
         self.config = config
         self.is_open = False
         self.model = None   # Model is set to USR, CONEXANT or UNKNOWN by _detect_modem
 
+        # The voice settings in effect, keyed by command name, e.g., {"AT+FCLASS": "AT+FCLASS=8"}
+        self._settings = {}
+        # Concatenated commands (e.g., AT+FCLASS=8;+VLS=1) are used unless the modem rejects them
+        self._combine_commands = True
+        # Number of commands sent and voice settings skipped because they were already in effect
+        self.commands_sent = 0
+        self.settings_skipped = 0
+        # Startup phase timings (secs)
+        self.timings = {}
+        # Monotonic time the last greeting or message playback started
+        self.audio_started = None
+
         # Thread synchronization objects
         self._stop_flag = False
         self._lock = threading.RLock()
@@ -172,7 +337,7 @@ class Modem(object):
         # Automatically close the serial port at program termination
         atexit.register(self._close_serial_port)
 
-        print("Modem {}".format("initialized" if self.is_open else "initialization failed!"))
+        log.info("Modem %s", "initialized" if self.is_open else "initialization failed!")
 
     def start(self, handle_caller):
         """
@@ -190,7 +355,7 @@ class Modem(object):
             self._thread.start()
             return True
         else:
-            print("Error: Starting the modem call handling thread failed; the serial port is not open")
+            log.error("Error: Starting the modem call handling thread failed; the serial port is not open")
             return False
 
     def stop(self):
@@ -219,7 +384,6 @@ class Modem(object):
         NMBR = "NMBR"
 
         # Testing variables
-        debugging = self.config["DEBUG"]
         testing = self.config["TESTING"]
         test_index = 0
         logfile = None
@@ -229,6 +393,7 @@ class Modem(object):
             # This loop reads incoming data from the serial port and
             # posts the caller data to the handle_caller function
             call_record = {}
+            first_ring = last_ring = None
             while not self._stop_flag:
                 modem_data = b''
 
@@ -268,13 +433,16 @@ class Modem(object):
 
                 # Process the modem data
                 if modem_data != '':
-                    # Some debugging/dev tasks here
-                    if debugging:
-                        print(modem_data)
-                        self._serial.flush()
+                    log.debug("%s", modem_data)
 
                     # Process the modem data
                     if RING in modem_data:
+                        # The first ring after a queued call or after a pause longer
+                        # than the ring cadence starts a new call
+                        now = time.monotonic()
+                        if first_ring is None or now - last_ring > RING_GAP_SECS:
+                            first_ring = now
+                        last_ring = now
                         self.ring()
                     elif DATE in modem_data:
                         items = modem_data.split('=')
@@ -294,8 +462,12 @@ class Modem(object):
                 if all(k in call_record for k in ("DATE", "TIME", "NAME", "NMBR")):
                     # Already handled first RING (don't count twice)
                     self.ring_event.clear()
+                    # Timestamps for the call's timeline
+                    call_record["CID_TIME"] = time.monotonic()
+                    call_record["RING_TIME"] = first_ring or call_record["CID_TIME"]
+                    first_ring = None
                     # Queue caller for screening
-                    print("> Queueing call {} for processing".format(call_record["NMBR"]))
+                    log.info("> Queueing call %s for processing", call_record["NMBR"])
                     handle_caller(call_record)
                     # Note: in UK and regions that do not supply a NAME,
                     # you could set the default name here, for example:
@@ -306,7 +478,7 @@ class Modem(object):
                 time.sleep(0.0001)
 
         finally:
-            print("Modem thread exiting")
+            log.info("Modem thread exiting")
 
     def pick_up(self):
         """
@@ -318,26 +490,21 @@ class Modem(object):
             :return:
                 True if successful
         """
-        print("> Going off hook...")
+        log.info("> Going off hook...")
         self._serial.cancel_read()
         self._lock.acquire()
-        if self.config["DEBUG"]:
-            print(">>> Lock acquired in pick-up()")
+        log.debug(">>> Lock acquired in pick-up()")
         try:
-            if not self._send(ENTER_VOICE_MODE):
-                raise RuntimeError("Failed to put modem into voice mode.")
-
-            if not self._send(DISABLE_SILENCE_DETECTION):
-                raise RuntimeError("Failed to disable silence detection.")
-
-            if not self._send(TELEPHONE_ANSWERING_DEVICE_OFF_HOOK):
+            if not self._set_voice_settings(ENTER_VOICE_MODE,
+                                            self.DISABLE_SILENCE_DETECTION,
+                                            TELEPHONE_ANSWERING_DEVICE_OFF_HOOK):
                 raise RuntimeError("Unable put modem into telephone answering device mode.")
 
         except Exception as e:
-            pprint("Error in pick_up: {}".format(e))
+            log.error("Error in pick_up: %s", e)
             # Only release the lock if we failed to go off-hook
             self._lock.release()
-            print(">>> Lock released in pick-up()")
+            log.debug(">>> Lock released in pick-up()")
             return False
 
         return True
@@ -352,7 +519,7 @@ class Modem(object):
             :return:
                 True if successful
         """
-        print("> Going on hook...")
+        log.info("> Going on hook...")
         try:
             self._serial.cancel_read()
 
@@ -360,21 +527,21 @@ class Modem(object):
             self._serial.reset_input_buffer()
             self._serial.reset_output_buffer()
 
+            # Going on-hook resets the line setting; the next call starts afresh
+            self._reset_voice_settings()
             if not self._send(GO_ON_HOOK):
                 raise RuntimeError("Failed to hang up the call.")
             # ~ if not self._send(RESET):
                 # ~ raise RuntimeError("Failed to reset the modem.")
 
         except Exception as e:
-            print("**Error: hang_up() failed")
-            pprint(e)
+            log.error("**Error: hang_up() failed: %s", e)
             return False
 
         finally:
             # Release the lock acquired by pick_up()
             self._lock.release()
-            if self.config["DEBUG"]:
-                print(">>> Lock released in hang-up()")
+            log.debug(">>> Lock released in hang-up()")
 
         return True
 
@@ -386,23 +553,17 @@ class Modem(object):
             :return:
                 True if successful
         """
-        debugging = self.config["DEBUG"]
-        if debugging:
-            print("> Playing {}...".format(audio_file_name))
+        log.debug("> Playing %s...", audio_file_name)
 
         return_data = None
         self._serial.cancel_read()
         with self._lock:
 
             # Setup modem for transmitting audio data
-            if not self._send(ENTER_VOICE_MODE):
-                print("* Error: Failed to put modem into voice mode.")
-                return False, None
-            if not self._send(SET_VOICE_COMPRESSION):
-                print("* Error: Failed to set compression method and sampling rate specifications.")
-                return False, None
-            if not self._send(TELEPHONE_ANSWERING_DEVICE_OFF_HOOK):
-                print("* Error: Unable put modem into telephone answering device mode.")
+            if not self._set_voice_settings(ENTER_VOICE_MODE,
+                                            self.SET_VOICE_COMPRESSION,
+                                            TELEPHONE_ANSWERING_DEVICE_OFF_HOOK):
+                log.error("* Error: Unable put modem into telephone answering device mode.")
                 return False, None
 
             # wait before we speak
@@ -413,29 +574,28 @@ class Modem(object):
                 data = wavefile.readframes(chunk)
                 if len(data) > 0:
                     if not self._send(ENTER_VOICE_TRANSMIT_DATA_STATE, "CONNECT"):
-                        print("* Error: Unable put modem into voice data transmit state.")
+                        log.error("* Error: Unable put modem into voice data transmit state.")
                         return False, None
                 # pump out message
+                self.audio_started = time.monotonic()
                 while data != b'':
                     self._serial.write(data)
                     data = wavefile.readframes(chunk)
                     # Check for DCE notifications
                     if self._serial.in_waiting > 1:
                         modem_data = self._serial.read(self._serial.in_waiting).decode("utf-8", "ignore").strip()
-                        if debugging:
-                            print(">> play_audio input: {}".format(
-                                  "".join(map(lambda x: '<DLE>' if x == DLE_CODE else
-                                                        '<ETX>' if x == ETX_CODE else x, modem_data))))
+                        if log.isEnabledFor(logging.DEBUG):
+                            log.debug(">> play_audio input: %s", show_codes(modem_data))
                         if modem_data != '':
                             if modem_data[0] == DLE_CODE:
                                 if (modem_data[1] == DCE_PHONE_OFF_HOOK) or \
                                         (modem_data[1] == DCE_PHONE_OFF_HOOK2) or \
                                         (modem_data[1] == DCE_PHONE_OFF_HOOK3):
-                                    print(">> Local phone off-hook - abort playback")
+                                    log.info(">> Local phone off-hook - abort playback")
                                     return_data = 'off-hook'
                                     break
                                 if modem_data[1] == DCE_TX_BUFFER_UNDERRUN:
-                                    print(">> Underrun -- ignoring")
+                                    log.info(">> Underrun -- ignoring")
                                     continue
                                 if modem_data[1] == '/':
                                     # Search for ~ and extract the digits
@@ -443,14 +603,15 @@ class Modem(object):
                                         modem_data = modem_data.replace(DLE_CODE, "")
                                         digit_list = re.findall('/(.+?)~', modem_data)
                                         if len(digit_list) > 0:
-                                            print(">> Terminate playback")
+                                            log.info(">> Terminate playback")
                                             # Return only the first digit found
                                             return_data = digit_list[0][0]
                                             break
 
-                                print(">> DCE Notification: <DLE>{}".format(modem_data[1]))
+                                log.info(">> DCE Notification: <DLE>%s", modem_data[1])
 
-                self._send(DTE_END_VOICE_DATA_TX)
+                if not self._send(DTE_END_VOICE_DATA_TX):
+                    self._reset_voice_settings()
 
         return True, return_data
 
@@ -463,22 +624,15 @@ class Modem(object):
             :return:
                 True if a message was saved.
         """
-        if self.config["DEBUG"]:
-            print("> Recording {}...".format(audio_file_name))
+        log.debug("> Recording %s...", audio_file_name)
 
         self._serial.cancel_read()
         with self._lock:
             try:
-                if not self._send(ENTER_VOICE_MODE):
-                    raise RuntimeError("Failed to put modem into voice mode.")
-
-                if not self._send(SET_VOICE_COMPRESSION):
-                    raise RuntimeError("Failed to set compression method and sampling rate specifications.")
-
-                if not self._send(DISABLE_SILENCE_DETECTION):
-                    raise RuntimeError("Failed to disable silence detection.")
-
-                if not self._send(TELEPHONE_ANSWERING_DEVICE_OFF_HOOK):
+                if not self._set_voice_settings(ENTER_VOICE_MODE,
+                                                self.SET_VOICE_COMPRESSION,
+                                                self.DISABLE_SILENCE_DETECTION,
+                                                TELEPHONE_ANSWERING_DEVICE_OFF_HOOK):
                     raise RuntimeError("Unable put modem (TAD) off hook.")
 
                 if not self._send(SEND_VOICE_TONE_BEEP):
@@ -488,7 +642,7 @@ class Modem(object):
                     raise RuntimeError("Error: Unable put modem into voice receive mode.")
 
             except RuntimeError as error:
-                print("Modem initialization error: ", error)
+                log.error("Modem initialization error: %s", error)
                 return False
 
             # Record Audio File
@@ -521,26 +675,26 @@ class Modem(object):
                             escaped_code = chr(audio_data[idx + 1])
                             if escaped_code == DCE_END_VOICE_DATA_TX:
                                 # <DLE><ETX> is in the stream
-                                print(">> <DLE><ETX> Char Recieved... Stop recording.")
+                                log.info(">> <DLE><ETX> Char Recieved... Stop recording.")
                                 break
                             if (escaped_code == DCE_PHONE_OFF_HOOK) or \
                                     (escaped_code == DCE_PHONE_OFF_HOOK2) or \
                                     (escaped_code == DCE_PHONE_OFF_HOOK3):
                                 # <DLE>H or <DLE>P is in the stream
-                                print(">> Local phone off hook... Stop recording")
+                                log.info(">> Local phone off hook... Stop recording")
                                 break
                             if escaped_code == DCE_BUSY_TONE:
-                                print(">> Busy Tone... Stop recording.")
+                                log.info(">> Busy Tone... Stop recording.")
                                 break
                             if escaped_code == DCE_DIAL_TONE:
-                                print(">> Dial Tone... Stop recording.")
+                                log.info(">> Dial Tone... Stop recording.")
                                 break
                             if escaped_code == '/':
                                 # Search for ~ and extract the digits
                                 idx2 = audio_data.find(b'~', idx + 2)
                                 if idx2 != -1:
                                     digit_data = audio_data[idx + 2:idx2].decode().replace(DLE_CODE, '')
-                                    print(">> Keypad data received: {}".format(digit_data))
+                                    log.info(">> Keypad data received: %s", digit_data)
                                     break
 
                         # Test for silence
@@ -553,12 +707,12 @@ class Modem(object):
                             # At 8KHz sample rate, 5 secs is ~40K bytes
                             if silent_frame_count > 40:  # 40 frames is ~5 secs
                                 # TODO: Consider trimming silent tail from audio data.
-                                print(">> Silent frames detected... Stop recording.")
+                                log.info(">> Silent frames detected... Stop recording.")
                                 break
 
                         # Timeout
                         if ((datetime.now() - start_time).seconds) > record_timeout:
-                            print(">> Stop recording: max time limit reached.")
+                            log.info(">> Stop recording: max time limit reached.")
                             break
 
                         # Add Audio Data to output file
@@ -567,17 +721,17 @@ class Modem(object):
 
                     # Save the file if there is audio
                     if audio_frames > silent_frame_count:
-                        print(">> Saving audio file.")
+                        log.info(">> Saving audio file.")
                     else:
-                        print(">> Removing silent audio.")
+                        log.info(">> Removing silent audio.")
                         wf.close()
                         os.remove(audio_file_name)
                         success = False
 
-                print(">> Recording stopped after {} seconds.".format((datetime.now() - start_time).seconds))
+                log.info(">> Recording stopped after %s seconds.", (datetime.now() - start_time).seconds)
 
             except Exception as e:
-                print(">> Error in record_audio: ", e)
+                log.error(">> Error in record_audio: %s", e)
                 success = False
             finally:
                 # Clear input buffer before sending commands else its
@@ -587,11 +741,12 @@ class Modem(object):
                 # Send End of Recieve Data state by passing "<DLE>!"
                 # USR-5637 note: The command returns <DLE><ETX>
                 if not self._send(DTE_END_VOICE_DATA_RX, DLE_CODE + ETX_CODE):
-                    print("* Error: Unable to signal end of data receive state")
+                    log.error("* Error: Unable to signal end of data receive state")
                 # OK indicates return to command mode
                 retval, response = self._read_response("OK", 5)
                 if not retval:
-                    print("* Error: Unable to return to command mode")
+                    log.error("* Error: Unable to return to command mode")
+                    self._reset_voice_settings()
 
         return success
 
@@ -603,21 +758,15 @@ class Modem(object):
             :return:
                 success (bool), key-press value (str)
         """
-        print("> Waiting for key-press...")
-
-        debugging = self.config["DEBUG"]
+        log.info("> Waiting for key-press...")
 
         self._serial.cancel_read()
         with self._lock:
             try:
                 # Initialize modem
-                if not self._send(ENTER_VOICE_MODE):
-                    raise RuntimeError("Failed to put modem into voice mode.")
-
-                if not self._send(ENABLE_SILENCE_DETECTION_10_SECS):
-                    raise RuntimeError("Failed to enable silence detection.")
-
-                if not self._send(TELEPHONE_ANSWERING_DEVICE_OFF_HOOK):
+                if not self._set_voice_settings(ENTER_VOICE_MODE,
+                                                self.ENABLE_SILENCE_DETECTION_10_SECS,
+                                                TELEPHONE_ANSWERING_DEVICE_OFF_HOOK):
                     raise RuntimeError("Unable put modem into Telephone Answering Device mode.")
 
                 # Wait for keypress
@@ -629,10 +778,8 @@ class Modem(object):
                     if modem_char == '':
                         continue
                     modem_data += modem_char
-                    if debugging and len(modem_data) > 1:
-                        print(">> Keypress Data: {}".format(
-                              "".join(map(lambda x: '<DLE>' if x == DLE_CODE else
-                                                    '<ETX>' if x == ETX_CODE else x, modem_data))))
+                    if len(modem_data) > 1 and log.isEnabledFor(logging.DEBUG):
+                        log.debug(">> Keypress Data: %s", show_codes(modem_data))
 
                     if ((DLE_CODE + DCE_PHONE_OFF_HOOK) in modem_data) or \
                             ((DLE_CODE + DCE_PHONE_OFF_HOOK2) in modem_data) or \
@@ -663,11 +810,11 @@ class Modem(object):
                             modem_data = ''
                         continue
 
-                print("Timeout limit exceeded: {}".format(wait_time_secs))
+                log.info("Timeout limit exceeded: %s", wait_time_secs)
                 raise RuntimeError("Timeout - wait time limit reached.")
 
             except RuntimeError as e:
-                print("Exiting wait_for_keypress({}): {}".format(wait_time_secs, e))
+                log.info("Exiting wait_for_keypress(%s): %s", wait_time_secs, e)
 
         return False, ''
 
@@ -680,6 +827,61 @@ class Modem(object):
         # Visual notification (LED)
         self.ring_indicator.ring()
 
+    def _set_voice_settings(self, *commands):
+        """
+        Applies the given voice settings, e.g., AT+FCLASS=8, AT+VSM=128,8000
+        and AT+VLS=1, sending only the settings that are not already in
+        effect. The pending settings are sent as one concatenated command
+        line if the modem accepts them, otherwise one at a time.
+            :param commands:
+                the setting commands, in the order they are to be applied
+            :return:
+                True if the settings are in effect
+        """
+        with self._lock:
+            pending = [cmd for cmd in commands if self._settings.get(cmd.split('=')[0]) != cmd]
+            if ENTER_VOICE_MODE in pending:
+                # Changing the service class resets the voice settings
+                self._reset_voice_settings()
+                pending = list(commands)
+            self.settings_skipped += len(commands) - len(pending)
+            if not pending:
+                return True
+
+            if self._combine_commands and len(pending) > 1:
+                # e.g., AT+FCLASS=8;+VSM=128,8000;+VLS=1
+                combined = pending[0] + "".join(";" + cmd[2:] for cmd in pending[1:])
+                if self._send(combined):
+                    self._settings.update((cmd.split('=')[0], cmd) for cmd in pending)
+                    return True
+                log.warning("* Warning: modem rejected concatenated commands; sending them individually")
+                self._reset_voice_settings()
+                pending = list(commands)
+                combined_failed = True
+            else:
+                combined_failed = False
+
+            for cmd in pending:
+                if not self._send(cmd):
+                    # The failure was not caused by the concatenation, e.g., a timeout
+                    log.error("* Error: modem rejected %s", cmd)
+                    self._reset_voice_settings()
+                    return False
+                self._settings[cmd.split('=')[0]] = cmd
+
+            if combined_failed:
+                # The individual commands were accepted: the modem does not support concatenation
+                log.info("Sending the modem settings individually from now on")
+                self._combine_commands = False
+            return True
+
+    def _reset_voice_settings(self):
+        """
+        Forgets the voice settings in effect so that they are sent again,
+        e.g., after a reset, hang up or error.
+        """
+        self._settings.clear()
+
     def _send(self, command, expected_response="OK", response_timeout=5):
         """
         Sends a command string (e.g., AT command) to the modem.
@@ -710,16 +912,16 @@ class Modem(object):
         """
         with self._lock:
             try:
-                if self.config["DEBUG"]:
-                    print("_send_and_read('{}','{}',{})".format(command, expected_response, response_timeout))
+                log.debug("_send_and_read('%s','%s',%s)", command, expected_response, response_timeout)
 
                 self._serial.write((command + '\r').encode())
                 self._serial.flush()
+                self.commands_sent += 1
                 # Get the execution status plus any preceeding result(s) from the modem
                 success, result = self._read_response(expected_response, response_timeout)
                 return (success, result)
             except Exception as e:
-                print("Error in _send_and_read('{}','{}',{}): {}".format(command, expected_response, response_timeout, e))
+                log.error("Error in _send_and_read('%s','%s',%s): %s", command, expected_response, response_timeout, e)
             return False, None
 
     def _read_response(self, expected_response, response_timeout_secs):
@@ -742,8 +944,7 @@ class Modem(object):
                 modem_data = self._serial.readline().decode("utf-8", "ignore")
                 if modem_data != '':
                     response += modem_data
-                    if self.config["DEBUG"]:
-                        pprint(modem_data)
+                    log.debug("%r", modem_data)
                     if expected_response is None:
                         return (True, None)
 
@@ -751,75 +952,132 @@ class Modem(object):
                         return (True, response)
 
                     elif "ERROR" in response:
-                        if self.config["DEBUG"]:
-                            print(">>> _read_response returned ERROR")
+                        log.debug(">>> _read_response returned ERROR")
                         return (False, response)
 
                 if (datetime.now() - start_time).seconds > response_timeout_secs:
-                    if self.config["DEBUG"]:
-                        print(">>> _read_response('{}',{}) timed out".format(expected_response, response_timeout_secs))
+                    log.debug(">>> _read_response('%s',%s) timed out", expected_response, response_timeout_secs)
                     return (False, response)
 
         except Exception as e:
-            print("Error in _read_response('{}',{}): {}".format(expected_response, response_timeout_secs, e))
+            log.error("Error in _read_response('%s',%s): %s", expected_response, response_timeout_secs, e)
         return (False, None)
 
     def _open_serial_port(self):
         """
         Detects and opens the first serial port that is attached to a voice modem.
+        The last known modem device is tried first, then the remaining ports
+        are probed concurrently.
             :return:
                 True if a modem was successfuly detected and initialized, else False
         """
-        print("Opening serial port")
+        log.info("Opening serial port")
         if self.is_open:
             return True
 
+        started = time.monotonic()
         if self.config["MODEM_DEVICE"] != "":
-            com_ports_list = self.config["MODEM_DEVICE"].split(",")
+            # Explicitly configured devices are used as given, which allows
+            # a pseudo-terminal (e.g., /dev/pts/3 from modemsim.py) to be used
+            com_ports_list = [port.strip() for port in self.config["MODEM_DEVICE"].split(",")]
         else:
             # List all the Serial COM Ports on device
             proc = subprocess.Popen(['ls /dev/tty[A-Za-z]*'], shell=True, stdout=subprocess.PIPE)
             com_ports = proc.communicate()[0].decode("utf-8", "ignore")
-            com_ports_list = com_ports.split('\n')
-
-        # Find the right port associated with the Voice Modem
-        success = True
-        for com_port in com_ports_list:
-            if 'tty' in com_port:
-                # Try to open the COM Port and execute AT Command
-                try:
-                    # Initialize the serial port and attempt to open
-                    self._init_serial_port(com_port)
-                    self._serial.open()
-                except Exception as e:
-                    print("Warning: _open_serial_port failed: {}, {}".format(self._serial.port, e))
-                    success = False
-                else:
-                    # Detect the modem model
-                    if self._detect_modem():
-                        print("Serial port opened on {}".format(self._serial.port))
-                        # Exit the loop after preparing the modem for use
-                        success = self._init_modem()
-                        break
-                    else:
-                        if self.config["DEBUG"]:
-                            print("Failed to detect a compatible modem on {}".format(self._serial.port))
-                        if self._serial.is_open:
-                            self._serial.close()
-                        # Loop to next com port
+            com_ports_list = [port for port in com_ports.split('\n') if 'tty' in port]
+
+        # Skip the ports in use by another line
+        with _ports_lock:
+            com_ports_list = [port for port in com_ports_list if port and port not in _claimed_ports]
+
+        # Try the last known modem device(s) first
+        cache = read_modem_cache(self.config)
+        success = False
+        for com_port in [port for port in com_ports_list if port in cache]:
+            if self._open_modem(com_port, cache[com_port]):
+                success = True
+                break
+            com_ports_list.remove(com_port)
+
+        if not success:
+            # Probe the remaining ports concurrently
+            probe_start = time.monotonic()
+            found = probe_ports(com_ports_list)
+            self.timings["probe"] = time.monotonic() - probe_start
+            log.debug("Modem probe found: %s", found)
+            for com_port in found:
+                if self._open_modem(com_port):
+                    success = True
+                    break
+
+        self.timings["total"] = time.monotonic() - started
+        log.info("Modem startup timings: %s",
+                 ", ".join("{} {:.2f}s".format(phase, secs) for phase, secs in self.timings.items()))
         return success
 
+    def _open_modem(self, com_port, cached=None):
+        """
+        Opens, identifies and initializes the modem on the given port.
+            :param com_port:
+                The OS com port
+            :param cached:
+                The last known model and profile signature for the port, if any
+            :return:
+                True if successful
+        """
+        # Try to open the COM Port and execute AT Command
+        try:
+            # Initialize the serial port and attempt to open
+            self._init_serial_port(com_port)
+            self._serial.open()
+        except Exception as e:
+            log.warning("Warning: _open_serial_port failed: %s, %s", self._serial.port, e)
+            return False
+
+        # Detect the modem model; a cached model skips the firmware queries
+        phase_start = time.monotonic()
+        if not self._detect_modem(cached.get("model") if cached else None):
+            log.debug("Failed to detect a compatible modem on %s", self._serial.port)
+            if self._serial.is_open:
+                self._serial.close()
+            return False
+        self.timings["detect"] = time.monotonic() - phase_start
+        log.info("Serial port opened on %s", self._serial.port)
+
+        # Prepare the modem for use; the profile is only saved when the settings changed
+        phase_start = time.monotonic()
+        signature = self._profile_signature()
+        save_profile = not cached or cached.get("model") != self.model or cached.get("profile") != signature
+        if not self._init_modem(save_profile):
+            self._serial.close()
+            return False
+        self.timings["init"] = time.monotonic() - phase_start
+
+        with _ports_lock:
+            _claimed_ports.add(com_port)
+        write_modem_cache(self.config, com_port, {"model": self.model, "profile": signature})
+        return True
+
+    def _profile_signature(self):
+        """
+        Returns a string that identifies the settings stored in the modem's profile.
+        """
+        return ";".join((self.model, self.config["OPTIONAL_MODEM_INIT"], ENABLE_VERBOSE_CODES,
+                         DISABLE_ECHO_COMMANDS, self.ENABLE_FORMATTED_CID))
+
     def _close_serial_port(self):
         """
         Closes the serial port attached to the modem.
         """
         try:
             if self._serial.is_open:
-                print("-> Closing modem serial port")
+                log.info("-> Closing modem serial port")
                 self._serial.close()
                 self.is_open = False
+                with _ports_lock:
+                    _claimed_ports.discard(self._serial.port)
         except Exception as e:
-            print("Error: _close_serial_port failed: {}".format(e))
+            log.error("Error: _close_serial_port failed: %s", e)
 
     def _init_serial_port(self, com_port):
         """
@@ -828,29 +1086,16 @@ class Modem(object):
             :param com_port:
                 The OS com port
         """
-        self._serial.port = com_port
-        self._serial.baudrate = 57600                   # bps
-        self._serial.bytesize = serial.EIGHTBITS        # number of bits per bytes
-        self._serial.parity = serial.PARITY_NONE        # set parity check: no parity
-        self._serial.stopbits = serial.STOPBITS_ONE     # number of stop bits
-        self._serial.timeout = 3                        # timeout for read
-        self._serial.writeTimeout = 3                   # timeout for write
-        self._serial.xonxoff = False                    # disable software flow control
-        self._serial.rtscts = False                     # disable hardware (RTS/CTS) flow control
-        self._serial.dsrdtr = False                     # disable hardware (DSR/DTR) flow control
+        configure_serial_port(self._serial, com_port)
 
-    def _detect_modem(self):
+    def _detect_modem(self, model=None):
         """
         Auto-detects the existance of a modem on the serial port, and sets model property.
+            :param model:
+                The last known model on this port, if any; skips the firmware queries
             :return: True if successful, else False
         """
-        print("Looking for modem on {}".format(self._serial.port))
-
-        global SET_VOICE_COMPRESSION, DISABLE_SILENCE_DETECTION, \
-            ENABLE_SILENCE_DETECTION_5_SECS, ENABLE_SILENCE_DETECTION_10_SECS, \
-            DTE_RAISE_VOLUME, DTE_LOWER_VOLUME, DTE_END_VOICE_DATA_TX, \
-            DTE_END_VOICE_DATA_RX, DTE_CLEAR_TRANSMIT_BUFFER, \
-            ENABLE_FORMATTED_CID
+        log.info("Looking for modem on %s", self._serial.port)
 
         # Test if connected to a modem using basic AT command.
         self._serial.reset_input_buffer()
@@ -861,64 +1106,86 @@ class Modem(object):
         (success, result) = self._send_and_read(GET_MODEM_PRODUCT_CODE)
 
         if success:
-            # Query firmware ID
-            self._send_and_read(GET_MODEM_FIRMWARE_ID)
             if USR_5637_PRODUCT_CODE in result:
-                print("*** US Robotics modem detected ***")
+                detected = "USR"
+            elif CONEXANT_PRODUCT_CODE in result:
+                detected = "CONEXANT"
+            else:
+                detected = "UNKNOWN"
+            # The firmware queries are only informational; skip them for the last known model
+            query_firmware = detected != model
+
+            if query_firmware:
+                # Query firmware ID
+                self._send_and_read(GET_MODEM_FIRMWARE_ID)
+            if detected == "USR":
+                log.info("*** US Robotics modem detected ***")
                 self.model = "USR"
 
-            elif CONEXANT_PRODUCT_CODE in result:
+            elif detected == "CONEXANT":
                 self.model = "CONEXANT"
-                # Define the settings for the Zoom3905 where they differ from the USR5637
-                SET_VOICE_COMPRESSION = SET_VOICE_COMPRESSION_CONEXANT
-                DISABLE_SILENCE_DETECTION = DISABLE_SILENCE_DETECTION_CONEXANT
-                ENABLE_SILENCE_DETECTION_5_SECS = ENABLE_SILENCE_DETECTION_5_SECS_CONEXANT
-                ENABLE_SILENCE_DETECTION_10_SECS = ENABLE_SILENCE_DETECTION_10_SECS_CONEXANT
-                ENABLE_FORMATTED_CID = ENABLE_FORMATTED_CID_CONEXANT
-                # Query firmware patch level
-                self._send_and_read(GET_MODEM_PATCH_LEVEL_CONEXANT)
-                print("*** Conextant modem detected ***")
+                self._use_conexant_commands()
+                if query_firmware:
+                    # Query firmware patch level
+                    self._send_and_read(GET_MODEM_PATCH_LEVEL_CONEXANT)
+                log.info("*** Conextant modem detected ***")
             else:
-                print("******* Unknown modem detected **********")
+                log.info("******* Unknown modem detected **********")
                 # We'll try to use the modem with the predefined USR AT commands if it supports VOICE mode.
                 if self._send(ENTER_VOICE_MODE):
                     self.model = "UNKNOWN"
                     # Use the default settings (used by the USR 5637 modem)
                 else:
-                    print("Error: Failed detect a compatible modem")
+                    log.error("Error: Failed detect a compatible modem")
                     self.modem = None
                     success = False
 
         return success
 
-    def _init_modem(self):
+    def _use_conexant_commands(self):
+        """
+        Define the settings for the Zoom3905 where they differ from the USR5637
+        """
+        self.SET_VOICE_COMPRESSION = SET_VOICE_COMPRESSION_CONEXANT
+        self.DISABLE_SILENCE_DETECTION = DISABLE_SILENCE_DETECTION_CONEXANT
+        self.ENABLE_SILENCE_DETECTION_5_SECS = ENABLE_SILENCE_DETECTION_5_SECS_CONEXANT
+        self.ENABLE_SILENCE_DETECTION_10_SECS = ENABLE_SILENCE_DETECTION_10_SECS_CONEXANT
+        self.ENABLE_FORMATTED_CID = ENABLE_FORMATTED_CID_CONEXANT
+
+    def _init_modem(self, save_profile=True):
         """
         Initializes/configures the modem device in preparation for call attendant tasks.
+            :param save_profile:
+                If True, the settings are saved to the modem's stored profile
             :return:
                 True if successful, otherwise False
         """
-        if self.config["DEBUG"]:
-            print("Initializing modem settings")
+        log.debug("Initializing modem settings")
+        # The reset restores the modem's default settings
+        self._reset_voice_settings()
         try:
             if not self._send(RESET):
-                print("Error: Unable reset to factory default")
+                log.error("Error: Unable reset to factory default")
             if self.config["OPTIONAL_MODEM_INIT"]:
                 self._send(self.config["OPTIONAL_MODEM_INIT"])
             if not self._send(ENABLE_VERBOSE_CODES):
-                print("Error: Unable set response in verbose form")
+                log.error("Error: Unable set response in verbose form")
             if not self._send(DISABLE_ECHO_COMMANDS):
-                print("Error: Failed to disable local echo mode")
-            if not self._send(ENABLE_FORMATTED_CID):
-                print("Error: Failed to enable formatted caller report.")
+                log.error("Error: Failed to disable local echo mode")
+            if not self._send(self.ENABLE_FORMATTED_CID):
+                log.error("Error: Failed to enable formatted caller report.")
 
-            # Save these settings to a profile
-            if not self._send("AT&W0"):
-                print("Error: Failed to store profile.")
+            if save_profile:
+                # Save these settings to a profile
+                if not self._send("AT&W0"):
+                    log.error("Error: Failed to store profile.")
 
-            # Output the modem settings to the log
-            self._send(GET_MODEM_SETTINGS)
+                # Output the modem settings to the log
+                self._send(GET_MODEM_SETTINGS)
+            else:
+                log.debug("Modem profile is unchanged; skipping AT&W0")
 
         except Exception as e:
-            print("Error: _init_modem failed: {}".format(e))
+            log.error("Error: _init_modem failed: %s", e)
             return False
         return True
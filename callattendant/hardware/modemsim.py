@@ -0,0 +1,498 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+#
+#  modemsim.py
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+
+# ==============================================================================
+# A voice modem simulator presented on a pseudo-terminal (Linux/POSIX only).
+# It implements the subset of the AT command set used by the Modem class so
+# that the call attendant can be run and benchmarked without modem hardware.
+#
+# Usage: python modemsim.py [--model USR|CONEXANT] [--speed N] [--jitter N]
+#                           [--calls N] [--interval SECS] [--digits KEYS]
+# Then set MODEM_DEVICE to the device path printed at startup.
+# ==============================================================================
+
+import os
+import random
+import re
+import select
+import sys
+import threading
+import time
+import tty
+from datetime import datetime
+
+DLE = b'\x10'
+ETX = b'\x03'
+
+# Responses to the ATI0 product code query
+PRODUCT_CODES = {"USR": "5601", "CONEXANT": "56000"}
+
+# In North America, the standard ring cadence is "2-4", or two seconds
+# of ringing followed by four seconds of silence.
+RING_CADENCE = 6.0      # secs
+CID_DELAY = 0.5         # secs from the first RING to the CID data
+KEYPRESS_DELAY = 2.0    # secs from going off-hook to the caller's keypress
+
+# The modem sends 8-bit linear audio at 8.0 kHz
+SAMPLE_RATE = 8000
+AUDIO_CHUNK = 1024
+
+
+class ModemSimulator(object):
+    """
+    Simulates a USR 5637 or Conexant voice modem on a pseudo-terminal.
+    Incoming calls are emitted as RING and caller ID bursts, caller key
+    presses as DLE shielded DTMF codes, and "recorded" audio as an 8-bit
+    linear data stream. All delays are divided by the speed factor and
+    varied by the jitter fraction.
+    """
+
+    def __init__(self, model="USR", speed=1.0, jitter=0.0, message_secs=3.0,
+                 concatenation=True, debug=False):
+        """
+        Constructor.
+            :param model:
+                The modem model to simulate: "USR" or "CONEXANT"
+            :param speed:
+                Clock acceleration factor, e.g., 10 runs ten times faster than real time
+            :param jitter:
+                Random variation applied to each delay, as a fraction of the delay
+            :param message_secs:
+                Length of the voice data streamed to the DTE before silence
+            :param concatenation:
+                If False, command lines containing several commands are rejected
+            :param debug:
+                If True, the AT commands received are printed
+        """
+        self.model = model
+        self.speed = speed
+        self.jitter = jitter
+        self.message_secs = message_secs
+        self.concatenation = concatenation
+        self.debug = debug
+
+        # Create the pseudo-terminal; the DTE opens the slave device
+        self._master_fd, self._slave_fd = os.openpty()
+        tty.setraw(self._slave_fd)
+        self.device = os.ttyname(self._slave_fd)
+
+        # Modem state
+        self.echo = True
+        self.fclass = 0
+        self.off_hook = False
+        self.mode = "command"   # command, transmit or receive
+
+        # The number of upcoming command lines answered with ERROR, e.g., a busy modem
+        self.errors = 0
+
+        # Statistics used for benchmarking
+        self.commands_received = 0
+        self.audio_bytes_received = 0
+        self.calls_completed = 0
+        self.first_audio_times = []
+
+        self._calls = []
+        self._digits = ""
+        self._off_hook_time = None
+        self._call_started = None
+        self._write_lock = threading.Lock()
+        self._stop_flag = False
+        self._threads = []
+
+    def start(self):
+        """
+        Starts the threads that respond to commands and emit calls.
+        """
+        for target, name in ((self._command_handler, "modemsim_commands"),
+                             (self._line_handler, "modemsim_line")):
+            thread = threading.Thread(target=target, name=name)
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+        return self.device
+
+    def stop(self):
+        """
+        Stops the simulator threads and closes the pseudo-terminal.
+        """
+        self._stop_flag = True
+        for thread in self._threads:
+            thread.join()
+        os.close(self._master_fd)
+        os.close(self._slave_fd)
+
+    def add_call(self, number, name, rings=4, digits="", delay=0.0, date=None):
+        """
+        Queues an incoming call.
+            :param number:
+                The caller's number reported in the CID data
+            :param name:
+                The caller's name reported in the CID data
+            :param rings:
+                The number of rings before the caller hangs up
+            :param digits:
+                Keys pressed by the caller after the call is answered
+            :param delay:
+                Seconds to wait before the first ring
+            :param date:
+                Optional datetime for the CID data; defaults to now
+        """
+        self._calls.append({"NMBR": number, "NAME": name, "rings": rings,
+                            "digits": digits, "delay": delay, "date": date})
+
+    def add_transcript(self, lines, delay=0.0):
+        """
+        Queues a recorded modem transcript for replay, e.g., ["RING",
+        "DATE=0801", "TIME=1801", "NMBR=8055554567", "NAME=Caller", ""].
+        The CID data follows a RING after the usual delay, and an empty
+        line is a pause of one ring cadence.
+            :param lines:
+                The modem output lines, without the CR/LF
+            :param delay:
+                Seconds to wait before the first line
+        """
+        self._calls.append({"transcript": list(lines), "delay": delay})
+
+    @property
+    def pending_calls(self):
+        return len(self._calls)
+
+    def _delay(self, secs):
+        """
+        Returns the given delay scaled by the speed and varied by the jitter.
+        """
+        if self.jitter:
+            secs += secs * random.uniform(-self.jitter, self.jitter)
+        return max(0.0, secs / self.speed)
+
+    def _sleep(self, secs):
+        """
+        Sleeps for a scaled delay; returns False if the simulator was stopped.
+        """
+        end = time.monotonic() + self._delay(secs)
+        while not self._stop_flag:
+            remaining = end - time.monotonic()
+            if remaining <= 0:
+                return True
+            time.sleep(min(remaining, 0.05))
+        return False
+
+    def _write(self, data):
+        if isinstance(data, str):
+            data = data.encode()
+        with self._write_lock:
+            os.write(self._master_fd, data)
+
+    def _respond(self, result):
+        """
+        Writes a verbose result code, e.g., OK, preceded and followed by CR/LF.
+        """
+        self._write("\r\n{}\r\n".format(result))
+
+    def _line_handler(self):
+        """
+        Thread function that emits the queued calls and the caller's key presses.
+        """
+        while not self._stop_flag:
+            if self._calls and not self.off_hook:
+                call = self._calls.pop(0)
+                if not self._sleep(call["delay"]):
+                    break
+                if "transcript" in call:
+                    self._replay(call["transcript"])
+                else:
+                    self._ring(call)
+            else:
+                time.sleep(0.01)
+
+    def _press_key(self):
+        """
+        Emits the caller's next key press as a DLE shielded DTMF code,
+        e.g., <DLE>/<DLE>1<DLE>~, once the call has been answered.
+        """
+        if self.off_hook and self._digits and self.mode == "command" and \
+                time.monotonic() - self._off_hook_time > self._delay(KEYPRESS_DELAY):
+            digit, self._digits = self._digits[0], self._digits[1:]
+            self._write(DLE + b'/' + DLE + digit.encode() + DLE + b'~')
+
+    def _ring(self, call):
+        """
+        Emits the RING and caller ID data for a call until the call is
+        answered or the caller hangs up.
+        """
+        date = call["date"] or datetime.now()
+        self._digits = call["digits"]
+        self._call_started = time.monotonic()
+        for ring in range(call["rings"]):
+            if self.off_hook:
+                break
+            self._write("\r\nRING\r\n")
+            if ring == 0:
+                if not self._sleep(CID_DELAY):
+                    return
+                self._write("\r\nDATE={}\r\nTIME={}\r\nNMBR={}\r\nNAME={}\r\n\r\n".format(
+                    date.strftime("%m%d"), date.strftime("%H%M"), call["NMBR"], call["NAME"]))
+                if not self._sleep(RING_CADENCE - CID_DELAY):
+                    return
+            elif not self._sleep(RING_CADENCE):
+                return
+        # Wait for an answered call to be completed
+        while self.off_hook and not self._stop_flag:
+            self._press_key()
+            time.sleep(0.01)
+        self.calls_completed += 1
+
+    def _replay(self, lines):
+        """
+        Emits the lines of a recorded transcript.
+        """
+        for line in lines:
+            if line == "":
+                if not self._sleep(RING_CADENCE):
+                    return
+                continue
+            self._write("\r\n{}\r\n".format(line))
+            if line == "RING" and not self._sleep(CID_DELAY):
+                return
+
+    def _command_handler(self):
+        """
+        Thread function that reads and executes the commands sent by the DTE.
+        """
+        buffer = b''
+        while not self._stop_flag:
+            readable, _, _ = select.select([self._master_fd], [], [], 0.05)
+            if not readable:
+                continue
+            try:
+                data = os.read(self._master_fd, 4096)
+            except OSError:
+                # The DTE closed the device
+                time.sleep(0.05)
+                continue
+
+            if self.mode == "transmit":
+                buffer = self._transmit(buffer + data)
+                continue
+            if self.mode == "receive":
+                # Look for the DTE's end of receive data request: <DLE>! or <DLE>^
+                if (DLE + b'!') in data or (DLE + b'^') in data:
+                    self.mode = "command"
+                    self._write(DLE + ETX)
+                    self._respond("OK")
+                continue
+
+            buffer += data
+            while b'\r' in buffer:
+                line, buffer = buffer.split(b'\r', 1)
+                line = line.strip(b'\n').decode("utf-8", "ignore")
+                if self.echo:
+                    self._write(line + "\r")
+                if line.strip() != "":
+                    self._execute(line.strip())
+                if self.mode == "transmit":
+                    buffer = self._transmit(buffer)
+                    break
+
+    def _transmit(self, data):
+        """
+        Consumes audio data sent by the DTE until <DLE><ETX> is found.
+            :return: unconsumed data following the end of transmission
+        """
+        if self.audio_bytes_received == 0 and data and self._call_started is not None:
+            self.first_audio_times.append(time.monotonic() - self._call_started)
+        idx = data.find(DLE + ETX)
+        if idx == -1:
+            self.audio_bytes_received += len(data)
+            return b''
+        self.audio_bytes_received += idx
+        self.mode = "command"
+        self._respond("OK")
+        return data[idx + 2:]
+
+    def _receive(self):
+        """
+        Thread function that streams "recorded" audio data to the DTE:
+        a tone for message_secs, followed by silence.
+        """
+        tone = bytes([64, 192]) * (AUDIO_CHUNK // 2)
+        silence = bytes([128]) * AUDIO_CHUNK
+        sent = 0
+        while self.mode == "receive" and not self._stop_flag:
+            message = sent < self.message_secs * SAMPLE_RATE
+            self._write(tone if message else silence)
+            sent += AUDIO_CHUNK
+            time.sleep(self._delay(AUDIO_CHUNK / SAMPLE_RATE))
+
+    def _execute(self, line):
+        """
+        Executes a command line. Commands may be concatenated with ';', e.g.,
+        AT+FCLASS=8;+VSM=128,8000;+VLS=1
+        """
+        self.commands_received += 1
+        if self.debug:
+            print("modemsim: {}".format(line))
+
+        if line.startswith(DLE.decode()):
+            # <DLE><ETX> or <DLE>! outside of a data state
+            self._respond("OK")
+            return
+        if not line.upper().startswith("AT"):
+            self._respond("ERROR")
+            return
+
+        if self.errors > 0:
+            self.errors -= 1
+            self._respond("ERROR")
+            return
+
+        commands = [c.strip() for c in line[2:].split(';')]
+        if len(commands) > 1 and not self.concatenation:
+            self._respond("ERROR")
+            return
+        result = "OK"
+        for command in commands:
+            result = self._execute_command(command.upper())
+            if result != "OK":
+                break
+        if result is not None:
+            self._respond(result)
+
+    def _execute_command(self, command):
+        """
+        Executes a single command.
+            :return: the result code, or None if the result was already sent
+        """
+        if command in ("", "Z", "Z0", "&F"):
+            if command != "":
+                self.echo = True
+                self.fclass = 0
+            return "OK"
+        if command == "I0":
+            self._write("\r\n{}\r\n".format(PRODUCT_CODES.get(self.model, "0000")))
+            return "OK"
+        if command == "I3":
+            self._write("\r\nSimulated {} Voice Modem\r\n".format(self.model))
+            return "OK"
+        if command == "-PV":
+            if self.model != "CONEXANT":
+                return "ERROR"
+            self._write("\r\nSimulated patch level\r\n")
+            return "OK"
+        if command == "&V":
+            self._write("\r\nACTIVE PROFILE:\r\nE{} V1 +FCLASS={}\r\n".format(
+                1 if self.echo else 0, self.fclass))
+            return "OK"
+        if command in ("E0", "E1"):
+            self.echo = command == "E1"
+            return "OK"
+        if command in ("H", "H0"):
+            self._on_hook()
+            return "OK"
+        if command == "H1":
+            self._go_off_hook()
+            return "OK"
+        if command.startswith("+FCLASS="):
+            value = command.split("=")[1]
+            if value not in ("0", "1", "8"):
+                return "ERROR"
+            self.fclass = int(value)
+            return "OK"
+
+        # The voice commands require voice mode
+        if command.startswith("+V") and self.fclass != 8 and not command.startswith("+VCID"):
+            return "ERROR"
+        if command.startswith("+VLS="):
+            if command.split("=")[1] == "0":
+                self._on_hook()
+            else:
+                self._go_off_hook()
+            return "OK"
+        if command == "+VTX":
+            self.mode = "transmit"
+            self.audio_bytes_received = 0
+            self._respond("CONNECT")
+            return None
+        if command == "+VRX":
+            self.mode = "receive"
+            self._respond("CONNECT")
+            thread = threading.Thread(target=self._receive, name="modemsim_receive")
+            thread.daemon = True
+            thread.start()
+            return None
+        if command.startswith("+VTS="):
+            # Play the beep
+            self._sleep(1.2)
+            return "OK"
+
+        # Settings without side effects
+        if re.match(r"^(V1|&W0|\+VCID=\d|-SCID=\d|-STE=\d|\+VSM=[\d,]+|\+VSD=[\d,]+)$", command):
+            return "OK"
+        return "ERROR"
+
+    def _go_off_hook(self):
+        if not self.off_hook:
+            self._off_hook_time = time.monotonic()
+        self.off_hook = True
+
+    def _on_hook(self):
+        self.off_hook = False
+        self.mode = "command"
+        self._digits = ""
+
+
+def main(argv):
+    """
+    Runs the simulator with a stream of synthetic calls.
+    """
+    import argparse
+    parser = argparse.ArgumentParser(description="Voice modem simulator")
+    parser.add_argument("--model", default="USR", choices=PRODUCT_CODES.keys())
+    parser.add_argument("--speed", type=float, default=1.0, help="clock acceleration factor")
+    parser.add_argument("--jitter", type=float, default=0.0, help="delay variation, e.g., 0.1 for 10%%")
+    parser.add_argument("--calls", type=int, default=0, help="number of synthetic calls")
+    parser.add_argument("--interval", type=float, default=30.0, help="secs between calls")
+    parser.add_argument("--rings", type=int, default=4, help="rings per call")
+    parser.add_argument("--digits", default="", help="keys pressed by each caller")
+    parser.add_argument("--debug", action="store_true")
+    args = parser.parse_args(argv[1:])
+
+    simulator = ModemSimulator(args.model, args.speed, args.jitter, debug=args.debug)
+    for i in range(args.calls):
+        simulator.add_call("555{:07d}".format(random.randint(0, 9999999)),
+                           "CALLER {}".format(i + 1), args.rings, args.digits,
+                           delay=args.interval if i > 0 else 0.0)
+    print("Simulated {} modem on {}".format(args.model, simulator.start()), flush=True)
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        simulator.stop()
+    return 0
+
+
+if __name__ == '__main__':
+
+    sys.exit(main(sys.argv))
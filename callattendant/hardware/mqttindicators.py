@@ -25,17 +25,34 @@
 
 import time
 import threading
+from collections import OrderedDict
 
 import paho.mqtt.client as mqtt
 
+from logconfig import get_logger
+
+log = get_logger("indicators")
+
 # Client singleton
 mqtt_client = None
 
+# Automatic reconnect delays (secs): doubled after each failed attempt, up to the maximum
+RECONNECT_DELAY = 1
+RECONNECT_DELAY_MAX = 60
+
+
 class MQTTIndicatorClient(object):
     """
     Class for controlling the MQTT client.
+    One long-lived client connection is shared by all the indicators.
+    The client's network loop runs on its own thread and reconnects
+    automatically. Messages are published from a bounded queue by a
+    sender thread, so an indicator change never waits on the broker.
+    Rapid state changes are coalesced: only the latest unsent message
+    for a topic is published.
     """
-    def __init__(self, host, port=1883, topic_prefix='callattendant', username=None, password=None):
+    def __init__(self, host, port=1883, topic_prefix='callattendant', username=None, password=None,
+                 qos=0, retain=True, queue_size=100):
         global mqtt_client
         if mqtt_client is None:
             # No need to re-init
@@ -45,20 +62,125 @@ class MQTTIndicatorClient(object):
             self.port = port
             self.username = username
             self.password = password
+            self.qos = qos
+            self.retain = retain
+            self.queue_size = queue_size
             # Create client root name
             self.topic_prefix = topic_prefix + "/"
 
+            # Number of messages published, replaced by a newer message
+            # for the same topic, and dropped because the queue was full
+            self.published = 0
+            self.coalesced = 0
+            self.dropped = 0
+
+            self._pending = OrderedDict()
+            self._lock = threading.Condition()
+            self._connected = False
+            self._stop_flag = False
+
+            if hasattr(mqtt, "CallbackAPIVersion"):
+                # paho-mqtt 2.x
+                self.client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2)
+            else:
+                self.client = mqtt.Client()
+            if self.username:
+                self.client.username_pw_set(self.username, self.password)
+            self.client.on_connect = self._on_connect
+            self.client.on_disconnect = self._on_disconnect
+            self.client.reconnect_delay_set(RECONNECT_DELAY, RECONNECT_DELAY_MAX)
+            self.client.connect_async(self.server, self.port)
+            self.client.loop_start()
+
+            self._thread = threading.Thread(target=self._sender)
+            self._thread.name = "mqtt_sender"
+            self._thread.daemon = True
+            self._thread.start()
+
     def publish(self, topic, message):
         """
-        Publish a message to a topic.
+        Queue a message for publishing to a topic.
+        A message waiting for the same topic is replaced.
+            :param topic:
+                The topic name, without the prefix
+            :param message:
+                The message; a timestamp is appended
         """
-        client = mqtt.Client()
-        if self.username is not None:
-            client.username_pw_set(self.username, self.password)
-        client.connect(self.server, self.port)
         ts = time.strftime(" (%Y-%m-%d %H:%M:%S)", time.localtime())
-        client.publish(self.topic_prefix + topic, str(message) + ts, retain=True)
-        client.disconnect()
+        with self._lock:
+            if topic in self._pending:
+                del self._pending[topic]
+                self.coalesced += 1
+            elif len(self._pending) >= self.queue_size:
+                self._pending.popitem(last=False)
+                self.dropped += 1
+            self._pending[topic] = str(message) + ts
+            self._lock.notify()
+
+    @property
+    def pending_count(self):
+        """
+        The number of messages waiting to be published.
+        """
+        with self._lock:
+            return len(self._pending)
+
+    def close(self, timeout=2.0):
+        """
+        Publishes the queued messages, waiting up to timeout seconds
+        for the broker, and disconnects the client.
+        """
+        global mqtt_client
+        with self._lock:
+            self._stop_flag = True
+            self._lock.notify()
+        self._thread.join(timeout)
+        self.client.disconnect()
+        self.client.loop_stop()
+        if mqtt_client is self:
+            mqtt_client = None
+
+    def _on_connect(self, client, userdata, flags, rc, *args):
+        if rc == 0:
+            log.info("MQTT client connected to %s:%s", self.server, self.port)
+        else:
+            log.warning("* MQTT connection to %s:%s refused: %s", self.server, self.port, rc)
+        with self._lock:
+            self._connected = (rc == 0)
+            self._lock.notify()
+
+    def _on_disconnect(self, client, userdata, *args):
+        if not self._stop_flag:
+            log.warning("* MQTT client disconnected from %s:%s; reconnecting", self.server, self.port)
+        with self._lock:
+            self._connected = False
+
+    def _sender(self):
+        """
+        Thread function that publishes the queued messages while connected.
+        """
+        while True:
+            with self._lock:
+                while not (self._connected and self._pending) and not self._stop_flag:
+                    self._lock.wait()
+                if not (self._connected and self._pending):
+                    # Stopped, and there is nothing that can be sent
+                    break
+                topic, message = self._pending.popitem(last=False)
+
+            info = self.client.publish(self.topic_prefix + topic, message, qos=self.qos, retain=self.retain)
+            if info.rc == mqtt.MQTT_ERR_NO_CONN:
+                # Lost the connection; keep the message unless superseded
+                with self._lock:
+                    self._connected = False
+                    if topic not in self._pending:
+                        self._pending[topic] = message
+                        self._pending.move_to_end(topic, last=False)
+            elif info.rc != mqtt.MQTT_ERR_SUCCESS:
+                log.error("* Error publishing MQTT topic %s: %s", topic, mqtt.error_string(info.rc))
+                self.dropped += 1
+            else:
+                self.published += 1
 
 
 class MQTTIndicator(object):
@@ -75,14 +197,14 @@ class MQTTIndicator(object):
         self.blink_timer = None
 
     def turn_on(self):
-        print("{} LED turned on".format(self.topic))
+        log.info("%s LED turned on", self.topic)
         if self.blink_timer is not None:
             self.blink_timer.cancel()
             self.blink_timer = None
         self.mqtt_client.publish(self.topic, "ON")
 
     def turn_off(self):
-        print("{} LED turned off".format(self.topic))
+        log.info("%s LED turned off", self.topic)
         if self.blink_timer is not None:
             self.blink_timer.cancel()
             self.blink_timer = None
@@ -91,10 +213,10 @@ class MQTTIndicator(object):
     def blink(self, max_times=10):
         # Just say we're blinking
         if max_times is None:
-            print("{} LED blinking".format(self.topic))
+            log.info("%s LED blinking", self.topic)
             max_times = 0
         else:
-            print("{} LED blinking: {} times".format(self.topic, max_times))
+            log.info("%s LED blinking: %s times", self.topic, max_times)
         self.mqtt_client.publish(self.topic, "BLINK {}".format(max_times))
         if max_times > 0 and self.blink_timer is None:
             self.blink_timer = threading.Timer(0.7 * max_times, self.turn_off)
@@ -102,10 +224,10 @@ class MQTTIndicator(object):
 
     def pulse(self, max_times=10):
         if max_times is None:
-            print("{} LED pulsing".format(self.topic))
+            log.info("%s LED pulsing", self.topic)
             max_times = 0
         else:
-            print("{} LED pulsing: {} times".format(self.topic, max_times))
+            log.info("%s LED pulsing: %s times", self.topic, max_times)
         self.mqtt_client.publish(self.topic, "PULSE {}".format(max_times))
         if max_times > 0 and self.blink_timer is None:
             self.blink_timer = threading.Timer(2.0 * max_times, self.turn_off)
@@ -158,7 +280,7 @@ class MQTTMessageCountIndicator(MQTTIndicator):
     @display.setter
     def display(self, value):
         self.count = value
-        print("{} indicator set to {}".format(self.topic, self.count))
+        log.info("%s indicator set to %s", self.topic, self.count)
         self.mqtt_client.publish(self.topic, value)
 
     @property
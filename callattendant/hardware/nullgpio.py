@@ -22,6 +22,11 @@
 #  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 #  SOFTWARE.
 
+from logconfig import get_logger
+
+log = get_logger("indicators")
+
+
 class DummyLED(object):
     """
     Generic LED class.
@@ -31,23 +36,23 @@ class DummyLED(object):
         self.name = name
 
     def turn_on(self):
-        print("{} LED turned on".format(self.name))
+        log.info("%s LED turned on", self.name)
 
     def blink(self, max_times=10):
         # Just say we're blinking
         if not max_times:
-            print("{} LED blinking".format(self.name))
+            log.info("%s LED blinking", self.name)
         else:
-            print("{} LED blinking: {} times".format(self.name, max_times))
+            log.info("%s LED blinking: %s times", self.name, max_times)
 
     def pulse(self, max_times=10):
         if not max_times:
-            print("{} LED pulsing".format(self.name))
+            log.info("%s LED pulsing", self.name)
         else:
-            print("{} LED pulsing: {} times".format(self.name, max_times))
+            log.info("%s LED pulsing: %s times", self.name, max_times)
 
     def turn_off(self):
-        print("{} LED turned off".format(self.name))
+        log.info("%s LED turned off", self.name)
 
     def close(self):
         pass
@@ -106,7 +111,7 @@ class MessageCountIndicator(object):
     @display.setter
     def display(self, char):
         self.count = char
-        print("MSG count: {}{}".format(char, '.' if self.dp else ''))
+        log.info("MSG count: %s%s", char, '.' if self.dp else '')
 
     @property
     def decimal_point(self):
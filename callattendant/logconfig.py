@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#  logconfig.py
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+
+
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+import time
+
+# The parent of the subsystem loggers, e.g., "callattendant.modem"
+ROOT_LOGGER = "callattendant"
+
+# The subsystems with their own logger and optional level in LOG_LEVELS
+SUBSYSTEMS = ("app", "modem", "indicators", "screening", "messaging", "webapp")
+
+TEXT_FORMAT = "%(asctime)s %(levelname)-7s %(name)s [%(threadName)s] %(message)s"
+
+_listener = None
+
+
+def get_logger(subsystem):
+    """
+    Returns the logger for a subsystem.
+        :param subsystem:
+            One of the SUBSYSTEMS names, e.g., "modem"
+    """
+    return logging.getLogger("{}.{}".format(ROOT_LOGGER, subsystem))
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Formats a log record as a single line JSON object.
+    """
+
+    def format(self, record):
+        entry = {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(record.created)) +
+                    ".{:03d}".format(int(record.msecs)),
+            "level": record.levelname,
+            "logger": record.name,
+            "thread": record.threadName,
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry)
+
+
+def setup_logging(config):
+    """
+    Configures the application loggers. The log records are put on a queue
+    by the calling thread and written by a listener thread, so the call
+    and audio threads never wait on the console, the journal or a file.
+        :param config:
+            The application-wide config object
+    """
+    global _listener
+    shutdown_logging()
+
+    if config["LOG_FORMAT"] == "json":
+        formatter = JsonFormatter()
+    else:
+        formatter = logging.Formatter(TEXT_FORMAT)
+    handlers = [logging.StreamHandler(sys.stdout)]
+    if config["LOG_FILE"]:
+        handlers.append(logging.handlers.WatchedFileHandler(config["LOG_FILE"]))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue = queue.SimpleQueue()
+    root = logging.getLogger(ROOT_LOGGER)
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+    root.propagate = False
+
+    level = config["LOG_LEVEL"] or ("DEBUG" if config["DEBUG"] else "INFO")
+    root.setLevel(level.upper())
+    for subsystem in SUBSYSTEMS:
+        get_logger(subsystem).setLevel(config["LOG_LEVELS"].get(subsystem, "NOTSET").upper())
+
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+
+
+def shutdown_logging():
+    """
+    Writes the queued log records and stops the listener thread.
+    """
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
@@ -0,0 +1,334 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#  audioprocessor.py
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+
+import math
+import os
+import shutil
+import subprocess
+import sys
+import wave
+from array import array
+from collections import Counter
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from logconfig import get_logger
+
+log = get_logger("messaging")
+
+# Define the range of amplitude values that are to be considered silence.
+# In the 8-bit audio data, silence is \0x7f or \0x80 (127.5 rounded up or down).
+# This matches the silence detection used by Modem.record_audio.
+SILENCE_THRESHOLD = 1
+SILENCE_MIN = 127 - SILENCE_THRESHOLD
+SILENCE_MAX = 128 + SILENCE_THRESHOLD
+
+# Amount of silence (secs) retained before and after the voice data
+SILENCE_PADDING = 0.25
+
+# Translation table mapping silent samples to 0 and voice samples to 1,
+# used to locate the voice data with bytes.find() instead of a python loop
+_VOICE_MASK = bytes(0 if SILENCE_MIN <= x <= SILENCE_MAX else 1 for x in range(256))
+
+# The number of points in a message's waveform thumbnail
+WAVEFORM_POINTS = 48
+
+
+def get_audio_info(filepath):
+    """
+    Returns the duration and size of the given wav file.
+        :param filepath:
+            the wav file to examine
+        :return:
+            duration (secs), size (bytes)
+    """
+    with wave.open(filepath, 'rb') as wf:
+        duration = wf.getnframes() / float(wf.getframerate())
+    return round(duration, 2), os.path.getsize(filepath)
+
+
+def get_audio_levels(filepath, points=WAVEFORM_POINTS):
+    """
+    Returns the peak and RMS levels of the given 8 or 16-bit mono wav file,
+    and a waveform thumbnail: the peak level of each of the given number of
+    slices of the audio. The levels are fractions of full scale.
+        :param filepath:
+            the wav file to examine
+        :param points:
+            the number of points in the waveform
+        :return:
+            peak, rms, waveform (a list of percentages of full scale),
+            or None, None, None if the format is not supported
+    """
+    with wave.open(filepath, 'rb') as wf:
+        params = wf.getparams()
+        frames = wf.readframes(params.nframes)
+    if params.nchannels != 1 or params.sampwidth not in (1, 2):
+        return None, None, None
+
+    if params.sampwidth == 1:
+        # Unsigned 8-bit samples centered on 128; bytes slices, min() and max() run in C
+        samples, center, full_scale = frames, 128, 128
+        sum_squares = sum(count * (value - center) ** 2 for value, count in Counter(samples).items())
+    else:
+        samples, center, full_scale = array('h'), 0, 32768
+        samples.frombytes(frames)
+        if sys.byteorder == "big":
+            samples.byteswap()
+        sum_squares = sum(value * value for value in samples)
+    if not samples:
+        return 0.0, 0.0, []
+
+    peak = min(1.0, max(max(samples) - center, center - min(samples)) / full_scale)
+    rms = math.sqrt(sum_squares / len(samples)) / full_scale
+
+    points = min(points, len(samples))
+    step = len(samples) / points
+    waveform = []
+    for n in range(points):
+        chunk = samples[int(n * step):int((n + 1) * step)]
+        level = max(max(chunk) - center, center - min(chunk)) / full_scale
+        waveform.append(min(100, round(level * 100)))
+    return round(peak, 3), round(rms, 3), waveform
+
+
+def analyze_audio(filepath):
+    """
+    Returns the audio information stored for a message.
+        :param filepath:
+            the wav file to examine
+        :return:
+            a dict with duration, size, peak, rms and waveform
+    """
+    duration, size = get_audio_info(filepath)
+    peak, rms, waveform = get_audio_levels(filepath)
+    return {"duration": duration, "size": size, "peak": peak, "rms": rms, "waveform": waveform}
+
+
+def trim_silence(filepath, padding=SILENCE_PADDING):
+    """
+    Removes the leading and trailing silence from an 8-bit linear wav file.
+    The file is rewritten in place.
+        :param filepath:
+            the wav file recorded by the modem
+        :param padding:
+            number of seconds of silence to keep around the voice data
+        :return:
+            True if the file was trimmed
+    """
+    with wave.open(filepath, 'rb') as wf:
+        params = wf.getparams()
+        if params.nchannels != 1 or params.sampwidth != 1:
+            # Only the modem's 8-bit mono format is supported
+            return False
+        frames = wf.readframes(params.nframes)
+
+    mask = frames.translate(_VOICE_MASK)
+    first = mask.find(1)
+    if first == -1:
+        # Nothing but silence; leave it for the caller to decide
+        return False
+    last = mask.rfind(1)
+
+    pad = int(params.framerate * padding)
+    start = max(0, first - pad)
+    end = min(len(frames), last + 1 + pad)
+    if start == 0 and end == len(frames):
+        return False
+
+    # Write to a temp file, then replace the original so that readers
+    # (e.g., the web app) never see a partially written file
+    temppath = filepath + ".tmp"
+    with wave.open(temppath, 'wb') as wf:
+        wf.setnchannels(params.nchannels)
+        wf.setsampwidth(params.sampwidth)
+        wf.setframerate(params.framerate)
+        wf.setcomptype('NONE', 'Not compressed')
+        wf.writeframes(frames[start:end])
+    os.replace(temppath, filepath)
+    return True
+
+
+def transcode(filepath, compression):
+    """
+    Creates a compact copy of the given wav file with an external encoder.
+        :param filepath:
+            the wav file to be encoded
+        :param compression:
+            the compression format, e.g., "FLAC"
+        :return:
+            the path to the encoded file, or None if the file was not encoded
+    """
+    if compression == "FLAC":
+        outpath = os.path.splitext(filepath)[0] + ".flac"
+        encoder = shutil.which("flac")
+        if encoder:
+            cmd = [encoder, "--silent", "--force", "--best", "-o", outpath, filepath]
+        elif shutil.which("sox"):
+            cmd = [shutil.which("sox"), filepath, outpath]
+        else:
+            log.warning("* Cannot compress message: 'flac' or 'sox' is not installed")
+            return None
+    else:
+        return None
+
+    try:
+        subprocess.run(cmd, check=True, timeout=60,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    except (OSError, subprocess.SubprocessError) as e:
+        log.error("* Error compressing %s: %s", filepath, e)
+        return None
+    return outpath
+
+
+class AudioProcessor(object):
+    """
+    A pool of worker threads that post-process recorded voice messages:
+    silence is trimmed, an optional compact copy is encoded, and the
+    resulting duration, size, levels and waveform are reported to a callback.
+    """
+
+    def __init__(self, config):
+        """
+        Constructor.
+            :param config:
+                The application-wide config object.
+        """
+        self.config = config
+        self.trim = config.get("VOICE_MAIL_TRIM_SILENCE", True)
+        self.compression = config.get("VOICE_MAIL_COMPRESSION", "")
+        workers = config.get("VOICE_MAIL_PROCESSING_WORKERS", 1)
+        self._executor = ThreadPoolExecutor(max_workers=workers,
+                                            thread_name_prefix="audio_processor")
+        self._stopping = False
+
+    def submit(self, msg_no, filepath, callback=None):
+        """
+        Queues a recorded message for processing.
+            :param msg_no:
+                The MessageID of the recorded message
+            :param filepath:
+                The path to the recorded wav file
+            :param callback:
+                Optional function called with (msg_no, info) upon completion,
+                where info is a dict with duration, size, peak, rms, waveform
+                and compressed_filename, or None if the processing failed.
+            :return:
+                a Future
+        """
+        return self._executor.submit(self._process, msg_no, filepath, callback)
+
+    def backfill(self, messages, callback):
+        """
+        Queues the analysis of messages saved without the audio levels and
+        waveform, e.g., by an earlier version. The files are not modified.
+        Each message is a task of its own, queued when the previous one is
+        done, so that a newly recorded message waits for at most one of them.
+        The backfill is abandoned at shutdown.
+            :param messages:
+                A list of (msg_no, filepath) tuples
+            :param callback:
+                Function called with (msg_no, info) for each message,
+                where info is a dict with duration, size, peak, rms and waveform,
+                or None if the file cannot be analyzed.
+            :return:
+                a Future for the number of messages analyzed
+        """
+        future = Future()
+        self._backfill_next(list(messages), 0, callback, future)
+        return future
+
+    def process(self, filepath):
+        """
+        Processes the given wav file in the calling thread.
+            :param filepath:
+                The path to the recorded wav file
+            :return:
+                a dict with duration, size, peak, rms, waveform and compressed_filename
+        """
+        if self.trim:
+            if trim_silence(filepath):
+                log.debug("Trimmed silence from %s", filepath)
+
+        compressed = None
+        if self.compression:
+            compressed = transcode(filepath, self.compression)
+
+        info = analyze_audio(filepath)
+        info["compressed_filename"] = compressed
+        return info
+
+    def _process(self, msg_no, filepath, callback):
+        """
+        Thread function that processes a message and invokes the callback.
+        """
+        try:
+            info = self.process(filepath)
+            log.debug("Processed message #%s: %s", msg_no, info)
+        except Exception as e:
+            log.error("** Error processing message %s: %s", filepath, e)
+            info = None
+        if callback is not None:
+            try:
+                callback(msg_no, info)
+            except Exception as e:
+                log.error("** Error completing message %s: %s", filepath, e)
+        return info
+
+    def _backfill_next(self, messages, count, callback, future):
+        """
+        Queues the analysis of the next message, or completes the backfill.
+        """
+        if messages and not self._stopping:
+            try:
+                self._executor.submit(self._backfill, messages, count, callback, future)
+                return
+            except RuntimeError:
+                # The executor has been shut down
+                pass
+        log.info("Analyzed %d saved messages; %d remaining", count, len(messages))
+        future.set_result(count)
+
+    def _backfill(self, messages, count, callback, future):
+        """
+        Thread function that analyzes the first of the given messages and
+        queues the next one.
+        """
+        msg_no, filepath = messages.pop(0)
+        try:
+            info = analyze_audio(filepath)
+            count += 1
+        except Exception as e:
+            log.error("** Error analyzing message %s: %s", filepath, e)
+            info = None
+        try:
+            callback(msg_no, info)
+        except Exception as e:
+            log.error("** Error saving the analysis of message %s: %s", filepath, e)
+        self._backfill_next(messages, count, callback, future)
+
+    def shutdown(self, wait=True):
+        """
+        Stops the worker threads after the queued messages are processed.
+        """
+        self._stopping = True
+        self._executor.shutdown(wait=wait)
@@ -24,11 +24,54 @@
 #  SOFTWARE.
 
 import os
-from pprint import pprint
+import sqlite3
 from datetime import datetime
 
-# Global variables
-unplayed_count = 0
+from database import get_lock
+from eventbus import event_bus
+from logconfig import get_logger
+
+log = get_logger("messaging")
+
+# The MessageCount table holds the number of unplayed messages, kept up to
+# date by triggers so that it is correct for every connection, e.g., the webapp's.
+# The counter is initialized from the Message table when the table is created.
+_UNPLAYED_COUNTER_SQL = """
+    CREATE TABLE IF NOT EXISTS MessageCount (
+        Name TEXT PRIMARY KEY,
+        Count INTEGER DEFAULT 0 NOT NULL);
+    INSERT OR IGNORE INTO MessageCount(Name, Count)
+        SELECT 'unplayed', COUNT(*) FROM Message WHERE Played = 0;
+    CREATE TRIGGER IF NOT EXISTS Message_insert_unplayed AFTER INSERT ON Message WHEN NEW.Played = 0
+        BEGIN UPDATE MessageCount SET Count = Count + 1 WHERE Name = 'unplayed'; END;
+    CREATE TRIGGER IF NOT EXISTS Message_delete_unplayed AFTER DELETE ON Message WHEN OLD.Played = 0
+        BEGIN UPDATE MessageCount SET Count = Count - 1 WHERE Name = 'unplayed'; END;
+    CREATE TRIGGER IF NOT EXISTS Message_update_unplayed AFTER UPDATE OF Played ON Message
+        WHEN (OLD.Played = 0) != (NEW.Played = 0)
+        BEGIN UPDATE MessageCount SET Count = Count + (NEW.Played = 0) - (OLD.Played = 0)
+            WHERE Name = 'unplayed'; END;
+"""
+
+
+def get_unplayed_count(db):
+    """
+    Returns the number of unplayed messages.
+        :param db: the database connection
+    """
+    with get_lock(db):
+        try:
+            curs = db.execute("SELECT Count FROM MessageCount WHERE Name = 'unplayed'")
+            row = curs.fetchone()
+            curs.close()
+        except sqlite3.OperationalError:
+            row = None
+        if row is None:
+            # The counter has not been created by a Message object
+            curs = db.execute("SELECT COUNT(*) FROM Message WHERE Played = 0")
+            row = curs.fetchone()
+            curs.close()
+    return row[0]
+
 
 class Message(object):
 
@@ -36,11 +79,12 @@ class Message(object):
         """
         Initialize the database tables for voice messages.
             :param db:
-                The database used within a single thread.
+                The database connection; a connection shared by threads is locked while in use.
             :config:
                 The applicaiton-wide config object.
         """
         self.db = db
+        self._db_lock = get_lock(db)
         self.config = config
         # Get message event from voicemail setup
         self.message_event = config["MESSAGE_EVENT"]
@@ -53,25 +97,63 @@ class Message(object):
                 Played BOOLEAN DEFAULT 0 NOT NULL CHECK (Played IN (0,1)),
                 Filename TEXT,
                 DateTime TEXT,
+                Duration REAL,
+                FileSize INTEGER,
+                CompressedFilename TEXT,
+                Peak REAL,
+                RMS REAL,
+                Waveform TEXT,
                 FOREIGN KEY(CallLogID) REFERENCES CallLog(CallLogID));
         """
-        curs = self.db.execute(sql)
-        self.db.commit()
-        curs.close()
+        with self._db_lock:
+            curs = self.db.execute(sql)
+            self.db.commit()
+            curs.close()
+
+            # Early versions of the Message table do not contain the audio info
+            # columns populated by the audio processor. Add them if they don't exist.
+            self._add_missing_columns({
+                "Duration": "REAL",
+                "FileSize": "INTEGER",
+                "CompressedFilename": "TEXT",
+                "Peak": "REAL",
+                "RMS": "REAL",
+                "Waveform": "TEXT"})
 
-        # Get the number of unread messages
+            # Count the unread messages
+            curs = self.db.cursor()
+            curs.executescript(_UNPLAYED_COUNTER_SQL)
+            curs.close()
         self._update_unplayed_count()
 
-        if config["DEBUG"]:
-            print("Message initialized")
+        log.debug("Message initialized")
 
-    def add(self, call_no, filepath):
+    def _add_missing_columns(self, columns):
+        """
+        Adds the given columns to the Message table if they don't exist.
+            :param columns:
+                A dict of column names and types
+        """
+        curs = self.db.execute("SELECT name FROM pragma_table_info('Message')")
+        existing = [row[0] for row in curs.fetchall()]
+        curs.close()
+        for name, col_type in columns.items():
+            if name not in existing:
+                log.info(">> Adding %s column to Message table", name)
+                self.db.execute("ALTER TABLE Message ADD COLUMN {} {} default null".format(name, col_type))
+        self.db.commit()
+
+    def add(self, call_no, filepath, duration=None, size=None):
         """
         Adds a message to the table.
             :param call_no:
                 The unique ID of the call this message is associated with.
             :param filepath:
                 The name and path for the message .wav file that was recorded.
+            :param duration:
+                The optional length of the message in seconds.
+            :param size:
+                The optional size of the message .wav file in bytes.
             :return:
                 The unique ID of the new row
         """
@@ -80,38 +162,125 @@ class Message(object):
             INSERT INTO Message(
                 CallLogID,
                 Filename,
-                DateTime)
-            VALUES(?,?,?)
+                DateTime,
+                Duration,
+                FileSize)
+            VALUES(?,?,?,?,?)
         """
         arguments = [
             call_no,
             filepath,
-            (datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f')[:19])
+            (datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f')[:19]),
+            duration,
+            size
         ]
-        self.db.execute(sql, arguments)
-        self.db.commit()
+        with self._db_lock:
+            previous_count = self.get_unplayed_count()
+            curs = self.db.execute(sql, arguments)
+            self.db.commit()
 
-        # Return the MessageID
-        query = "SELECT last_insert_rowid()"
-        curs = self.db.cursor()
-        curs.execute(query)
-        msg_no = curs.fetchone()[0]
-        curs.close()
+            # Return the MessageID
+            msg_no = curs.lastrowid
+            curs.close()
 
-        self._update_unplayed_count()
+        self._update_unplayed_count(previous_count)
 
         return msg_no
 
+    def update_audio_info(self, msg_no, duration, size, compressed_filepath=None,
+                          peak=None, rms=None, waveform=None):
+        """
+        Updates the audio information of the given message after processing.
+            :param msg_no:
+                The MessageID to update
+            :param duration:
+                The length of the message in seconds
+            :param size:
+                The size of the message .wav file in bytes
+            :param compressed_filepath:
+                The optional name and path of a compressed copy of the message
+            :param peak:
+                The peak level, a fraction of full scale
+            :param rms:
+                The RMS level, a fraction of full scale
+            :param waveform:
+                The waveform thumbnail, a list of levels in percent of full scale
+            :return:
+                True if successful
+        """
+        try:
+            sql = """UPDATE Message
+                SET Duration=:duration, FileSize=:size, CompressedFilename=:compressed,
+                    Peak=:peak, RMS=:rms, Waveform=:waveform
+                WHERE MessageID=:msg_no"""
+            arguments = {'msg_no': msg_no, 'duration': duration, 'size': size,
+                         'compressed': compressed_filepath, 'peak': peak, 'rms': rms,
+                         'waveform': ",".join(str(level) for level in waveform) if waveform is not None else None}
+            with self._db_lock:
+                curs = self.db.execute(sql, arguments)
+                self.db.commit()
+                curs.close()
+        except Exception as e:
+            log.error("** Error updating message audio info: %s", e)
+            return False
+        return True
+
+    def update_waveform(self, msg_no, waveform):
+        """
+        Updates the waveform thumbnail of the given message.
+            :param msg_no:
+                The MessageID to update
+            :param waveform:
+                A list of levels in percent of full scale; an empty list
+                marks a message whose file cannot be analyzed
+            :return:
+                True if successful
+        """
+        try:
+            sql = "UPDATE Message SET Waveform=:waveform WHERE MessageID=:msg_no"
+            arguments = {'msg_no': msg_no, 'waveform': ",".join(str(level) for level in waveform)}
+            with self._db_lock:
+                curs = self.db.execute(sql, arguments)
+                self.db.commit()
+                curs.close()
+        except Exception as e:
+            log.error("** Error updating message waveform: %s", e)
+            return False
+        return True
+
+    def get_unanalyzed(self):
+        """
+        Returns the messages without the audio levels and waveform, e.g.,
+        those saved by an earlier version, whose files still exist.
+            :return:
+                A list of (msg_no, filepath, compressed_filepath) tuples
+        """
+        sql = "SELECT MessageID, Filename, CompressedFilename FROM Message WHERE Waveform IS NULL"
+        with self._db_lock:
+            curs = self.db.execute(sql)
+            results = curs.fetchall()
+            curs.close()
+
+        messages = []
+        folder = self.config["VOICE_MAIL_MESSAGE_FOLDER"]
+        for msg_no, filename, compressed in results:
+            # Build the filename using the config, as does delete(), in case the files have been moved
+            filepath = os.path.join(folder, os.path.basename(filename))
+            if os.path.exists(filepath):
+                messages.append((msg_no, filepath, compressed))
+        return messages
+
     def delete(self, msg_no):
         """
         Removes the message record and associated wav file.
         """
         # Get the filename to delete
-        sql = "SELECT Filename FROM Message WHERE MessageID=:msg_no"
+        sql = "SELECT Filename, CompressedFilename FROM Message WHERE MessageID=:msg_no"
         arguments = {'msg_no': msg_no}
-        curs = self.db.execute(sql, arguments)
-        results = curs.fetchone()
-        curs.close()
+        with self._db_lock:
+            curs = self.db.execute(sql, arguments)
+            results = curs.fetchone()
+            curs.close()
 
         # Now do the deletes
         success = True
@@ -122,28 +291,34 @@ class Message(object):
             # stored in the db, in case the files have been moved
             basename = os.path.basename(results[0])
             filepath = os.path.join(self.config["VOICE_MAIL_MESSAGE_FOLDER"], basename)
-            print("Deleting message: {}".format(filepath))
+            log.info("Deleting message: %s", filepath)
             try:
                 os.remove(filepath)
             except OSError as error:
-                pprint(error)
-                print("{} cannot be removed".format(filepath))
+                log.warning("%s cannot be removed: %s", filepath, error)
                 # ignore file not found errors
                 if error.errno != 2:
                     success = False
 
+            # Delete the compressed copy, if any
+            if success and results[1]:
+                compressed = os.path.join(self.config["VOICE_MAIL_MESSAGE_FOLDER"],
+                                          os.path.basename(results[1]))
+                try:
+                    os.remove(compressed)
+                except OSError as error:
+                    log.warning("%s cannot be removed: %s", compressed, error)
+
             # Delete the row
             if success:
                 sql = "DELETE FROM Message WHERE MessageID=:msg_no"
                 arguments = {'msg_no': msg_no}
-                self.db.execute(sql, arguments)
-                self.db.commit()
-
-            if self.config["DEBUG"]:
-                print("Message entry removed")
-                pprint(arguments)
-
-            self._update_unplayed_count()
+                with self._db_lock:
+                    previous_count = self.get_unplayed_count()
+                    self.db.execute(sql, arguments)
+                    self.db.commit()
+                log.debug("Message entry removed: %s", arguments)
+                self._update_unplayed_count(previous_count)
 
         return success
 
@@ -154,32 +329,33 @@ class Message(object):
         try:
             sql = "UPDATE Message SET Played=:played WHERE MessageID=:msg_no"
             arguments = {'msg_no': msg_no, 'played': played}
-            curs = self.db.execute(sql, arguments)
-            self.db.commit()
-            curs.close()
+            with self._db_lock:
+                previous_count = self.get_unplayed_count()
+                curs = self.db.execute(sql, arguments)
+                self.db.commit()
+                curs.close()
         except Exception as e:
-            print("** Error updating message played status:")
-            pprint(e)
+            log.error("** Error updating message played status: %s", e)
             return False
 
-        self._update_unplayed_count()
+        self._update_unplayed_count(previous_count)
         return True
 
     def get_unplayed_count(self):
-        # Return the global
-        global unplayed_count
-        return unplayed_count
-
-    def _update_unplayed_count(self):
-        # Get the number of unread messages
-        sql = "SELECT COUNT(*) FROM Message WHERE Played = 0"
-        curs = self.db.execute(sql)
-        global unplayed_count
-        unplayed_count = curs.fetchone()[0]
-        curs.close()
+        """
+        Returns the number of unplayed messages.
+        """
+        return get_unplayed_count(self.db)
 
-        if self.config["DEBUG"]:
-            print("Unplayed message count is {}".format(unplayed_count))
+    def _update_unplayed_count(self, previous_count=None):
+        """
+        Publishes the number of unplayed messages if it differs from the
+        previous count, and wakes up the message thread.
+        """
+        unplayed_count = self.get_unplayed_count()
+        log.debug("Unplayed message count is %s", unplayed_count)
+        if previous_count is not None and unplayed_count != previous_count:
+            event_bus.publish("messages", {"unplayed": unplayed_count})
 
         # wake up message thread
         self.message_event.set()
@@ -0,0 +1,346 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#  notifier.py
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+
+import os
+import smtplib
+import socket
+import ssl
+import threading
+import time
+from email.mime.audio import MIMEAudio
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+
+from database import get_lock
+from logconfig import get_logger
+
+log = get_logger("messaging")
+
+# Retry delays (secs): doubled after each failed attempt, up to the maximum
+RETRY_DELAY = 30
+RETRY_DELAY_MAX = 3600
+
+# An idle SMTP session is closed after this many seconds
+SESSION_IDLE_SECS = 30
+
+
+class EmailNotifier(object):
+    """
+    Sends the voicemail e-mail notifications from an outbox table.
+    A sender thread delivers the queued notifications, reusing one SMTP
+    session for a burst of messages and retrying failures with an
+    exponential backoff. Undelivered notifications survive a restart.
+    In digest mode, the messages received within EMAIL_DIGEST_DELAY
+    seconds are grouped into a single e-mail. A notification can be held
+    while its message is processed, then released with the processed file;
+    one still held at startup is released as is.
+    """
+
+    def __init__(self, db, config):
+        """
+        Constructor.
+            :param db:
+                The database connection; used by the sender thread while holding its lock.
+            :param config:
+                The application-wide config object.
+        """
+        self.db = db
+        self.config = config
+        self.digest_delay = config.get("EMAIL_DIGEST_DELAY", 0)
+        self.max_attempts = config.get("EMAIL_MAX_ATTEMPTS", 8)
+
+        # Number of e-mails sent and SMTP sessions opened
+        self.emails_sent = 0
+        self.sessions_opened = 0
+
+        self._db_lock = get_lock(db)
+        self._session = None
+        self._session_used = 0
+
+        sql = """
+            CREATE TABLE IF NOT EXISTS EmailOutbox (
+                OutboxID INTEGER PRIMARY KEY AUTOINCREMENT,
+                Number TEXT,
+                Name TEXT,
+                Filename TEXT,
+                Status TEXT DEFAULT 'pending' NOT NULL,
+                Attempts INTEGER DEFAULT 0 NOT NULL,
+                NextAttempt REAL,
+                Created REAL,
+                LastError TEXT);
+        """
+        with self._db_lock:
+            self.db.execute(sql)
+            # Release the notifications whose message was being processed when the app stopped
+            self.db.execute("UPDATE EmailOutbox SET Status='pending' WHERE Status='held'")
+            self.db.commit()
+
+        # Start the sender thread; it also delivers notifications left from a previous run
+        self._stop_flag = False
+        self._wake_event = threading.Event()
+        self._thread = threading.Thread(target=self._sender)
+        self._thread.name = "email_sender"
+        self._thread.daemon = True
+        self._thread.start()
+
+    def queue(self, caller, filepath, hold=False):
+        """
+        Queues a notification for a recorded message.
+            :param caller:
+                The caller ID data
+            :param filepath:
+                The message file, attached if EMAIL_WAVE_ATTACHMENT is True
+            :param hold:
+                If True, the notification is not sent until it is released
+            :return:
+                The OutboxID of the queued notification
+        """
+        now = time.time()
+        sql = """INSERT INTO EmailOutbox(Number, Name, Filename, Status, NextAttempt, Created)
+            VALUES(?,?,?,?,?,?)"""
+        status = "held" if hold else "pending"
+        with self._db_lock:
+            curs = self.db.execute(sql, (caller["NMBR"], caller["NAME"], filepath, status, now, now))
+            self.db.commit()
+            outbox_no = curs.lastrowid
+            curs.close()
+        if not hold:
+            self._wake_event.set()
+        return outbox_no
+
+    def release(self, outbox_no, filepath=None):
+        """
+        Releases a held notification for sending.
+            :param outbox_no:
+                The OutboxID returned by queue()
+            :param filepath:
+                The processed message file to attach instead of the queued one
+        """
+        now = time.time()
+        sql = """UPDATE EmailOutbox SET Status='pending', Filename=COALESCE(?, Filename),
+            NextAttempt=?, Created=? WHERE OutboxID=? AND Status='held'"""
+        with self._db_lock:
+            self.db.execute(sql, (filepath, now, now, outbox_no))
+            self.db.commit()
+        self._wake_event.set()
+
+    def get_pending_count(self):
+        """
+        Returns the number of notifications waiting to be sent.
+        """
+        with self._db_lock:
+            curs = self.db.execute("SELECT COUNT(*) FROM EmailOutbox WHERE Status='pending'")
+            count = curs.fetchone()[0]
+            curs.close()
+        return count
+
+    def stop(self):
+        """
+        Stops the sender thread. Pending notifications remain in the outbox.
+        """
+        self._stop_flag = True
+        self._wake_event.set()
+        self._thread.join()
+        self._close_session()
+
+    def _sender(self):
+        """
+        Thread function that sends the due notifications.
+        """
+        while not self._stop_flag:
+            self._wake_event.clear()
+            try:
+                timeout = self._send_due()
+            except Exception as e:
+                # Keep the outbox running, e.g., after a database error
+                log.exception("** Error in the e-mail sender: %s", e)
+                timeout = RETRY_DELAY
+            if timeout > 0:
+                self._wake_event.wait(timeout)
+
+    def _send_due(self):
+        """
+        Sends the due notifications.
+            :return:
+                The number of seconds to wait for more work, or 0
+        """
+        now = time.time()
+        rows, next_attempt = self._get_due(now)
+
+        new_rows = [row["Created"] for row in rows if row["Attempts"] == 0]
+        if new_rows and self.digest_delay:
+            # Wait for more messages, measured from the oldest new message
+            wait_secs = min(new_rows) + self.digest_delay - now
+            if wait_secs > 0:
+                return wait_secs
+
+        if rows:
+            self._send(rows)
+            return 0
+
+        # Nothing is due: close an idle session and sleep until the next retry
+        idle_secs = time.time() - self._session_used
+        if self._session is not None and idle_secs >= SESSION_IDLE_SECS:
+            self._close_session()
+        timeout = SESSION_IDLE_SECS
+        if next_attempt is not None:
+            timeout = min(timeout, max(0.0, next_attempt - now))
+        return timeout
+
+    def _get_due(self, now):
+        """
+        Returns the pending notifications that are due, and the time of the next attempt.
+        """
+        sql = """SELECT OutboxID, Number, Name, Filename, Attempts, Created, NextAttempt
+            FROM EmailOutbox WHERE Status='pending' ORDER BY OutboxID"""
+        with self._db_lock:
+            curs = self.db.execute(sql)
+            columns = [col[0] for col in curs.description]
+            pending = [dict(zip(columns, row)) for row in curs.fetchall()]
+            curs.close()
+        due = [row for row in pending if row["NextAttempt"] <= now]
+        later = [row["NextAttempt"] for row in pending if row["NextAttempt"] > now]
+        return due, (min(later) if later else None)
+
+    def _send(self, rows):
+        """
+        Sends the given notifications, individually or as a digest.
+        """
+        batches = [rows] if self.digest_delay else [[row] for row in rows]
+        for batch in batches:
+            if self._stop_flag:
+                break
+            try:
+                message = self._build_message(batch)
+                session = self._get_session()
+                session.sendmail(self.config["EMAIL_FROM"], self._recipients(), message.as_string())
+                self._session_used = time.time()
+                self.emails_sent += 1
+                self._set_status(batch, "sent")
+                log.info("Email notification sent to %s", self.config["EMAIL_TO"])
+            except (smtplib.SMTPException, OSError) as e:
+                log.error("Error sending email: %s", e)
+                self._close_session()
+                self._retry_later(batch, str(e))
+            except Exception as e:
+                # e.g., a bad outbox row or an incomplete configuration
+                log.exception("** Error sending email notification: %s", e)
+                self._retry_later(batch, str(e))
+
+    def _get_session(self):
+        """
+        Returns the open SMTP session, connecting and logging in if needed.
+        """
+        if self._session is not None:
+            # Check that a session idle for a while was not dropped by the server
+            if time.time() - self._session_used < 5:
+                return self._session
+            try:
+                if self._session.noop()[0] == 250:
+                    return self._session
+            except (smtplib.SMTPException, OSError):
+                pass
+            self._close_session()
+
+        server = self.config["EMAIL_SERVER"]
+        port = self.config["EMAIL_PORT"]
+        security = self.config.get("EMAIL_SECURITY", "SSL")
+        if security == "SSL":
+            session = smtplib.SMTP_SSL(server, port, context=ssl.create_default_context(), timeout=30)
+        else:
+            session = smtplib.SMTP(server, port, timeout=30)
+            if security == "STARTTLS":
+                session.starttls(context=ssl.create_default_context())
+        if self.config["EMAIL_SERVER_USERNAME"]:
+            session.login(self.config["EMAIL_SERVER_USERNAME"], self.config["EMAIL_SERVER_PASSWORD"])
+        self._session = session
+        self.sessions_opened += 1
+        return session
+
+    def _close_session(self):
+        if self._session is not None:
+            try:
+                self._session.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+            self._session = None
+
+    def _recipients(self):
+        return [addr.strip() for addr in self.config["EMAIL_TO"].split(",") if addr.strip()]
+
+    def _build_message(self, rows):
+        """
+        Builds the e-mail for one or more notifications.
+        """
+        url = "http://{}:{}/messages".format(socket.gethostname(), self.config["PORT"])
+        message = MIMEMultipart()
+        message['From'] = self.config["EMAIL_FROM"]
+        message['To'] = self.config["EMAIL_TO"]
+        message['Date'] = time.strftime("%a, %d %b %Y %T %z (%Z)")
+        if len(rows) == 1:
+            message['Subject'] = 'Voicemail message received from: {}'.format(rows[0]["Number"])
+            body = 'Caller {}, {} left a message.\n'.format(rows[0]["Number"], rows[0]["Name"])
+        else:
+            message['Subject'] = '{} voicemail messages received'.format(len(rows))
+            body = "".join('{}  Caller {}, {} left a message.\n'.format(
+                time.strftime("%m-%d %H:%M", time.localtime(row["Created"])), row["Number"], row["Name"])
+                for row in rows)
+        message.attach(MIMEText(body + 'Listen to message at {}\n'.format(url)))
+
+        if self.config["EMAIL_WAVE_ATTACHMENT"]:
+            for row in rows:
+                filepath = row["Filename"]
+                if not os.path.exists(filepath):
+                    continue
+                with open(filepath, 'rb') as wavefile:
+                    subtype = 'flac' if filepath.endswith('.flac') else 'wave'
+                    att = MIMEAudio(wavefile.read(), subtype)
+                    att.add_header('Content-Disposition',
+                                   'attachment;filename="{}"'.format(os.path.basename(filepath)))
+                    message.attach(att)
+        return message
+
+    def _set_status(self, rows, status):
+        with self._db_lock:
+            self.db.executemany("UPDATE EmailOutbox SET Status=?, Attempts=Attempts+1 WHERE OutboxID=?",
+                                [(status, row["OutboxID"]) for row in rows])
+            self.db.commit()
+
+    def _retry_later(self, rows, error):
+        """
+        Schedules the next attempt with an exponential backoff, or gives up
+        after EMAIL_MAX_ATTEMPTS.
+        """
+        now = time.time()
+        with self._db_lock:
+            for row in rows:
+                attempts = row["Attempts"] + 1
+                if attempts >= self.max_attempts:
+                    log.warning("** Giving up on email notification for %s", row["Number"])
+                    status, next_attempt = "failed", None
+                else:
+                    status = "pending"
+                    next_attempt = now + min(RETRY_DELAY * 2 ** (attempts - 1), RETRY_DELAY_MAX)
+                self.db.execute("""UPDATE EmailOutbox SET Status=?, Attempts=?, NextAttempt=?, LastError=?
+                    WHERE OutboxID=?""", (status, attempts, next_attempt, error, row["OutboxID"]))
+            self.db.commit()
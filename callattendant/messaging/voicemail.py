@@ -23,18 +23,16 @@
 #  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 #  SOFTWARE.
 
+import copy
 import os
-import sys
 import threading
 import time
 from messaging.message import Message
+from messaging.audioprocessor import AudioProcessor, get_audio_info
 from screening.whitelist import Whitelist
+from logconfig import get_logger
 
-import smtplib, ssl
-from email.mime.audio import MIMEAudio
-from email.mime.multipart import MIMEMultipart
-from email.mime.text import MIMEText
-import socket
+log = get_logger("messaging")
 
 class VoiceMail:
 
@@ -42,8 +40,7 @@ class VoiceMail:
         """
         Initialize the database tables for voice messages.
         """
-        if config["DEBUG"]:
-            print("Initializing VoiceMail")
+        log.debug("Initializing VoiceMail")
 
         self.db = db
         self.config = config
@@ -78,6 +75,34 @@ class VoiceMail:
         self.messages = Message(db, config)
         self.whitelist = Whitelist(db, config)
 
+        # Create the worker pool that trims and compresses recorded messages
+        self.audio_processor = AudioProcessor(config)
+
+        # Add the audio levels and waveforms to the messages saved without them
+        unanalyzed = self.messages.get_unanalyzed()
+        if unanalyzed:
+            compressed = {msg_no: compressed for msg_no, filepath, compressed in unanalyzed}
+
+            def on_analyzed(msg_no, info):
+                # An empty waveform keeps a file that cannot be analyzed from being queued again
+                if info is None:
+                    self.messages.update_waveform(msg_no, [])
+                    return
+                waveform = info["waveform"] if info["waveform"] is not None else []
+                self.messages.update_audio_info(msg_no, info["duration"], info["size"],
+                                                compressed[msg_no], info["peak"],
+                                                info["rms"], waveform)
+
+            self.audio_processor.backfill([(msg_no, filepath) for msg_no, filepath, _ in unanalyzed],
+                                          on_analyzed)
+
+        # Create the outbox and sender thread for the e-mail notifications;
+        # smtplib, ssl and email are only loaded when e-mail is enabled
+        self.notifier = None
+        if config["EMAIL_ENABLE"]:
+            from messaging.notifier import EmailNotifier
+            self.notifier = EmailNotifier(db, config)
+
         # Start the thread that monitors the message events and updates the indicators
         self._stop_flag = False
         self._thread = threading.Thread(target=self._event_handler)
@@ -87,13 +112,29 @@ class VoiceMail:
         # Pulse the indicator if an unplayed msg is waiting
         self.message_event.set()
 
-        if self.config["DEBUG"]:
-            print("VoiceMail initialized")
+        log.debug("VoiceMail initialized")
+
+    def for_modem(self, modem):
+        """
+        Creates a voice mail interface for another phone line. The messages,
+        indicators and audio processor are shared with this object.
+            :param modem:
+                The modem attached to the other line
+            :return:
+                A VoiceMail object that uses the given modem
+        """
+        voice_mail = copy.copy(self)
+        voice_mail.modem = modem
+        return voice_mail
 
     def stop(self):
         """
         Stops the voice mail thread and releases hardware resources.
         """
+        # Finish processing the recorded messages
+        self.audio_processor.shutdown()
+        if self.notifier is not None:
+            self.notifier.stop()
         # Signal thread to stop and wait for it to finish
         self._stop_flag = True
         self.message_event.set()
@@ -109,13 +150,11 @@ class VoiceMail:
         while True:
             # Get the number of unread messages
             if self.message_event.wait():
-                if self.config["DEBUG"]:
-                    print("Message Event triggered")
+                log.debug("Message Event triggered")
                 if self._stop_flag:
                     break
                 self.reset_message_indicator()
                 self.message_event.clear()
-                sys.stdout.flush()
 
     def voice_messaging_menu(self, call_no, caller):
         """
@@ -136,7 +175,7 @@ class VoiceMail:
             success, digit = self.modem.wait_for_keypress(wait_secs)
             if not success:
                 break
-            print(">>Caller pressed: {}".format(digit))
+            log.info(">>Caller pressed: %s", digit)
             if digit == '1':
                 self.record_message(call_no, caller, self.config["VOICE_MAIL_LEAVE_MESSAGE_FILE"])
                 break
@@ -181,40 +220,36 @@ class VoiceMail:
         retval = None
         if self.modem.record_audio(filepath, detect_silence):
             # Save to Message table (message.add will update the indicator)
-            msg_no = self.messages.add(call_no, filepath)
+            duration, size = get_audio_info(filepath)
+            msg_no = self.messages.add(call_no, filepath, duration, size)
+
+            # Queue the e-mail notification now, so that it survives a failure
+            # or a restart, but hold it until the message is processed
+            outbox_no = None
+            if self.notifier is not None:
+                outbox_no = self.notifier.queue(caller, filepath, hold=True)
 
-            # Send an e-mail notification
-            if self.config["EMAIL_ENABLE"]:
-                self.__send_email(caller, filepath)
+            # Trim and compress the message after the line is free, then
+            # release the notification with the processed message, or with
+            # the recording as is if it could not be processed
+            def on_processed(msg_no, info):
+                try:
+                    if info is not None:
+                        self.messages.update_audio_info(msg_no, info["duration"], info["size"],
+                                                        info["compressed_filename"], info["peak"],
+                                                        info["rms"], info["waveform"])
+                finally:
+                    if outbox_no is not None:
+                        compressed = info["compressed_filename"] if info is not None else None
+                        self.notifier.release(outbox_no, compressed)
+
+            self.audio_processor.submit(msg_no, filepath, on_processed)
 
             # Return the messageID on success
             retval = msg_no
 
         return retval
 
-    def __send_email(self, caller, filepath):
-        context = ssl.create_default_context()
-        try:
-            with smtplib.SMTP_SSL(self.config["EMAIL_SERVER"], self.config["EMAIL_PORT"], context=context) as server:
-                server.login(self.config["EMAIL_SERVER_USERNAME"], self.config["EMAIL_SERVER_PASSWORD"])
-                message = MIMEMultipart()
-                message['From'] = self.config["EMAIL_FROM"]
-                message['To'] = self.config["EMAIL_TO"]
-                message['Subject'] = f'Voicemail message received from: {caller["NMBR"]}'
-                message['Date'] = time.strftime("%a, %d %b %Y %T %z (%Z)")
-                body = MIMEText(f'Caller {caller["NMBR"]}, {caller["NAME"]} left a message.\n' +
-                                f'Listen to message at http://{socket.gethostname()}:{self.config["PORT"]}/messages\n')
-                message.attach(body)
-                if self.config["EMAIL_WAVE_ATTACHMENT"]:
-                    with open(filepath, 'rb') as wavefile:
-                        att = MIMEAudio(wavefile.read(), 'wave')
-                        att.add_header('Content-Disposition', f'attachment;filename="{os.path.basename(filepath)}"')
-                        message.attach(att)
-                server.sendmail(self.config["EMAIL_FROM"], self.config["EMAIL_TO"], message.as_string())
-                print("Email notification sent to {}".format(self.config["EMAIL_TO"]))
-        except Exception as e:
-            print("Error sending email: {}".format(e))
-
     def delete_message(self, msg_no):
         """
         Removes the message record and associated wav file.
@@ -224,8 +259,7 @@ class VoiceMail:
 
     def reset_message_indicator(self):
         unplayed_count = self.messages.get_unplayed_count()
-        if self.config["DEBUG"]:
-            print("Resetting Message Indicator to show {} unplayed messages".format(unplayed_count))
+        log.debug("Resetting Message Indicator to show %s unplayed messages", unplayed_count)
         if unplayed_count > 0:
             self.message_indicator.pulse()
             if self.config["STATUS_INDICATORS"] == "GPIO":
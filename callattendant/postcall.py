@@ -0,0 +1,157 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#  postcall.py
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+
+import queue
+import threading
+import time
+
+from logconfig import get_logger
+
+log = get_logger("app")
+
+
+class PostCallExecutor(object):
+    """
+    A bounded queue and pool of worker threads for the work that does not
+    need to happen while a caller is on the line, e.g., e-mail notifications
+    and status indicator updates. The call handling loop submits the work
+    and immediately returns to waiting for the next call.
+    """
+
+    def __init__(self, config):
+        """
+        Constructor.
+            :param config:
+                The application-wide config object.
+        """
+        self.config = config
+        self._queue = queue.Queue(config.get("POST_CALL_QUEUE_SIZE", 100))
+        self._lock = threading.Lock()
+        self._stats = {
+            "submitted": 0,
+            "completed": 0,
+            "failed": 0,
+            "ran_inline": 0,
+            "max_queue_depth": 0,
+            "total_latency": 0.0,
+            "max_latency": 0.0,
+        }
+
+        self._threads = []
+        for n in range(config.get("POST_CALL_WORKERS", 2)):
+            thread = threading.Thread(target=self._worker)
+            thread.name = "post_call_{}".format(n + 1)
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, func, *args, **kwargs):
+        """
+        Queues a task for execution by a worker thread. If the queue is
+        full, the task is run in the calling thread so that it is not lost.
+            :param func:
+                The function to call
+            :param args:
+                The function's positional arguments
+            :param kwargs:
+                The function's keyword arguments
+            :return:
+                True if the task was queued; False if it was run inline
+        """
+        task = (func, args, kwargs, time.monotonic())
+        with self._lock:
+            self._stats["submitted"] += 1
+        try:
+            self._queue.put_nowait(task)
+        except queue.Full:
+            log.warning("* Post-call queue is full; running %s inline", getattr(func, "__name__", func))
+            with self._lock:
+                self._stats["ran_inline"] += 1
+            self._run(task)
+            return False
+
+        with self._lock:
+            self._stats["max_queue_depth"] = max(self._stats["max_queue_depth"], self._queue.qsize())
+        return True
+
+    @property
+    def queue_depth(self):
+        """
+        The number of tasks waiting for a worker.
+        """
+        return self._queue.qsize()
+
+    def get_stats(self):
+        """
+        Returns the executor statistics.
+            :return:
+                a dict with the task counts, the current and maximum queue
+                depth and the average and maximum latency (secs) from
+                submission to completion
+        """
+        with self._lock:
+            stats = dict(self._stats)
+        finished = stats["completed"] + stats["failed"]
+        stats["queue_depth"] = self.queue_depth
+        stats["avg_latency"] = stats["total_latency"] / finished if finished else 0.0
+        return stats
+
+    def shutdown(self, wait=True):
+        """
+        Stops the worker threads after the queued tasks are done.
+            :param wait:
+                If True, waits for the workers to finish
+        """
+        for thread in self._threads:
+            self._queue.put((None, None, None, None))
+        if wait:
+            for thread in self._threads:
+                thread.join()
+
+    def _worker(self):
+        """
+        Thread function that runs the queued tasks.
+        """
+        while True:
+            task = self._queue.get()
+            if task[0] is None:
+                break
+            self._run(task)
+
+    def _run(self, task):
+        """
+        Runs a task and records its latency.
+        """
+        func, args, kwargs, submitted = task
+        try:
+            func(*args, **kwargs)
+            key = "completed"
+        except Exception as e:
+            log.error("** Error in post-call task %s: %s", getattr(func, "__name__", func), e)
+            key = "failed"
+        latency = time.monotonic() - submitted
+        with self._lock:
+            self._stats[key] += 1
+            self._stats["total_latency"] += latency
+            self._stats["max_latency"] = max(self._stats["max_latency"], latency)
+        log.debug("Post-call task %s finished in %.3fs", getattr(func, "__name__", func), latency)
@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#  profiling.py
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+
+
+import builtins
+import sys
+import threading
+import time
+
+
+class StartupProfiler(object):
+    """
+    Measures the time spent in each startup phase and in each module
+    import, enabled by the --profile-startup command line option. The
+    imports are timed by wrapping the built-in __import__ function, so
+    the profiler should be started before the application is imported.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        # (phase, secs) in the order they finished
+        self.phases = []
+        # module name -> (cumulative secs, self secs)
+        self.imports = {}
+
+        self._start = None
+        self._last = None
+        self._import = None
+        self._local = threading.local()
+
+    def start(self):
+        """
+        Starts the clock and the import timing.
+        """
+        if self.enabled:
+            return
+        self.enabled = True
+        self._start = self._last = time.perf_counter()
+        self._import = builtins.__import__
+        builtins.__import__ = self._timed_import
+
+    def stop(self):
+        """
+        Stops the import timing. The collected times are kept.
+        """
+        if self.enabled:
+            builtins.__import__ = self._import
+            self.enabled = False
+
+    def mark(self, phase):
+        """
+        Ends a startup phase, which began at the end of the previous phase.
+            :param phase:
+                The name of the phase
+        """
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        self.phases.append((phase, now - self._last))
+        self._last = now
+
+    def report(self, limit=25):
+        """
+        Returns the phase times and the slowest imports as a printable string.
+            :param limit:
+                The number of imports to list
+        """
+        lines = ["Startup phases (ms):"]
+        for phase, secs in self.phases:
+            lines.append("  {:<24} {:>10.1f}".format(phase, secs * 1000))
+        lines.append("  {:<24} {:>10.1f}".format("total", (self._last - self._start) * 1000))
+
+        lines.append("Slowest imports (ms):")
+        lines.append("  {:<40} {:>10} {:>10}".format("module", "cumulative", "self"))
+        slowest = sorted(self.imports.items(), key=lambda item: item[1][1], reverse=True)
+        for name, (cumulative, own) in slowest[:limit]:
+            lines.append("  {:<40} {:>10.1f} {:>10.1f}".format(name, cumulative * 1000, own * 1000))
+        return "\n".join(lines)
+
+    def _timed_import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        """
+        Times the first import of a module; imports of loaded modules are passed through.
+        """
+        if level or name in sys.modules:
+            return self._import(name, globals, locals, fromlist, level)
+
+        # The nested imports' time is subtracted from the module's own time
+        stack = self._local.__dict__.setdefault("stack", [])
+        stack.append(0.0)
+        start = time.perf_counter()
+        try:
+            return self._import(name, globals, locals, fromlist, level)
+        finally:
+            elapsed = time.perf_counter() - start
+            nested = stack.pop()
+            if stack:
+                stack[-1] += elapsed
+            self.imports[name] = (elapsed, elapsed - nested)
+
+
+# The application-wide startup profiler
+startup = StartupProfiler()
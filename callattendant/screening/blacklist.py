@@ -30,8 +30,11 @@
 # ==============================================================================
 
 from datetime import datetime
-from pprint import pprint
+from database import get_lock
 from screening.query_db import query_db
+from logconfig import get_logger
+
+log = get_logger("screening")
 
 
 class Blacklist(object):
@@ -39,10 +42,10 @@ class Blacklist(object):
     def __init__(self, db, config):
         """Ensures database access to the Blacklist table"""
         self.db = db
+        self._db_lock = get_lock(db)
         self.config = config
 
-        if self.config["DEBUG"]:
-            print("Initializing Blacklist")
+        log.debug("Initializing Blacklist")
 
         sql = '''
             CREATE TABLE IF NOT EXISTS Blacklist (
@@ -51,9 +54,10 @@ class Blacklist(object):
                 Reason TEXT,
                 SystemDateTime TEXT);
             '''
-        curs = self.db.cursor()
-        curs.executescript(sql)
-        curs.close()
+        with self._db_lock:
+            curs = self.db.cursor()
+            curs.executescript(sql)
+            curs.close()
 
         if self.config["TESTING"]:
             # Add a record to the test db;
@@ -67,8 +71,7 @@ class Blacklist(object):
             }
             self.add_caller(caller)
 
-        if self.config["DEBUG"]:
-            print("Blacklist initialized")
+        log.debug("Blacklist initialized")
 
     def add_caller(self, callerid, reason=""):
         """
@@ -90,14 +93,12 @@ class Blacklist(object):
             (datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f')[:19])
         ]
         try:
-            self.db.execute(query, arguments)
-            self.db.commit()
-            if self.config["DEBUG"]:
-                print("New blacklist entry added")
-                pprint(arguments)
+            with self._db_lock:
+                self.db.execute(query, arguments)
+                self.db.commit()
+            log.debug("New blacklist entry added: %s", arguments)
         except Exception as e:
-            print("** Failed to add caller to blacklist:")
-            pprint(e)
+            log.error("** Failed to add caller to blacklist: %s", e)
             return False
         return True
 
@@ -118,16 +119,14 @@ class Blacklist(object):
             "time": (datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f')[:19])
             }
         try:
-            self.db.execute(sql, arguments)
-            self.db.commit()
+            with self._db_lock:
+                self.db.execute(sql, arguments)
+                self.db.commit()
         except Exception as e:
-            print("** Failed to update caller in blacklist:")
-            pprint(e)
+            log.error("** Failed to update caller in blacklist: %s", e)
             return False
 
-        if self.config["DEBUG"]:
-            print("Blacklist entry updated")
-            pprint(arguments)
+        log.debug("Blacklist entry updated: %s", arguments)
         return True
 
     def remove_number(self, phone_no):
@@ -135,15 +134,13 @@ class Blacklist(object):
         query = 'DELETE FROM Blacklist WHERE PhoneNo=:phone_no'
         arguments = {'phone_no': phone_no}
         try:
-            self.db.execute(query, arguments)
-            self.db.commit()
+            with self._db_lock:
+                self.db.execute(query, arguments)
+                self.db.commit()
         except Exception as e:
-            print("** Failed to delete caller from blacklist:")
-            pprint(e)
+            log.error("** Failed to delete caller from blacklist: %s", e)
             return False
-        if self.config["DEBUG"]:
-            print("blacklist entry removed")
-            pprint(arguments)
+        log.debug("blacklist entry removed: %s", arguments)
         return True
 
     def check_number(self, number):
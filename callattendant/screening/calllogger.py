@@ -5,8 +5,12 @@
 # ==============================================================================
 
 from datetime import datetime
-from pprint import pprint
-from screening.query_db import query_db
+
+from database import get_lock
+from eventbus import event_bus
+from logconfig import get_logger
+
+log = get_logger("screening")
 
 
 class CallLogger(object):
@@ -40,28 +44,43 @@ class CallLogger(object):
                      datetime.strptime(callerid['TIME'], '%H%M').strftime('%I:%M %p'),
                      (datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f')[:19])]
 
-        self.db.execute(sql, arguments)
-        self.db.commit()
-
-        # Return the CallLogID
-        query = "select last_insert_rowid()"
-        result = query_db(self.db, query, (), True)
-        call_no = result[0]
-
-        if self.config["DEBUG"]:
-            print("> New call log entry #{}".format(call_no))
-            pprint(arguments)
+        # Use the cursor's lastrowid for the CallLogID; the connection is
+        # shared by the phone lines, so last_insert_rowid() could return
+        # the row inserted by another line.
+        with self._db_lock:
+            curs = self.db.cursor()
+            curs.execute(sql, arguments)
+            self.db.commit()
+            call_no = curs.lastrowid
+            curs.close()
+
+        # Count the call in the recent call rates
+        if self.rate_detector is not None:
+            self.rate_detector.record(callerid['NMBR'])
+
+        # Notify the web pages
+        event_bus.publish("call", {
+            "call_no": call_no,
+            "name": callerid['NAME'],
+            "number": callerid['NMBR'],
+            "action": action,
+            "reason": reason,
+            "date_time": arguments[6]})
+
+        log.debug("> New call log entry #%s: %s", call_no, arguments)
         return call_no
 
-    def __init__(self, db, config):
+    def __init__(self, db, config, rate_detector=None):
         """ Initializes the CallLogger object and creates the
             CallLog table if it doesn't exist
+            :param rate_detector: an optional CallRateDetector fed with each call
         """
         self.db = db
+        self._db_lock = get_lock(db)
         self.config = config
+        self.rate_detector = rate_detector
 
-        if self.config["DEBUG"]:
-            print("Initializing CallLogger")
+        log.debug("Initializing CallLogger")
 
         # Create the Call_History table if it does not exist
         sql = """CREATE TABLE IF NOT EXISTS CallLog (
@@ -93,11 +112,11 @@ class CallLogger(object):
                 whitelist = Whitelist(db, config)
                 blacklist = Blacklist(db, config)
 
-                print(">> Adding Action column to CallLog table")
+                log.info(">> Adding Action column to CallLog table")
                 sql = """ALTER TABLE CallLog ADD COLUMN Action TEXT default null"""
                 curs.executescript(sql)
 
-                print(">> Updating Action column in CallLog table")
+                log.info(">> Updating Action column in CallLog table")
                 sql = """UPDATE CallLog
                     SET `Action`=(select
                     CASE
@@ -111,11 +130,11 @@ class CallLogger(object):
                     WHERE CallLog.CallLogID = a.CallLogID)"""
                 curs.executescript(sql)
 
-                print(">> Adding Reason column to CallLog table")
+                log.info(">> Adding Reason column to CallLog table")
                 sql = """ALTER TABLE CallLog ADD COLUMN Reason TEXT default null"""
                 curs.executescript(sql)
 
-                print(">> Updating Reason column in CallLog table")
+                log.info(">> Updating Reason column in CallLog table")
                 sql = """UPDATE CallLog
                     SET `Reason`=(select
                     CASE
@@ -130,10 +149,9 @@ class CallLogger(object):
                 curs.executescript(sql)
 
         except Exception as e:
-            print(e)
+            log.error("%s", e)
 
         curs.close()
         self.db.commit()
 
-        if self.config["DEBUG"]:
-            print("CallLogger initialized")
+        log.debug("CallLogger initialized")
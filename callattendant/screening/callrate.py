@@ -0,0 +1,202 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#  callrate.py
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+
+
+import array
+import hashlib
+import threading
+import time
+from datetime import datetime
+
+from database import get_lock
+from logconfig import get_logger
+
+log = get_logger("screening")
+
+# Each sketch row has this many counters; more columns reduce the overestimates
+SKETCH_WIDTH = 1024
+SKETCH_DEPTH = 4
+
+# The window is divided into this many buckets, which expire one at a time
+WINDOW_BUCKETS = 6
+
+
+def get_prefix(number):
+    """
+    Returns the NPA-NXX (area code and exchange) of a North American
+    number, or None if the number is not a 10 digit number.
+    """
+    digits = "".join(filter(str.isdigit, number))
+    if len(digits) == 11 and digits.startswith("1"):
+        digits = digits[1:]
+    return digits[:6] if len(digits) == 10 else None
+
+
+class SlidingSketch(object):
+    """
+    A count-min sketch of the events in a sliding time window. The counts
+    are approximate, never under the actual count, and use constant memory
+    regardless of the number of distinct keys.
+    """
+
+    def __init__(self, window_secs, width=SKETCH_WIDTH, depth=SKETCH_DEPTH, buckets=WINDOW_BUCKETS):
+        """
+        Constructor.
+            :param window_secs:
+                The length of the sliding window in seconds
+            :param width:
+                The number of counters in each row
+            :param depth:
+                The number of rows, i.e., the number of hashes per key
+            :param buckets:
+                The number of time buckets in the window
+        """
+        self.width = width
+        self.depth = depth
+        self.bucket_secs = window_secs / buckets
+        self._tables = [array.array("I", bytes(4 * width * depth)) for n in range(buckets)]
+        self._epochs = [None] * buckets
+
+    def add(self, key, timestamp):
+        """
+        Counts an event for the key at the given time.
+        """
+        table = self._get_table(timestamp)
+        for index in self._indexes(key):
+            table[index] += 1
+
+    def estimate(self, key, timestamp):
+        """
+        Returns the number of events for the key in the window ending at the given time.
+        """
+        current = int(timestamp // self.bucket_secs)
+        tables = [table for table, epoch in zip(self._tables, self._epochs)
+                  if epoch is not None and current - len(self._tables) < epoch <= current]
+        return min(sum(table[index] for table in tables) for index in self._indexes(key))
+
+    def _get_table(self, timestamp):
+        """
+        Returns the bucket for the given time, clearing it if it holds expired counts.
+        """
+        epoch = int(timestamp // self.bucket_secs)
+        slot = epoch % len(self._tables)
+        if self._epochs[slot] != epoch:
+            self._tables[slot] = array.array("I", bytes(4 * self.width * self.depth))
+            self._epochs[slot] = epoch
+        return self._tables[slot]
+
+    def _indexes(self, key):
+        """
+        Returns the counter index in each row for the key.
+        """
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest()
+        h1 = int.from_bytes(digest[:4], "little")
+        h2 = int.from_bytes(digest[4:], "little") | 1
+        return [row * self.width + (h1 + row * h2) % self.width for row in range(self.depth)]
+
+
+class CallRateDetector(object):
+    """
+    Tracks the recent call rate of each number and the number of distinct
+    callers from each NPA-NXX exchange in constant memory. A number that
+    calls too often, or a flood of different numbers from our own exchange
+    (neighbor spoofing), is reported so that the call can be blocked.
+    """
+
+    def __init__(self, config):
+        """
+        Constructor.
+            :param config:
+                The application-wide config object.
+        """
+        self.config = config
+        self.window = config.get("CALL_RATE_WINDOW", 3600)
+        self.max_calls = config.get("CALL_RATE_MAX_CALLS", 0)
+        self.max_prefix_numbers = config.get("CALL_RATE_MAX_PREFIX_NUMBERS", 0)
+        self.home_prefix = "".join(filter(str.isdigit, config.get("CALL_RATE_HOME_PREFIX", "")))
+
+        self._lock = threading.Lock()
+        self._calls = SlidingSketch(self.window)
+        self._prefix_numbers = SlidingSketch(self.window)
+
+    def record(self, number, timestamp=None):
+        """
+        Counts a call from the number.
+            :param number:
+                The caller's number
+            :param timestamp:
+                The time of the call (secs since the epoch); defaults to now
+        """
+        timestamp = time.time() if timestamp is None else timestamp
+        prefix = get_prefix(number)
+        with self._lock:
+            # The first call in the window from a number counts as a distinct number for its exchange
+            if prefix is not None and self._calls.estimate(number, timestamp) == 0:
+                self._prefix_numbers.add(prefix, timestamp)
+            self._calls.add(number, timestamp)
+
+    def load(self, db):
+        """
+        Counts the calls in the CallLog table that are within the window,
+        so that the rates survive a restart.
+            :param db:
+                The database connection
+        """
+        since = datetime.fromtimestamp(time.time() - self.window).strftime("%Y-%m-%d %H:%M:%S")
+        sql = "SELECT Number, SystemDateTime FROM CallLog WHERE SystemDateTime >= ? ORDER BY CallLogID"
+        with get_lock(db):
+            curs = db.execute(sql, (since,))
+            rows = curs.fetchall()
+            curs.close()
+        for number, system_datetime in rows:
+            try:
+                timestamp = datetime.strptime(system_datetime, "%Y-%m-%d %H:%M:%S").timestamp()
+            except (TypeError, ValueError):
+                continue
+            self.record(number, timestamp)
+
+    def check(self, number, timestamp=None):
+        """
+        Checks the recent call rates for the number.
+            :param number:
+                The caller's number
+            :param timestamp:
+                The time of the call (secs since the epoch); defaults to now
+            :return:
+                (True, reason) if a threshold is exceeded, otherwise (False, None)
+        """
+        timestamp = time.time() if timestamp is None else timestamp
+        minutes = int(self.window // 60)
+        with self._lock:
+            if self.max_calls:
+                calls = self._calls.estimate(number, timestamp)
+                if calls >= self.max_calls:
+                    return True, "{} calls in {} minutes".format(calls, minutes)
+
+            prefix = get_prefix(number)
+            if self.max_prefix_numbers and prefix is not None and prefix == self.home_prefix:
+                numbers = self._prefix_numbers.estimate(prefix, timestamp)
+                if numbers >= self.max_prefix_numbers:
+                    return True, "Neighbor spoofing: {} numbers from {} in {} minutes".format(
+                        numbers, prefix, minutes)
+        return False, None
@@ -29,30 +29,38 @@ import sys
 
 from screening.blacklist import Blacklist
 from screening.whitelist import Whitelist
-from screening.nomorobo import NomoroboService
-from screening.shouldianswer import ShouldIAnswer
+from screening.calltiming import CallTimer
 import yaml
 
+from logconfig import get_logger
+
+log = get_logger("screening")
+
 
 class CallScreener(object):
     """The CallScreener provides blacklist and whitelist checks"""
 
-    def is_whitelisted(self, callerid):
-        """Returns true if the number is on a whitelist"""
+    def is_whitelisted(self, callerid, timer=None):
+        """
+        Returns true if the number is on a whitelist.
+        The optional CallTimer records the end of each screening stage.
+        """
         number = callerid['NMBR']
         name = callerid["NAME"]
-        try:
-            is_whitelisted, reason = self._whitelist.check_number(callerid['NMBR'])
-            if is_whitelisted:
-                return True, reason
-            else:
-                print(">> Checking permitted patterns...")
+        timer = timer or CallTimer()
+        is_whitelisted, reason = self._whitelist.check_number(callerid['NMBR'])
+        timer.mark("whitelist")
+        if is_whitelisted:
+            return True, reason
+        else:
+            log.info(">> Checking permitted patterns...")
+            try:
                 patternlist = self.config.get("CALLERID_PATTERNS")["permitnames"]
                 for key in patternlist.keys():
                     match = re.search(key, name, re.IGNORECASE)
                     if match:
                         reason = patternlist[key]
-                        print(reason)
+                        log.info("%s", reason)
                         return True, reason
 
                 patternlist = self.config["CALLERID_PATTERNS"]["permitnumbers"]
@@ -60,28 +68,33 @@ class CallScreener(object):
                     match = re.search(key, number)
                     if match:
                         reason = patternlist[key]
-                        print(reason)
+                        log.info("%s", reason)
                         return True, reason
-                return False, "Not found"
-        finally:
-            sys.stdout.flush()
-
-    def is_blacklisted(self, callerid):
-        """Returns true if the number is on a blacklist"""
+            finally:
+                timer.mark("permit_patterns")
+            return False, "Not found"
+
+    def is_blacklisted(self, callerid, timer=None):
+        """
+        Returns true if the number is on a blacklist.
+        The optional CallTimer records the end of each screening stage.
+        """
         number = callerid['NMBR']
         name = callerid["NAME"]
-        try:
-            is_blacklisted, reason = self._blacklist.check_number(number)
-            if is_blacklisted:
-                return True, reason
-            else:
-                print(">> Checking blocked patterns...")
+        timer = timer or CallTimer()
+        is_blacklisted, reason = self._blacklist.check_number(number)
+        timer.mark("blacklist")
+        if is_blacklisted:
+            return True, reason
+        else:
+            log.info(">> Checking blocked patterns...")
+            try:
                 patternlist = self.config["CALLERID_PATTERNS"]["blocknames"]
                 for key in patternlist.keys():
                     match = re.search(key, name, re.IGNORECASE)
                     if match:
                         reason = patternlist[key]
-                        print(reason)
+                        log.info("%s", reason)
                         return True, reason
 
                 patternlist = self.config["CALLERID_PATTERNS"]["blocknumbers"]
@@ -89,24 +102,35 @@ class CallScreener(object):
                     match = re.search(key, number)
                     if match:
                         reason = patternlist[key]
-                        print(reason)
-                        return True, reason
-
-                if self._blockservice is not None:
-                    print(">> Checking block service...")
-                    result = self._blockservice.lookup_number(number)
-                    if result["spam"]:
-                        reason = "{} with score {}".format(result["reason"], result["score"])
-                        if self.config["DEBUG"]:
-                            print(">>> {}".format(reason))
-                        self.blacklist_caller(callerid, reason)
+                        log.info("%s", reason)
                         return True, reason
-
-                print("Caller has been screened")
-                return False, "Not found"
-
-        finally:
-            sys.stdout.flush()
+            finally:
+                timer.mark("block_patterns")
+
+            if self._blockservice is not None:
+                log.info(">> Checking block service...")
+                result = self._blockservice.lookup_number(number)
+                timer.mark("block_service")
+                if result["spam"]:
+                    reason = "{} with score {}".format(result["reason"], result["score"])
+                    log.debug(">>> %s", reason)
+                    self.blacklist_caller(callerid, reason)
+                    return True, reason
+
+            log.info("Caller has been screened")
+            return False, "Not found"
+
+    def is_call_flood(self, callerid):
+        """
+        Returns true if the number, or its exchange, is calling at a rate
+        that exceeds the CALL_RATE thresholds.
+        """
+        if self._rate_detector is None:
+            return False, None
+        is_flood, reason = self._rate_detector.check(callerid['NMBR'])
+        if is_flood:
+            log.info("Call rate exceeded: %s", reason)
+        return is_flood, reason
 
     def whitelist_caller(self, callerid, reason):
         self._whitelist.add_caller(callerid, reason)
@@ -114,20 +138,23 @@ class CallScreener(object):
     def blacklist_caller(self, callerid, reason):
         self._blacklist.add_caller(callerid, reason)
 
-    def __init__(self, db, config):
+    def __init__(self, db, config, rate_detector=None):
         self._db = db
         self.config = config
-        if self.config["DEBUG"]:
-            print("Initializing CallScreener")
+        self._rate_detector = rate_detector
+        log.debug("Initializing CallScreener")
 
         self._blacklist = Blacklist(db, config)
         self._whitelist = Whitelist(db, config)
 
         bs = config["BLOCK_SERVICE"].upper()
         if bs == "NOMOROBO":
+            # Imported when used: requests and bs4 are slow to load
+            from screening.nomorobo import NomoroboService
             # Set blocking threshold to 1 to filter nuisance calls
             self._blockservice = NomoroboService(config["BLOCK_SERVICE_THRESHOLD"])
         elif bs == "SHOULDIANSWER":
+            from screening.shouldianswer import ShouldIAnswer
             self._blockservice = ShouldIAnswer(config["BLOCK_SERVICE_THRESHOLD"])
         else:
             self._blockservice = None
@@ -137,16 +164,15 @@ class CallScreener(object):
             with open(self.config["CALLERID_PATTERNS_FILE"], "r") as file:
                 self.config["CALLERID_PATTERNS"] = yaml.safe_load(file)
         except FileNotFoundError:
-            print("Callerid patterns file not found")
+            log.warning("Callerid patterns file not found")
             # Load dummy patterns
             self.config["CALLERID_PATTERNS"] = {'blocknames': {}, 'blocknumbers': {},
                                                 'permitnames': {}, 'permitnumbers': {}}
         except yaml.YAMLError as e:
-            print("Error loading callerid patterns file")
+            log.error("Error loading callerid patterns file")
             if hasattr(e, 'problem_mark'):
                 mark = e.problem_mark
-                print("Error parsing Yaml file at line {}, column {}.".format(mark.line + 1, mark.column + 1))
+                log.error("Error parsing Yaml file at line %s, column %s.", mark.line + 1, mark.column + 1)
             sys.exit(1)
 
-        if self.config["DEBUG"]:
-            print("CallScreener initialized")
+        log.debug("CallScreener initialized")
@@ -0,0 +1,294 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#  calltiming.py
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+
+
+import logging
+import sqlite3
+import time
+from collections import OrderedDict
+
+from database import get_lock
+from logconfig import get_logger
+
+log = get_logger("screening")
+
+# The call stages in the order they occur, and their CallTiming columns.
+# Each stage is timestamped when it ends.
+STAGES = OrderedDict([
+    ("ring", "Ring"),                       # first RING
+    ("cid", "CallerID"),                    # caller ID complete, call queued
+    ("dequeue", "Dequeue"),                 # taken from the line's caller queue
+    ("next_call", "NextCall"),              # next-call-permitted flag checked
+    ("whitelist", "Whitelist"),             # whitelist lookup
+    ("permit_patterns", "PermitPatterns"),  # permitted name and number patterns
+    ("blacklist", "Blacklist"),             # blacklist lookup
+    ("block_patterns", "BlockPatterns"),    # blocked name and number patterns
+    ("block_service", "BlockService"),      # online block service lookup
+    ("logged", "Logged"),                   # call log entry written
+    ("answered", "Answered"),               # off-hook, after waiting for rings
+    ("first_audio", "FirstAudio"),          # first byte of the greeting sent
+])
+
+# The stages that make up the screening latency
+SCREENING_STAGES = ("next_call", "whitelist", "permit_patterns", "blacklist", "block_patterns", "block_service")
+
+# Histogram bucket upper bounds (secs)
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class CallTimer(object):
+    """
+    Collects the monotonic timestamps of the stages of a call.
+    """
+
+    def __init__(self):
+        self.marks = OrderedDict()
+
+    def mark(self, stage, timestamp=None):
+        """
+        Records the end of a stage.
+            :param stage:
+                One of the STAGES names
+            :param timestamp:
+                A time.monotonic() value; defaults to now
+        """
+        self.marks[stage] = time.monotonic() if timestamp is None else timestamp
+
+    def offsets(self):
+        """
+        Returns the stage timestamps as offsets (secs) from the first stage.
+        """
+        if not self.marks:
+            return {}
+        start = min(self.marks.values())
+        return {stage: t - start for stage, t in self.marks.items()}
+
+    def durations(self):
+        """
+        Returns the duration (secs) of each recorded stage, i.e., the time
+        since the previous recorded stage.
+        """
+        durations = OrderedDict()
+        previous = None
+        for stage in STAGES:
+            if stage not in self.marks:
+                continue
+            if previous is not None:
+                durations[stage] = max(0.0, self.marks[stage] - previous)
+            previous = self.marks[stage]
+        return durations
+
+
+class CallTiming(object):
+    """
+    Stores the call timelines in the CallTiming table, keyed by CallLogID,
+    and summarizes them as latency histograms.
+    """
+
+    def __init__(self, db, config):
+        """
+        Initializes the CallTiming object and creates the CallTiming
+        table if it doesn't exist.
+            :param db:
+                The database connection
+            :param config:
+                The application-wide config object.
+        """
+        self.db = db
+        self._db_lock = get_lock(db)
+        self.config = config
+
+        log.debug("Initializing CallTiming")
+
+        columns = ",\n".join("{} REAL".format(column) for column in STAGES.values())
+        sql = """CREATE TABLE IF NOT EXISTS CallTiming (
+            CallLogID INTEGER PRIMARY KEY,
+            {},
+            FOREIGN KEY(CallLogID) REFERENCES CallLog(CallLogID));""".format(columns)
+        curs = self.db.cursor()
+        curs.executescript(sql)
+        curs.close()
+        self.db.commit()
+
+    def record(self, call_no, timer):
+        """
+        Saves the timeline of a call.
+            :param call_no:
+                The CallLogID of the call
+            :param timer:
+                The call's CallTimer
+        """
+        offsets = timer.offsets()
+        sql = "INSERT OR REPLACE INTO CallTiming(CallLogID, {}) VALUES(?{})".format(
+            ", ".join(STAGES.values()), ",?" * len(STAGES))
+        arguments = [call_no] + [offsets.get(stage) for stage in STAGES]
+        with self._db_lock:
+            curs = self.db.cursor()
+            curs.execute(sql, arguments)
+            self.db.commit()
+            curs.close()
+
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("> Call #%s timing: %s", call_no, ", ".join(
+                "{} {:.3f}s".format(stage, secs) for stage, secs in timer.durations().items()))
+
+    def get_timers(self):
+        """
+        Returns a CallTimer for each recorded call.
+        """
+        sql = "SELECT {} FROM CallTiming".format(", ".join(STAGES.values()))
+        with self._db_lock:
+            curs = self.db.cursor()
+            curs.execute(sql)
+            rows = curs.fetchall()
+            curs.close()
+        timers = []
+        for row in rows:
+            timer = CallTimer()
+            for stage, offset in zip(STAGES, row):
+                if offset is not None:
+                    timer.mark(stage, offset)
+            timers.append(timer)
+        return timers
+
+    def get_histograms(self):
+        """
+        Returns the latency histograms of the recorded calls.
+        """
+        return get_histograms(self.db)
+
+    def get_metrics(self):
+        """
+        Returns the latency histograms in the Prometheus text exposition format.
+        """
+        return get_metrics(self.db)
+
+
+def _build_histogram_sql():
+    """
+    Builds the query that buckets the stage durations of all the calls,
+    as CallTimer.durations() computes them: the time since the previous
+    recorded stage.
+    """
+    durations = OrderedDict()
+    columns = list(STAGES.values())
+    for n, stage in enumerate(STAGES):
+        if n == 0:
+            continue
+        previous = ", ".join(reversed(columns[:n]))
+        durations[stage] = "MAX(0.0, {} - COALESCE({}, NULL))".format(columns[n], previous)
+    screening = ["d_" + stage for stage in SCREENING_STAGES]
+    screening_sql = "CASE WHEN COALESCE({}, NULL) IS NULL THEN NULL ELSE {} END".format(
+        ", ".join(screening), " + ".join("COALESCE({}, 0.0)".format(d) for d in screening))
+
+    aggregates = []
+    for d in ["d_" + stage for stage in durations] + ["screening"]:
+        aggregates.extend("SUM({} <= {})".format(d, bound) for bound in BUCKETS)
+        aggregates.extend(["COUNT({})".format(d), "TOTAL({})".format(d)])
+    return "SELECT {} FROM (SELECT *, {} AS screening FROM (SELECT {} FROM CallTiming))".format(
+        ", ".join(aggregates), screening_sql,
+        ", ".join("{} AS d_{}".format(sql, stage) for stage, sql in durations.items()))
+
+
+_HISTOGRAM_SQL = _build_histogram_sql()
+
+
+def get_histograms(db):
+    """
+    Returns the latency histograms of the recorded calls. The durations
+    are bucketed by the database, so the calls are not loaded.
+        :param db:
+            The database connection
+        :return:
+            a dict with a "stages" dict of Histograms by stage name,
+            and a "screening" Histogram of the total screening latency
+    """
+    stages = OrderedDict((stage, Histogram()) for stage in STAGES if stage != "ring")
+    screening = Histogram()
+    try:
+        with get_lock(db):
+            curs = db.execute(_HISTOGRAM_SQL)
+            row = curs.fetchone()
+            curs.close()
+    except sqlite3.OperationalError:
+        # The CallTiming table has not been created
+        row = None
+    if row is not None:
+        width = len(BUCKETS) + 2
+        for n, histogram in enumerate(list(stages.values()) + [screening]):
+            values = row[n * width:(n + 1) * width]
+            histogram.counts = [count or 0 for count in values[:len(BUCKETS)]]
+            histogram.count = values[-2]
+            histogram.sum = values[-1]
+    return {"stages": stages, "screening": screening}
+
+
+def get_metrics(db):
+    """
+    Returns the latency histograms in the Prometheus text exposition format.
+        :param db:
+            The database connection
+    """
+    histograms = get_histograms(db)
+    lines = []
+    lines.append("# HELP callattendant_call_stage_seconds Time spent in each stage of a call.")
+    lines.append("# TYPE callattendant_call_stage_seconds histogram")
+    for stage, histogram in histograms["stages"].items():
+        lines.extend(histogram.format("callattendant_call_stage_seconds", 'stage="{}"'.format(stage)))
+    lines.append("# HELP callattendant_screening_seconds Time spent screening a caller.")
+    lines.append("# TYPE callattendant_screening_seconds histogram")
+    lines.extend(histograms["screening"].format("callattendant_screening_seconds"))
+    return "\n".join(lines) + "\n"
+
+
+class Histogram(object):
+    """
+    A latency histogram with cumulative buckets.
+    """
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.count += 1
+        self.sum += value
+
+    def format(self, name, labels=""):
+        """
+        Returns the Prometheus text lines for the histogram.
+        """
+        sep = "," if labels else ""
+        lines = []
+        for bound, count in zip(self.buckets, self.counts):
+            lines.append('{}_bucket{{{}{}le="{}"}} {}'.format(name, labels, sep, bound, count))
+        lines.append('{}_bucket{{{}{}le="+Inf"}} {}'.format(name, labels, sep, self.count))
+        suffix = "{{{}}}".format(labels) if labels else ""
+        lines.append("{}_sum{} {}".format(name, suffix, self.sum))
+        lines.append("{}_count{} {}".format(name, suffix, self.count))
+        return lines
@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#  dataversion.py
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+
+
+# Implements per-table write counters maintained by SQLite triggers. A cache
+# keyed on the counters of the tables it depends on is invalidated by a change
+# made on any connection, e.g., by the call handler or by the webapp.
+
+import sqlite3
+
+from database import get_lock
+
+# The tables shown on the webapp's dashboard
+DASHBOARD_TABLES = ("CallLog", "Message", "Whitelist", "Blacklist")
+
+
+def install_version_triggers(db, tables):
+    """
+    Creates the DataVersion table and the triggers that count the inserts,
+    updates and deletes on the given tables. The tables must already exist.
+        :param db: the database connection
+        :param tables: the names of the tables to count
+    """
+    sql = """CREATE TABLE IF NOT EXISTS DataVersion (
+        TableName TEXT PRIMARY KEY,
+        Version INTEGER DEFAULT 0 NOT NULL);"""
+    for table in tables:
+        sql += """
+        INSERT OR IGNORE INTO DataVersion(TableName) VALUES('{0}');""".format(table)
+        for event in ("INSERT", "UPDATE", "DELETE"):
+            sql += """
+        CREATE TRIGGER IF NOT EXISTS {0}_{1}_data_version AFTER {2} ON {0}
+            BEGIN UPDATE DataVersion SET Version = Version + 1 WHERE TableName = '{0}'; END;""".format(
+                table, event.lower(), event)
+    with get_lock(db):
+        curs = db.cursor()
+        curs.executescript(sql)
+        curs.close()
+
+
+def get_data_version(db, tables):
+    """
+    Returns the write counters of the given tables, or None if the
+    triggers have not been installed.
+        :param db: the database connection
+        :param tables: the names of the tables
+        :return: a tuple with the counter of each table
+    """
+    sql = "SELECT TableName, Version FROM DataVersion WHERE TableName IN ({})".format(
+        ",".join("?" * len(tables)))
+    try:
+        with get_lock(db):
+            curs = db.execute(sql, tables)
+            versions = dict(curs.fetchall())
+            curs.close()
+    except sqlite3.OperationalError:
+        return None
+    if len(versions) != len(tables):
+        return None
+    return tuple(versions[table] for table in tables)
@@ -28,6 +28,10 @@ import requests
 from bs4 import BeautifulSoup
 import re
 
+from logconfig import get_logger
+
+log = get_logger("screening")
+
 
 class NomoroboService(object):
 
@@ -74,7 +78,7 @@ class NomoroboService(object):
                 response.raise_for_status()
         except requests.HTTPError as e:
             code = e.response.status_code
-            print("HTTPError: {}".format(code))
+            log.error("HTTPError: %s", code)
             raise
 
         return data
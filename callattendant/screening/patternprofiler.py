@@ -0,0 +1,172 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#  patternprofiler.py
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+
+
+# Profiles a proposed set of callerid patterns against the call history
+# before it is saved: the matches and evaluation time of each pattern, and
+# the calls whose verdict would change. A regex with catastrophic
+# backtracking cannot be interrupted within Python, so the patterns are
+# evaluated in a child process that is terminated after a timeout.
+
+import multiprocessing
+import re
+import time
+
+# The pattern lists in the order they are checked: permits take precedence
+PATTERN_LISTS = ("permitnames", "permitnumbers", "blocknames", "blocknumbers")
+
+# The dry-run is stopped after this many seconds
+TIMEOUT_SECS = 10.0
+
+# A pattern taking longer than this per call, on average, is flagged as slow
+SLOW_PATTERN_USECS = 50
+
+# The maximum number of changed verdicts reported
+MAX_CHANGES = 100
+
+
+def get_flags(list_name):
+    """
+    Returns the regex flags used by the call screener for the given list.
+    """
+    return re.IGNORECASE if list_name.endswith("names") else 0
+
+
+def compile_patterns(patterns):
+    """
+    Compiles the patterns and returns the errors.
+        :param patterns: a dict of pattern lists, e.g., {"blocknames": {regex: reason}}
+        :return: a list of dicts with the list, pattern and error
+    """
+    errors = []
+    for list_name in PATTERN_LISTS:
+        for pattern in patterns.get(list_name, {}):
+            try:
+                re.compile(pattern, get_flags(list_name))
+            except re.error as e:
+                errors.append({"list": list_name, "pattern": pattern, "error": str(e)})
+    return errors
+
+
+def _evaluate(conn, work, calls):
+    """
+    Child process function that sends the IDs of the calls matched by each
+    pattern, and the time taken, as each pattern is done.
+    """
+    for list_name, pattern in work:
+        field = 1 if list_name.endswith("names") else 2
+        start = time.perf_counter()
+        regex = re.compile(pattern, get_flags(list_name))
+        matched = [call[0] for call in calls if regex.search(call[field] or "")]
+        conn.send((matched, time.perf_counter() - start))
+    conn.close()
+
+
+def _get_verdicts(patterns, matches):
+    """
+    Returns the pattern verdict of each call matched by the patterns:
+    call ID -> (action, list, pattern). The first matching pattern wins.
+    """
+    verdicts = {}
+    for list_name in PATTERN_LISTS:
+        action = "Permitted" if list_name.startswith("permit") else "Blocked"
+        for pattern in patterns.get(list_name, {}):
+            for call_id in matches.get((list_name, pattern), ()):
+                if call_id not in verdicts:
+                    verdicts[call_id] = (action, list_name, pattern)
+    return verdicts
+
+
+def dry_run(patterns, calls, current_patterns=None, timeout=TIMEOUT_SECS):
+    """
+    Runs the proposed patterns against the calls.
+        :param patterns: the proposed pattern lists, e.g., {"blocknames": {regex: reason}}
+        :param calls: a list of (CallLogID, Name, Number, Listed) tuples, where
+            Listed is True if the number is on the whitelist or blacklist
+        :param current_patterns: the pattern lists in use, to find the changed verdicts
+        :param timeout: the maximum run time (secs)
+        :return: a dict with the errors, the per pattern results, the pattern
+            that timed out, if any, and the changed verdicts
+    """
+    report = {"calls": len(calls), "errors": compile_patterns(patterns), "patterns": [],
+              "timed_out": None, "changed": 0, "changes": []}
+    if report["errors"]:
+        return report
+    current_patterns = current_patterns or {}
+
+    # Evaluate the proposed patterns, then the current patterns that are not proposed
+    work = [(list_name, pattern) for list_name in PATTERN_LISTS for pattern in patterns.get(list_name, {})]
+    proposed_count = len(work)
+    work += [(list_name, pattern) for list_name in PATTERN_LISTS for pattern in current_patterns.get(list_name, {})
+             if pattern not in patterns.get(list_name, {})]
+
+    matches = {}
+    context = multiprocessing.get_context("spawn")
+    parent_conn, child_conn = context.Pipe(duplex=False)
+    process = context.Process(target=_evaluate, args=(child_conn, work, calls), daemon=True)
+    start = time.monotonic()
+    process.start()
+    child_conn.close()
+    try:
+        for n, (list_name, pattern) in enumerate(work):
+            remaining = timeout - (time.monotonic() - start)
+            if remaining <= 0 or not parent_conn.poll(remaining):
+                report["timed_out"] = {"list": list_name, "pattern": pattern}
+                break
+            matched, secs = parent_conn.recv()
+            matches[(list_name, pattern)] = matched
+            if n < proposed_count:
+                report["patterns"].append({
+                    "list": list_name,
+                    "pattern": pattern,
+                    "matches": len(matched),
+                    "secs": secs,
+                    "slow": secs * 1e6 / max(1, len(calls)) > SLOW_PATTERN_USECS})
+    except EOFError:
+        report["errors"].append({"list": None, "pattern": None, "error": "The dry-run process failed"})
+    finally:
+        process.terminate()
+        process.join()
+        parent_conn.close()
+    report["elapsed"] = time.monotonic() - start
+    if report["timed_out"] or report["errors"]:
+        return report
+
+    # The numbers on the whitelist or blacklist are screened by the lists, not the patterns
+    before = _get_verdicts(current_patterns, matches)
+    after = _get_verdicts(patterns, matches)
+    for call_id, name, number, listed in calls:
+        old = before.get(call_id)
+        new = after.get(call_id)
+        if listed or (old and old[0]) == (new and new[0]):
+            continue
+        report["changed"] += 1
+        if len(report["changes"]) < MAX_CHANGES:
+            report["changes"].append({
+                "call_no": call_id,
+                "name": name,
+                "number": number,
+                "before": old[0] if old else "Screened",
+                "after": new[0] if new else "Screened",
+                "pattern": new[2] if new else old[2]})
+    return report
@@ -23,10 +23,13 @@
 #  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 #  SOFTWARE.
 
+from database import get_lock
+
 
 def query_db(db, query, args=(), one=False):
     """Executes the given query on the supplied db and returns the result(s)."""
-    cur = db.execute(query, args)
-    results = cur.fetchall()
-    cur.close()
+    with get_lock(db):
+        cur = db.execute(query, args)
+        results = cur.fetchall()
+        cur.close()
     return (results[0] if results else None) if one else results
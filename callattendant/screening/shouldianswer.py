@@ -28,6 +28,10 @@
 import requests
 from bs4 import BeautifulSoup
 
+from logconfig import get_logger
+
+log = get_logger("screening")
+
 class ShouldIAnswer(object):
 
     def lookup_number(self, number):
@@ -70,7 +74,7 @@ class ShouldIAnswer(object):
                 response.raise_for_status()
         except requests.HTTPError as e:
             code = e.response.status_code
-            print("HTTPError: {}".format(code))
+            log.error("HTTPError: %s", code)
             raise
 
         return data
@@ -0,0 +1,158 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#  verdictcache.py
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+
+
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from screening.dataversion import get_data_version, install_version_triggers
+from logconfig import get_logger
+
+log = get_logger("screening")
+
+# The maximum number of callers held in the cache; the least recently used is evicted
+MAX_ENTRIES = 1000
+
+# The screening lists whose changes invalidate the cache
+SCREENING_TABLES = ("Whitelist", "Blacklist")
+
+
+class VerdictCache(object):
+    """
+    A short-lived cache of screening verdicts keyed by caller number and
+    name, so that a caller who rings again within a few minutes, e.g., a
+    robocaller, is decided without rescanning the lists and patterns or
+    repeating an online lookup. The cache is cleared when the whitelist,
+    blacklist, callerid patterns or next-call flag change.
+    """
+
+    def __init__(self, db, config):
+        """
+        Constructor. The Whitelist and Blacklist tables must already exist.
+            :param db:
+                The database connection
+            :param config:
+                The application-wide config object.
+        """
+        self.db = db
+        self.config = config
+        self.ttl = config.get("VERDICT_CACHE_TTL", 300)
+
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._version = None
+
+        # Triggers keep a write counter for the screening lists, so that changes
+        # made on any connection, e.g., by the webapp, are detected with one query.
+        install_version_triggers(self.db, SCREENING_TABLES)
+
+    def get(self, caller):
+        """
+        Returns the cached verdict for the caller.
+            :param caller:
+                The caller ID data
+            :return:
+                (action, reason), or None if the caller is not cached
+        """
+        if not self.ttl:
+            return None
+        key = (caller["NMBR"], caller["NAME"])
+        with self._lock:
+            self._check_version()
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, caller, verdict):
+        """
+        Caches the verdict for the caller.
+            :param caller:
+                The caller ID data
+            :param verdict:
+                (action, reason)
+        """
+        if not self.ttl:
+            return
+        key = (caller["NMBR"], caller["NAME"])
+        with self._lock:
+            # Screening may have changed the lists, e.g., an auto-blocked caller
+            self._check_version()
+            self._entries[key] = (verdict, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > MAX_ENTRIES:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """
+        Removes all the cached verdicts.
+        """
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self):
+        """
+        Returns the hit, miss and invalidation counts and the number of cached callers.
+        """
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+                "entries": len(self._entries),
+            }
+
+    def _check_version(self):
+        """
+        Clears the cache if the screening data changed since the last check.
+        """
+        version = self._get_version()
+        if version != self._version:
+            if self._entries:
+                log.debug("Screening data changed; clearing %d cached verdicts", len(self._entries))
+                self.invalidations += 1
+                self._entries.clear()
+            self._version = version
+
+    def _get_version(self):
+        """
+        Returns a token that changes when the lists, patterns or next-call flag change.
+        """
+        list_version = get_data_version(self.db, SCREENING_TABLES)
+        try:
+            patterns_mtime = os.stat(self.config["CALLERID_PATTERNS_FILE"]).st_mtime_ns
+        except (OSError, TypeError):
+            patterns_mtime = None
+        next_call = os.path.exists(self.config["PERMIT_NEXT_CALL_FLAG"] or "")
+        return list_version, patterns_mtime, next_call
@@ -30,29 +30,33 @@
 # ==============================================================================
 
 from datetime import datetime
-from pprint import pprint
 import csv
 
+from database import get_lock
 from screening.query_db import query_db
+from logconfig import get_logger
+
+log = get_logger("screening")
 
 class Whitelist(object):
 
     def __init__(self, db, config):
         """Ensures database access to the Whitelist table"""
         self.db = db
+        self._db_lock = get_lock(db)
         self.config = config
 
-        if self.config["DEBUG"]:
-            print("Initializing Whitelist")
+        log.debug("Initializing Whitelist")
 
         sql = """CREATE TABLE IF NOT EXISTS Whitelist (
             PhoneNo TEXT PRIMARY KEY,
             Name TEXT,
             Reason TEXT,
             SystemDateTime TEXT)"""
-        curs = self.db.cursor()
-        curs.executescript(sql)
-        curs.close()
+        with self._db_lock:
+            curs = self.db.cursor()
+            curs.executescript(sql)
+            curs.close()
 
         if self.config["TESTING"]:
             # Add a record to the test db;
@@ -65,8 +69,7 @@ class Whitelist(object):
             }
             self.add_caller(caller, "Whitelist test")
 
-        if self.config["DEBUG"]:
-            print("Whitelist initialized")
+        log.debug("Whitelist initialized")
 
     def add_caller(self, call_record, reason=""):
         """
@@ -88,14 +91,12 @@ class Whitelist(object):
             (datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f')[:19])
         ]
         try:
-            self.db.execute(query, arguments)
-            self.db.commit()
-            if self.config["DEBUG"]:
-                print("New whitelist entry added")
-                pprint(arguments)
+            with self._db_lock:
+                self.db.execute(query, arguments)
+                self.db.commit()
+            log.debug("New whitelist entry added: %s", arguments)
         except Exception as e:
-            print("** Failed to add caller to whitelist:")
-            pprint(e)
+            log.error("** Failed to add caller to whitelist: %s", e)
             return False
         return True
 
@@ -106,18 +107,17 @@ class Whitelist(object):
         """
         query = 'DELETE FROM Whitelist WHERE PhoneNo=:phone_no'
         arguments = {'phone_no': phone_no}
-        self.db.execute(query, arguments)
-        self.db.commit()
-        try:
+        with self._db_lock:
             self.db.execute(query, arguments)
             self.db.commit()
+        try:
+            with self._db_lock:
+                self.db.execute(query, arguments)
+                self.db.commit()
         except Exception as e:
-            print("** Failed to delete caller from whitelist:")
-            pprint(e)
+            log.error("** Failed to delete caller from whitelist: %s", e)
             return False
-        if self.config["DEBUG"]:
-            print("Whitelist entry removed")
-            pprint(arguments)
+        log.debug("Whitelist entry removed: %s", arguments)
         return True
 
     def update_number(self, phone_no, name, reason):
@@ -137,15 +137,13 @@ class Whitelist(object):
             "time": (datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f')[:19])
             }
         try:
-            self.db.execute(sql, arguments)
-            self.db.commit()
+            with self._db_lock:
+                self.db.execute(sql, arguments)
+                self.db.commit()
         except Exception as e:
-            print("** Failed to update caller in whitelist:")
-            pprint(e)
+            log.error("** Failed to update caller in whitelist: %s", e)
             return False
-        if self.config["DEBUG"]:
-            print("Whitelist entry updated")
-            pprint(arguments)
+        log.debug("Whitelist entry updated: %s", arguments)
         return True
 
     def check_number(self, number):
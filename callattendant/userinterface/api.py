@@ -0,0 +1,312 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#  api.py
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+
+
+# Implements the versioned JSON API used by integrations, e.g., home
+# automation dashboards, to poll the call log, lists and messages.
+# A poll of unchanged data is answered with "304 Not Modified" without
+# running the queries: the ETag is derived from the table write counters.
+
+import hashlib
+import json
+
+from flask import Blueprint, Response, g, request, url_for
+
+from messaging.message import get_unplayed_count
+from screening.dataversion import get_data_version
+from userinterface.compression import get_encoding
+from userinterface.formatting import parse_waveform
+
+api = Blueprint("api", __name__, url_prefix="/api/v1")
+
+# The page size limits for the list resources
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 500
+
+CALL_FIELDS = ("id", "name", "number", "action", "reason", "date_time",
+               "whitelisted", "blacklisted", "msg_no")
+MESSAGE_FIELDS = ("id", "call_id", "name", "number", "played", "date_time",
+                  "duration", "peak", "rms", "waveform", "audio_url")
+LIST_FIELDS = ("number", "name", "reason", "date_time")
+
+
+class APIError(Exception):
+    """
+    An invalid request; returned to the client as a JSON error.
+    """
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+@api.errorhandler(APIError)
+def handle_api_error(error):
+    return json_response({"error": error.message}, status=error.status)
+
+
+@api.route("/calls", methods=["GET"])
+def calls():
+    """
+    The call log, newest first. Query args: limit, before (a call id),
+    number, action and fields.
+    """
+    return get_resource(("CallLog", "Message", "Whitelist", "Blacklist"), query_calls, CALL_FIELDS)
+
+
+@api.route("/messages", methods=["GET"])
+def messages():
+    """
+    The voice messages, newest first. Query args: limit, before (a message id),
+    played (0 or 1) and fields.
+    """
+    return get_resource(("Message", "CallLog"), query_messages, MESSAGE_FIELDS)
+
+
+@api.route("/blocked", methods=["GET"])
+def blocked():
+    """
+    The blocked numbers, ordered by number. Query args: limit, after (a number) and fields.
+    """
+    return get_resource(("Blacklist",), lambda: query_list("Blacklist"), LIST_FIELDS)
+
+
+@api.route("/permitted", methods=["GET"])
+def permitted():
+    """
+    The permitted numbers, ordered by number. Query args: limit, after (a number) and fields.
+    """
+    return get_resource(("Whitelist",), lambda: query_list("Whitelist"), LIST_FIELDS)
+
+
+@api.route("/stats", methods=["GET"])
+def stats():
+    """
+    The call, list and message totals.
+    """
+    return get_resource(("CallLog", "Message", "Whitelist", "Blacklist"), query_stats)
+
+
+def get_resource(tables, query, fields=None):
+    """
+    Returns the JSON response for a resource, or "304 Not Modified" if the
+    client's copy is current.
+        :param tables: the tables the resource is built from
+        :param query: a function returning the resource as a dict
+        :param fields: the item fields that can be selected, if the resource is a list
+    """
+    selected = get_fields(fields) if fields else None
+
+    # The ETag changes when any of the tables is written to. The response
+    # is compressed by the webapp; each encoding has its own ETag.
+    etag = None
+    version = get_data_version(g.conn, tables)
+    if version is not None:
+        key = "{}?{}|{}|{}".format(request.path, request.query_string.decode(), version, get_encoding(request))
+        etag = hashlib.sha1(key.encode()).hexdigest()[:20]
+        if etag in request.if_none_match:
+            response = Response(status=304)
+            response.set_etag(etag)
+            response.cache_control.no_cache = True
+            return response
+
+    result = query()
+    if selected:
+        result["items"] = [{name: item[name] for name in selected} for item in result["items"]]
+    response = json_response(result)
+    if etag:
+        response.set_etag(etag)
+    response.cache_control.no_cache = True
+    return response
+
+
+def json_response(data, status=200):
+    """
+    Returns a compact JSON response.
+    """
+    body = json.dumps(data, separators=(",", ":"))
+    return Response(body, mimetype="application/json", status=status)
+
+
+def get_fields(fields):
+    """
+    Returns the item fields selected by the fields arg, or None for all fields.
+    """
+    arg = request.args.get("fields")
+    if not arg:
+        return None
+    selected = [name.strip() for name in arg.split(",") if name.strip()]
+    unknown = [name for name in selected if name not in fields]
+    if unknown:
+        raise APIError("Unknown fields: {}. Valid fields: {}".format(", ".join(unknown), ", ".join(fields)))
+    return selected
+
+
+def get_limit():
+    """
+    Returns the page size from the limit arg.
+    """
+    limit = request.args.get("limit", DEFAULT_LIMIT)
+    try:
+        limit = int(limit)
+    except ValueError:
+        raise APIError("limit should be an integer: {}".format(limit))
+    if not 1 <= limit <= MAX_LIMIT:
+        raise APIError("limit should be between 1 and {}: {}".format(MAX_LIMIT, limit))
+    return limit
+
+
+def get_int_arg(name):
+    """
+    Returns the given integer arg, or None if it is absent.
+    """
+    value = request.args.get(name)
+    if value is None:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise APIError("{} should be an integer: {}".format(name, value))
+
+
+def get_page(items, limit, cursor_arg, cursor_field):
+    """
+    Returns a page of items and the URL of the next page. The query fetched
+    one item more than the limit to find out if there is a next page.
+    """
+    next_url = None
+    if len(items) > limit:
+        items = items[:limit]
+        args = request.args.to_dict()
+        args[cursor_arg] = items[-1][cursor_field]
+        next_url = url_for(request.endpoint, **args)
+    return {"items": items, "next": next_url}
+
+
+def query_calls():
+    limit = get_limit()
+    before = get_int_arg("before")
+    criteria = []
+    params = []
+    if before is not None:
+        criteria.append("a.CallLogID < ?")
+        params.append(before)
+    if request.args.get("number"):
+        criteria.append("a.Number = ?")
+        params.append(request.args["number"])
+    if request.args.get("action"):
+        criteria.append("a.Action = ?")
+        params.append(request.args["action"])
+
+    # Keyset pagination: the CallLogID primary key index finds the page start
+    sql = """SELECT
+        a.CallLogID,
+        COALESCE(b.Name, c.Name, a.Name),
+        a.Number,
+        a.Action,
+        a.Reason,
+        a.SystemDateTime,
+        b.PhoneNo IS NOT NULL,
+        c.PhoneNo IS NOT NULL,
+        d.MessageID
+    FROM CallLog AS a
+    LEFT JOIN Whitelist AS b ON a.Number = b.PhoneNo
+    LEFT JOIN Blacklist AS c ON a.Number = c.PhoneNo
+    LEFT JOIN Message AS d ON a.CallLogID = d.CallLogID
+    {}
+    ORDER BY a.CallLogID DESC
+    LIMIT ?""".format("WHERE " + " AND ".join(criteria) if criteria else "")
+    g.cur.execute(sql, params + [limit + 1])
+    items = [dict(zip(CALL_FIELDS, row[:6] + (bool(row[6]), bool(row[7]), row[8])))
+             for row in g.cur.fetchall()]
+    return get_page(items, limit, "before", "id")
+
+
+def query_messages():
+    limit = get_limit()
+    before = get_int_arg("before")
+    played = get_int_arg("played")
+    criteria = []
+    params = []
+    if before is not None:
+        criteria.append("a.MessageID < ?")
+        params.append(before)
+    if played is not None:
+        criteria.append("a.Played = ?")
+        params.append(1 if played else 0)
+
+    sql = """SELECT
+        a.MessageID,
+        a.CallLogID,
+        b.Name,
+        b.Number,
+        a.Played,
+        a.DateTime,
+        a.Duration,
+        a.FileSize,
+        a.Peak,
+        a.RMS,
+        a.Waveform
+    FROM Message AS a
+    LEFT JOIN CallLog AS b ON a.CallLogID = b.CallLogID
+    {}
+    ORDER BY a.MessageID DESC
+    LIMIT ?""".format("WHERE " + " AND ".join(criteria) if criteria else "")
+    g.cur.execute(sql, params + [limit + 1])
+    items = []
+    for row in g.cur.fetchall():
+        args = {"msg_no": row[0]}
+        if row[7] is not None:
+            args["v"] = row[7]
+        items.append(dict(zip(MESSAGE_FIELDS, (
+            row[0], row[1], row[2], row[3], bool(row[4]), row[5], row[6],
+            row[8], row[9], parse_waveform(row[10]), url_for("message_audio", **args)))))
+    return get_page(items, limit, "before", "id")
+
+
+def query_list(table):
+    limit = get_limit()
+    after = request.args.get("after")
+    sql = "SELECT PhoneNo, Name, Reason, SystemDateTime FROM {} {} ORDER BY PhoneNo LIMIT ?".format(
+        table, "WHERE PhoneNo > ?" if after else "")
+    g.cur.execute(sql, ([after] if after else []) + [limit + 1])
+    items = [dict(zip(LIST_FIELDS, tuple(row))) for row in g.cur.fetchall()]
+    return get_page(items, limit, "after", "number")
+
+
+def query_stats():
+    sql = """SELECT
+        (SELECT COUNT(*) FROM CallLog),
+        (SELECT COUNT(*) FROM CallLog WHERE Action = 'Blocked'),
+        (SELECT COUNT(*) FROM CallLog WHERE Action = 'Permitted'),
+        (SELECT COUNT(*) FROM CallLog WHERE Action = 'Screened'),
+        (SELECT COUNT(*) FROM Message),
+        (SELECT COUNT(*) FROM Blacklist),
+        (SELECT COUNT(*) FROM Whitelist)"""
+    g.cur.execute(sql)
+    row = g.cur.fetchone()
+    stats = dict(zip(("calls", "blocked_calls", "permitted_calls", "screened_calls",
+                      "messages", "blocked_numbers", "permitted_numbers"), tuple(row)))
+    stats["unplayed_messages"] = get_unplayed_count(g.conn)
+    return stats
@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#  compression.py
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+
+
+# Compresses the webapp's text responses, i.e., the pages, the JSON API
+# and the CSV exports, with brotli, if the optional brotli package is
+# installed and the browser accepts it, or with gzip.
+
+import gzip
+
+# The content types that are compressed
+COMPRESSIBLE_TYPES = ("text/html", "application/json", "text/csv")
+
+# Smaller responses are not worth compressing
+MIN_SIZE = 500
+
+# The compression levels: fast enough for a Raspberry Pi
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+_brotli = None
+
+
+def _get_brotli():
+    """
+    Returns the brotli module, or False if it is not installed.
+    """
+    global _brotli
+    if _brotli is None:
+        try:
+            import brotli
+            _brotli = brotli
+        except ImportError:
+            _brotli = False
+    return _brotli
+
+
+def get_encoding(request):
+    """
+    Returns the content encoding used for the request's response: "br",
+    "gzip" or None if the client does not accept either.
+        :param request: the Flask request
+    """
+    accepted = request.accept_encodings
+    if accepted["br"] and _get_brotli():
+        return "br"
+    if accepted["gzip"]:
+        return "gzip"
+    return None
+
+
+def compress_response(request, response):
+    """
+    Compresses a response's body in place if the client accepts it and the
+    response is a compressible type and size.
+        :param request: the Flask request
+        :param response: the Flask response
+        :return: the response
+    """
+    if response.mimetype not in COMPRESSIBLE_TYPES:
+        return response
+    response.vary.add("Accept-Encoding")
+    if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+            or "Content-Encoding" in response.headers):
+        return response
+
+    encoding = get_encoding(request)
+    if encoding is None:
+        return response
+    body = response.get_data()
+    if len(body) < MIN_SIZE:
+        return response
+    if encoding == "br":
+        body = _get_brotli().compress(body, quality=BROTLI_QUALITY)
+    else:
+        body = gzip.compress(body, GZIP_LEVEL)
+    response.set_data(body)
+    response.content_encoding = encoding
+    return response
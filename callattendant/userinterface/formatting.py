@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#  formatting.py
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+
+
+# Formats the phone numbers and timestamps shown in the webapp's pages
+# and exports. The work that is the same for every row, e.g., parsing the
+# PHONE_DISPLAY_FORMAT template, is done once instead of once per row.
+
+import math
+from datetime import datetime
+from functools import lru_cache
+
+
+class PhoneFormatter(object):
+    """
+    Formats phone numbers with a display template, e.g., "###-###-####".
+    The template is compiled into the slices of a number of a given length,
+    filled from right to left so that shorter and longer numbers are handled.
+    """
+
+    def __init__(self, template, separator):
+        """
+        Constructor.
+            :param template: the display template, e.g., "###-###-####"
+            :param separator: the separator between the template's parts, e.g., "-"
+        """
+        self.separator = separator
+        self.enabled = bool(template) and bool(separator)
+        # The part lengths, from right to left
+        self._lengths = [len(part) for part in reversed(template.split(separator))] if self.enabled else []
+        self._plans = {}
+
+    def format(self, number):
+        """
+        Returns the formatted phone number.
+        """
+        if not self.enabled:
+            return number
+        plan = self._plans.get(len(number))
+        if plan is None:
+            plan = self._plans[len(number)] = self._compile(len(number))
+        return self.separator.join([number[start:end] for start, end in plan])
+
+    def _compile(self, number_len):
+        """
+        Returns the (start, end) slices of the parts of a number of the given length.
+        """
+        plan = []
+        end = number_len
+        for length in self._lengths:
+            start = max(0, end - length)
+            plan.insert(0, (start, end))
+            end = start
+            # The number is shorter than the template
+            if start == 0:
+                break
+        # The number is longer than the template: prepend the remaining digits
+        if end > 0:
+            plan.insert(0, (0, end))
+        return plan
+
+
+@lru_cache(maxsize=8)
+def get_phone_formatter(template, separator):
+    """
+    Returns the compiled PhoneFormatter for the given display settings.
+    """
+    return PhoneFormatter(template or "", separator or "")
+
+
+@lru_cache(maxsize=1024)
+def _format_date(date):
+    return datetime.strptime(date, '%Y-%m-%d').strftime('%d-%b-%y')
+
+
+@lru_cache(maxsize=1440)
+def _format_time(time):
+    return datetime.strptime(time, '%H:%M').strftime('%I:%M %p')
+
+
+def format_date_time(date_time):
+    """
+    Returns the date, e.g., "01-Jan-26", and time, e.g., "12:00 PM", of a
+    timestamp string, e.g., "2026-01-01 12:00:00.000". The dates and times
+    of a page's rows repeat, so each one is converted once.
+    """
+    return _format_date(date_time[:10]), _format_time(date_time[11:16])
+
+
+def format_duration(secs):
+    """
+    Returns a message duration, e.g., "1:05", or "" if it is unknown.
+    """
+    if secs is None:
+        return ""
+    secs = int(round(secs))
+    return "{}:{:02d}".format(secs // 60, secs % 60)
+
+
+def format_level(level):
+    """
+    Returns an audio level, a fraction of full scale, in dBFS, e.g., "-12 dB",
+    or "" if it is unknown.
+    """
+    if level is None:
+        return ""
+    if level < 0.001:
+        return "silent"
+    return "{:.0f} dB".format(20 * math.log10(level))
+
+
+def parse_waveform(text):
+    """
+    Returns the waveform levels stored as comma-separated percentages, or an empty list.
+    """
+    if not text:
+        return []
+    return [int(level) for level in text.split(",")]
@@ -0,0 +1,68 @@
+// Live call events: updates the page in place from the /events stream
+$(function() {
+  if (!window.EventSource) {
+    // Without live events, refresh the page periodically
+    setTimeout(function() { location.reload(); }, 300000);
+    return;
+  }
+  var source = new EventSource("/events");
+  var maxRecentCalls = 10;
+
+  function text(value) {
+    return $("<div>").text(value === null || value === undefined ? "" : value).html();
+  }
+
+  // Show the state of the line(s) in the navbar
+  source.addEventListener("line", function(e) {
+    var data = JSON.parse(e.data);
+    var status = "";
+    if (data.state === "screening") {
+      status = "Screening " + data.number + " " + data.caller_name;
+    } else if (data.state === "ringing") {
+      status = "Ringing (" + data.rings + ")";
+    } else if (data.state === "answered") {
+      status = "Answered " + data.number;
+    }
+    if (status && data.line > 1) {
+      status = data.name + ": " + status;
+    }
+    $("#line-status").text(status);
+  });
+
+  // Add a new call to the dashboard's Recent Calls table
+  source.addEventListener("call", function(e) {
+    var data = JSON.parse(e.data);
+    var table = $("#recent-calls tbody");
+    if (table.length === 0) {
+      // The call history page is reloaded to show the call
+      if (window.location.pathname === "/calls") {
+        location.reload();
+      }
+      return;
+    }
+    var badge = data.action === "Permitted" ? "badge-primary" :
+        (data.action === "Blocked" ? "badge-danger" : "badge-info");
+    var date = new Date(data.date_time.replace(" ", "T"));
+    var row = $("<tr>").append(
+      $('<td class="time">').html("<b>" + text(date.toLocaleTimeString([], {hour: "2-digit", minute: "2-digit"})) +
+        '</b> <span class="d-md-none"><br></span> ' + text(date.toLocaleDateString())),
+      $('<td class="phoneno">').html('<a href="/calls/view/' + text(data.call_no) + '"><b>' + text(data.phone_no) +
+        '</b></a> <span class="d-md-none"><br></span> <span class="text-break pl-md-2 pl-lg-3"><i>' +
+        text(data.name) + "</i></span>"),
+      $("<td>").html('<span class="badge ' + badge + '">' + text(data.action) + "</span>"));
+    table.prepend(row);
+    table.children("tr").slice(maxRecentCalls).remove();
+  });
+
+  // Update the unplayed message count
+  source.addEventListener("messages", function(e) {
+    var data = JSON.parse(e.data);
+    $("#total-unplayed").text(data.unplayed);
+  });
+
+  // Update the Permit Next Call button
+  source.addEventListener("permit_next", function(e) {
+    var data = JSON.parse(e.data);
+    $("#permit-next-call-button span").text("Permit Next Call" + (data.on ? " (ON)" : ""));
+  });
+});
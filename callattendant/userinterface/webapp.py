@@ -34,34 +34,64 @@ import os
 import tempfile
 import random
 import string
-import _thread
-from datetime import datetime, timedelta
-from pprint import pformat, pprint
+import threading
+from datetime import date, datetime, timedelta
+from pprint import pformat
 
 import io
 import csv
+import hashlib
+import json
 import re
 import sqlite3
 from flask import Flask, request, g, current_app, render_template, redirect, \
-    Response, jsonify, flash, send_file
+    Response, jsonify, flash, send_file, stream_with_context, url_for
 from flask_paginate import Pagination, get_page_args
-
-from pygments import highlight
-from pygments.lexers import PythonLexer
-from pygments.formatters import HtmlFormatter
+from markupsafe import Markup
 
 import yaml
 from screening.query_db import query_db
 from screening.blacklist import Blacklist
 from screening.whitelist import Whitelist
 from screening.nextcall import NextCall
-from messaging.message import Message
+from screening.calltiming import get_metrics
+from screening.patternprofiler import PATTERN_LISTS, compile_patterns, dry_run
+from screening.dataversion import DASHBOARD_TABLES, get_data_version
+from messaging.message import Message, get_unplayed_count
+from userinterface.api import api
+from userinterface.compression import compress_response
+from userinterface.formatting import format_date_time, format_duration, format_level, \
+    get_phone_formatter, parse_waveform
+from eventbus import event_bus
+from logconfig import get_logger
+
+log = get_logger("webapp")
+
+# A comment line is sent to an idle event stream at this interval (secs)
+# so that proxies and browsers keep the connection open
+EVENTS_KEEPALIVE_SECS = 15
+
+# The rendered dashboard content: "fragments" -> (key, content, chart_js)
+dashboard_cache = {}
+
+# The highlighted settings: "settings" -> (key, curr_settings, file_settings)
+settings_cache = {}
+
+# The compiled templates are saved in this sub-folder of the data folder
+TEMPLATE_CACHE_FOLDER = "template_cache"
+
+# The static files: filename -> content hash, used to fingerprint their URLs
+static_manifest = {}
+
+# The cache lifetime (secs) of a static file with a fingerprinted URL
+STATIC_MAX_AGE = 31536000
 
 # Create the Flask micro web-framework application
 app = Flask('callattendant',
             template_folder='userinterface/templates',
             static_folder='userinterface/static')
 app.config.from_pyfile('userinterface/webapp.cfg')
+app.register_blueprint(api)
 
 
 @app.before_request
@@ -75,6 +105,35 @@ def before_request():
     g.cur = g.conn.cursor()
 
 
+@app.after_request
+def after_request(response):
+    """
+    Compresses the text responses and sets the caching of the static files
+    """
+    if request.endpoint == "static":
+        # A fingerprinted URL always gets the same content
+        version = request.args.get("v")
+        if version and version == static_manifest.get(request.view_args.get("filename")):
+            response.cache_control.public = True
+            response.cache_control.max_age = STATIC_MAX_AGE
+            response.cache_control.immutable = True
+        return response
+    return compress_response(request, response)
+
+
+@app.url_defaults
+def add_static_fingerprint(endpoint, values):
+    """
+    Adds the content hash to the URLs of the static files built with url_for()
+    """
+    if endpoint == "static" and "filename" in values:
+        if not static_manifest:
+            static_manifest.update(build_static_manifest())
+        fingerprint = static_manifest.get(values["filename"])
+        if fingerprint:
+            values.setdefault("v", fingerprint)
+
+
 @app.teardown_request
 def teardown(error):
     """
@@ -89,26 +148,59 @@ def dashboard():
     """
     Display the dashboard, i.e,, the home page
     """
-    # Count totals calls
-    sql = "SELECT COUNT(*) FROM CallLog"
-    g.cur.execute(sql)
-    total_calls = g.cur.fetchone()[0]
+    master_config = current_app.config.get("MASTER_CONFIG")
+    num_days = current_app.config.get("GRAPH_NUM_DAYS", 30)
+
+    # The rendered statistics, calls and charts are reused until the call
+    # history, the messages or the lists change, or until the day changes.
+    version = get_data_version(g.conn, DASHBOARD_TABLES)
+    key = (master_config.get("DB_FILE"), version, date.today(), num_days)
+    cached = dashboard_cache.get("fragments")
+    if version is not None and cached is not None and cached[0] == key:
+        content, chart_js = cached[1:]
+    else:
+        content, chart_js = render_dashboard_fragments(num_days)
+        if version is not None:
+            dashboard_cache["fragments"] = (key, content, chart_js)
+
+    # Get state of permit_next_call flag
+    nextcall = NextCall(master_config)
+    permit_next = nextcall.is_next_call_permitted()
+
+    if not master_config.get("MODEM_ONLINE", True):
+        flash('The modem is not online. Calls will not be screened or blocked. Check the logs and restart the CallAttendant.')
+
+    # Render the resullts
+    return render_template(
+        'dashboard.html',
+        active_nav_item="dashboard",
+        permit_next=permit_next,
+        content=content,
+        chart_js=chart_js)
+
 
-    # Count blocked calls
-    sql = "SELECT COUNT(*) FROM CallLog WHERE `Action` = 'Blocked'"
+def render_dashboard_fragments(num_days):
+    """
+    Queries the dashboard statistics and renders the dashboard content and chart script.
+        :param num_days:
+            The number of days in the calls per day chart
+        :return:
+            the content and chart script as Markup
+    """
+    # Count the total and blocked calls and the unread messages
+    sql = """SELECT
+        COUNT(*),
+        COALESCE(SUM(Action = 'Blocked'), 0)
+    FROM CallLog"""
     g.cur.execute(sql)
-    total_blocked = g.cur.fetchone()[0]
+    total_calls, total_blocked = g.cur.fetchone()
+    new_messages = get_unplayed_count(g.conn)
 
     # Compute percentage blocked
     percent_blocked = 0
     if total_calls > 0:
         percent_blocked = total_blocked / total_calls * 100
 
-    # Get the number of unread messages
-    sql = "SELECT COUNT(*) FROM Message WHERE Played = 0"
-    g.cur.execute(sql)
-    new_messages = g.cur.fetchone()[0]
-
     # Get the Recent Calls subset
     max_num_rows = 10
     sql = """SELECT
@@ -128,7 +220,8 @@ def dashboard():
         d.MessageID,
         d.Played,
         d.Filename,
-        a.SystemDateTime
+        a.SystemDateTime,
+        d.FileSize
     FROM CallLog as a
     LEFT JOIN Whitelist AS b ON a.Number = b.PhoneNo
     LEFT JOIN Blacklist AS c ON a.Number = c.PhoneNo
@@ -137,140 +230,72 @@ def dashboard():
     LIMIT {}""".format(max_num_rows)
     g.cur.execute(sql)
     result_set = g.cur.fetchall()
-    recent_calls = []
-    for row in result_set:
-        # Flask pages use the static folder to get resources.
-        # In the static folder we have created a soft-link to the
-        # data/messsages folder containing the actual messages.
-        # We'll use the static-based path for the wav-file urls
-        # in the web app
-        filepath = row[11]
-        if filepath is not None:
-            basename = os.path.basename(filepath)
-            filepath = os.path.join("../static/messages", basename)
-
-        # Create a date object from the date time string
-        date_time = datetime.strptime(row[12][:19], '%Y-%m-%d %H:%M:%S')
-
-        recent_calls.append(dict(
-            call_no=row[0],
-            name=row[1],
-            phone_no=format_phone_no(row[2]),
-            date=date_time.strftime('%d-%b-%y'),
-            time=date_time.strftime('%I:%M %p'),
-            action=row[5],
-            reason=row[6],
-            whitelisted=row[7],
-            blacklisted=row[8],
-            msg_no=row[9],
-            msg_played=row[10],
-            wav_file=filepath))
+    recent_calls = format_calls(result_set)
 
-    # Get top permitted callers
-    sql = """SELECT COUNT(Number), Number, Name
+    # Get the top permitted and top blocked callers
+    sql = """SELECT * FROM (
+        SELECT 'Permitted', COUNT(Number), Number, Name
         FROM CallLog
         WHERE Action IN ('Permitted', 'Screened')
         GROUP BY Number
-        ORDER BY COUNT(Number) DESC LIMIT 10"""
-    g.cur.execute(sql)
-    result_set = g.cur.fetchall()
-    top_permitted = []
-    for row in result_set:
-        top_permitted.append(dict(
-            count=row[0],
-            phone_no=format_phone_no(row[1]),
-            name=row[2]))
-
-    # Get top blocked callers
-    sql = """SELECT COUNT(Number), Number, Name
+        ORDER BY COUNT(Number) DESC LIMIT 10)
+    UNION ALL
+    SELECT * FROM (
+        SELECT 'Blocked', COUNT(Number), Number, Name
         FROM CallLog
         WHERE Action = 'Blocked'
         GROUP BY Number
-        ORDER BY COUNT(Number) DESC LIMIT 10"""
+        ORDER BY COUNT(Number) DESC LIMIT 10)"""
     g.cur.execute(sql)
     result_set = g.cur.fetchall()
+    top_permitted = []
     top_blocked = []
+    format_number = phone_formatter().format
     for row in result_set:
-        top_blocked.append(dict(
-            count=row[0],
-            phone_no=format_phone_no(row[1]),
-            name=row[2]))
-
-    # Get num calls per day for graphing
-    num_days = current_app.config.get("GRAPH_NUM_DAYS", 30)
-
-    # Query num blocked calls
-    sql = """SELECT COUNT(DATE(SystemDateTime)) Count, DATE(SystemDateTime) CallDate
-        FROM CallLog
-        WHERE SystemDateTime > DATETIME('now','-{} day') AND Action = 'Blocked'
-        GROUP BY CallDate
-        ORDER BY CallDate""".format(num_days)
+        top_callers = top_permitted if row[0] == 'Permitted' else top_blocked
+        top_callers.append(dict(
+            count=row[1],
+            phone_no=format_number(row[2]),
+            name=row[3]))
+
+    # Query the number of blocked, allowed and screened calls per day for graphing
+    sql = """SELECT DATE(SystemDateTime) CallDate,
+        SUM(Action = 'Blocked'),
+        SUM(Action = 'Permitted'),
+        SUM(Action = 'Screened')
+    FROM CallLog
+    WHERE SystemDateTime > DATETIME('now','-{} day')
+    GROUP BY CallDate""".format(num_days)
     g.cur.execute(sql)
-    result_set = g.cur.fetchall()
-    blocked_per_day = {}
-    for row in result_set:
-        # key value = date, count
-        blocked_per_day[row[1]] = row[0]
-
-    # Query number of allowed calls
-    sql = """SELECT COUNT(DATE(SystemDateTime)) Count, DATE(SystemDateTime) CallDate
-        FROM CallLog
-        WHERE SystemDateTime > DATETIME('now','-{} day') AND Action = 'Permitted'
-        GROUP BY CallDate
-        ORDER BY CallDate""".format(num_days)
-    g.cur.execute(sql)
-    result_set = g.cur.fetchall()
-    allowed_per_day = {}
-    for row in result_set:
-        # key value = date, count
-        allowed_per_day[row[1]] = row[0]
-
-    # Query number of screened calls
-    sql = """SELECT COUNT(DATE(SystemDateTime)) Count, DATE(SystemDateTime) CallDate
-        FROM CallLog
-        WHERE SystemDateTime > DATETIME('now','-{} day') AND Action = 'Screened'
-        GROUP BY CallDate
-        ORDER BY CallDate""".format(num_days)
-    g.cur.execute(sql)
-    result_set = g.cur.fetchall()
-    screened_per_day = {}
-    for row in result_set:
-        # key value = date, count
-        screened_per_day[row[1]] = row[0]
+    counts_per_day = {row[0]: row[1:] for row in g.cur.fetchall()}
 
     # Conflate the results
     base_date = datetime.today()
     date_list = [base_date - timedelta(days=x) for x in range(num_days)]
     date_list.reverse()
     calls_per_day = []
-    for date in date_list:
-        date_key = date.strftime("%Y-%m-%d")
+    for day in date_list:
+        date_key = day.strftime("%Y-%m-%d")
+        blocked, allowed, screened = counts_per_day.get(date_key, (0, 0, 0))
         calls_per_day.append(dict(
             date=date_key,
-            blocked=blocked_per_day.get(date_key, 0),
-            allowed=allowed_per_day.get(date_key, 0),
-            screened=screened_per_day.get(date_key, 0)))
+            blocked=blocked,
+            allowed=allowed,
+            screened=screened))
 
-    # Get state of permit_next_call flag
-    nextcall = NextCall(app.config['MASTER_CONFIG'])
-    permit_next = nextcall.is_next_call_permitted()
-
-    if not current_app.config.get("MASTER_CONFIG").get("MODEM_ONLINE", True):
-        flash('The modem is not online. Calls will not be screened or blocked. Check the logs and restart the CallAttendant.')
-
-    # Render the resullts
-    return render_template(
-        'dashboard.html',
-        active_nav_item="dashboard",
+    content = render_template(
+        'dashboard_content.html',
         recent_calls=recent_calls,
         top_permitted=top_permitted,
         top_blocked=top_blocked,
         calls_per_day=calls_per_day,
         new_messages=new_messages,
-        permit_next = permit_next,
         total_calls='{:,}'.format(total_calls),
         blocked_calls='{:,}'.format(total_blocked),
         percent_blocked='{0:.0f}%'.format(percent_blocked))
+    chart_js = render_template('dashboard_js.html', calls_per_day=calls_per_day)
+    return Markup(content), Markup(chart_js)
+
 
 @app.route('/about', methods=['GET'])
 def about():
@@ -278,6 +303,49 @@ def about():
     flash('Call Attendant version: ' + current_app.config.get("MASTER_CONFIG").get("VERSION"))
     return redirect(request.referrer, code=303)  # Other
 
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """
+    Serve the call latency histograms in the Prometheus text format.
+    """
+    return Response(get_metrics(get_db()), mimetype="text/plain; version=0.0.4")
+
+
+@app.route('/events', methods=['GET'])
+def events():
+    """
+    Stream the call, line and message events as Server-Sent Events.
+    A reconnecting browser sends the Last-Event-ID header and receives
+    the events it missed.
+    """
+    # Each stream occupies a server thread; ask the surplus browsers to try again later
+    if event_bus.subscriber_count >= app.config.get("MAX_EVENT_STREAMS", 3):
+        return Response("retry: 30000\n\n", mimetype="text/event-stream",
+                        headers={"Cache-Control": "no-cache"})
+
+    subscription = event_bus.subscribe(request.headers.get("Last-Event-ID", type=int))
+
+    def stream():
+        try:
+            yield "retry: 5000\n\n"
+            while True:
+                event = subscription.get(timeout=EVENTS_KEEPALIVE_SECS)
+                if subscription.closed:
+                    break
+                if event is None:
+                    yield ": keepalive\n\n"
+                    continue
+                data = event.data
+                if event.name == "call":
+                    data = dict(data, phone_no=format_phone_no(data["number"]))
+                yield "id: {}\nevent: {}\ndata: {}\n\n".format(event.id, event.name, json.dumps(data))
+        finally:
+            event_bus.unsubscribe(subscription)
+
+    return Response(stream_with_context(stream()), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
 @app.route('/calls', methods=['GET'])
 def calls():
     """
@@ -324,7 +392,8 @@ def calls():
         d.MessageID,
         d.Played,
         d.Filename,
-        a.SystemDateTime
+        a.SystemDateTime,
+        d.FileSize
     FROM CallLog as a
     LEFT JOIN Whitelist AS b ON a.Number = b.PhoneNo
     LEFT JOIN Blacklist AS c ON a.Number = c.PhoneNo
@@ -336,35 +405,7 @@ def calls():
     result_set = g.cur.fetchall()
 
     # Create a formatted list of records including some derived values
-    calls = []
-    for row in result_set:
-        number = row[2]
-        phone_no = format_phone_no(number)
-        # Flask pages use the static folder to get resources.
-        # In the static folder we have created a soft-link to the
-        # data/messsages folder containing the actual messages.
-        # We'll use the static-based path for the wav-file urls
-        filepath = row[11]
-        if filepath is not None:
-            basename = os.path.basename(filepath)
-            filepath = os.path.join("../static/messages", basename)
-
-        # Create a date object from the date time string
-        date_time = datetime.strptime(row[12][:19], '%Y-%m-%d %H:%M:%S')
-
-        calls.append(dict(
-            call_no=row[0],
-            phone_no=phone_no,
-            name=row[1],
-            date=date_time.strftime('%d-%b-%y'),
-            time=date_time.strftime('%I:%M %p'),
-            action=row[5],
-            reason=row[6],
-            whitelisted=row[7],
-            blacklisted=row[8],
-            msg_no=row[9],
-            msg_played=row[10],
-            wav_file=filepath))
+    calls = format_calls(result_set)
 
     # Create a pagination object for the page
     pagination = get_pagination(
@@ -410,7 +451,8 @@ def calls_view(call_no):
         d.MessageID,
         d.Played,
         d.Filename,
-        a.SystemDateTime
+        a.SystemDateTime,
+        d.FileSize
     FROM CallLog as a
     LEFT JOIN Whitelist AS b ON a.Number = b.PhoneNo
     LEFT JOIN Blacklist AS c ON a.Number = c.PhoneNo
@@ -421,33 +463,7 @@ def calls_view(call_no):
 
     caller = {}
     if len(row) > 0:
-        number = row[2]
-        phone_no = format_phone_no(number)
-        # Flask pages use the static folder to get resources.
-        # In the static folder we have created a soft-link to the
-        # data/messsages folder containing the actual messages.
-        # We'll use the static-based path for the wav-file urls
-        filepath = row[11]
-        if filepath is not None:
-            basename = os.path.basename(filepath)
-            filepath = os.path.join("../../static/messages", basename)
-
-        # Create a date object from the date time string
-        date_time = datetime.strptime(row[12][:19], '%Y-%m-%d %H:%M:%S')
-
-        caller.update(dict(
-            call_no=row[0],
-            phone_no=phone_no,
-            name=row[1],
-            date=date_time.strftime('%d-%b-%y'),
-            time=date_time.strftime('%I:%M %p'),
-            action=row[5],
-            reason=row[6],
-            whitelisted=row[7],
-            blacklisted=row[8],
-            msg_no=row[9],
-            msg_played=row[10],
-            wav_file=filepath))
+        caller.update(format_calls([row])[0])
     else:
         # ~ Flash and return to referer
         pass
@@ -472,12 +488,12 @@ def callers_manage(call_no):
             caller = {}
             caller['NMBR'] = number
             caller['NAME'] = request.form['name']
-            print(" >> Adding " + caller['NAME'] + " to whitelist")
+            log.info(" >> Adding %s to whitelist", caller['NAME'])
             whitelist = Whitelist(get_db(), current_app.config)
             whitelist.add_caller(caller, request.form['reason'])
 
         elif request.form['action'] == 'remove-permit':
-            print(" >> Removing " + number + " from whitelist")
+            log.info(" >> Removing %s from whitelist", number)
             whitelist = Whitelist(get_db(), current_app.config)
             whitelist.remove_number(number)
 
@@ -485,12 +501,12 @@ def callers_manage(call_no):
             caller = {}
             caller['NMBR'] = number
             caller['NAME'] = request.form['name']
-            print(" >> Adding " + caller['NAME'] + " to blacklist")
+            log.info(" >> Adding %s to blacklist", caller['NAME'])
             blacklist = Blacklist(get_db(), current_app.config)
             blacklist.add_caller(caller, request.form['reason'])
 
         elif request.form['action'] == 'remove-block':
-            print(" >> Removing " + number + " from blacklist")
+            log.info(" >> Removing %s from blacklist", number)
             blacklist = Blacklist(get_db(), current_app.config)
             blacklist.remove_number(number)
         # Keep track of the number of posts so we can to unwind the history
@@ -561,10 +577,10 @@ def callers_blocked():
     g.cur.execute(sql)
     result_set = g.cur.fetchall()
     records = []
+    format_number = phone_formatter().format
     for record in result_set:
-        number = record[0]
         records.append(dict(
-            FmtNumber=format_phone_no(number),
+            FmtNumber=format_number(record[0]),
             Name=record[1],
             Reason=record[2],
             System_Date_Time=record[3][:19]))
@@ -599,7 +615,7 @@ def callers_blocked_add():
     number = transform_number(request.form["phone"])
     caller['NMBR'] = number
     caller['NAME'] = request.form["name"]
-    print("Adding " + number + " to blacklist")
+    log.info("Adding %s to blacklist", number)
     blacklist = Blacklist(get_db(), current_app.config)
     success = blacklist.add_caller(caller, request.form["reason"])
     if success:
@@ -615,7 +631,7 @@ def callers_blocked_update(phone_no):
     Update the blacklist entry associated with the phone number.
     """
     number = transform_number(phone_no)
-    print("Updating " + number + " in blacklist")
+    log.info("Updating %s in blacklist", number)
     blacklist = Blacklist(get_db(), current_app.config)
     blacklist.update_number(number, request.form['name'], request.form['reason'])
 
@@ -629,7 +645,7 @@ def callers_blocked_delete(phone_no):
     """
     number = transform_number(phone_no)
 
-    print("Removing " + number + " from blacklist")
+    log.info("Removing %s from blacklist", number)
     blacklist = Blacklist(get_db(), current_app.config)
     blacklist.remove_number(number)
 
@@ -670,10 +686,10 @@ def callers_permitted():
     result_set = g.cur.fetchall()
     # Build a list of formatted dict items
     records = []
+    format_number = phone_formatter().format
     for record in result_set:
-        number = record[0]
         records.append(dict(
-            FmtNumber=format_phone_no(number),
+            FmtNumber=format_number(record[0]),
             Name=record[1],
             Reason=record[2],
             System_Date_Time=record[3][:19]))  # Strip the decimal secs
@@ -707,7 +723,7 @@ def callers_permitted_add():
     number = transform_number(request.form['phone'])
     caller['NMBR'] = number
     caller['NAME'] = request.form['name']
-    print("Adding " + number + " to whitelist")
+    log.info("Adding %s to whitelist", number)
     whitelist = Whitelist(get_db(), current_app.config)
     success = whitelist.add_caller(caller, request.form['reason'])
     if success:
@@ -724,25 +740,17 @@ def callers_export(query, filename):
     proxy = io.StringIO()
     writer = csv.writer(proxy)
     writer.writerow(['PhoneNo', 'Name', 'Reason'])
-    for row in results:
-        # Remove extra whitespace from the reason
-        reason = re.sub(r"\s+", " ", row[2])
-        writer.writerow([format_phone_no(row[0]), row[1], reason])
-
-    # Create the byteIO object from the StringIO Object
-    mem_records = io.BytesIO()
-    mem_records.write(proxy.getvalue().encode())
-    # seek/rewind was necessary. Python 3.5.2, Flask 0.12.2
-    mem_records.seek(0)
-    proxy.close()
+    # Remove extra whitespace from the reason
+    format_number = phone_formatter().format
+    whitespace = re.compile(r"\s+")
+    writer.writerows([format_number(row[0]), row[1], whitespace.sub(" ", row[2])] for row in results)
 
-    return send_file(
-        mem_records,
-        as_attachment=True,
-        download_name=filename,
-        mimetype='text/csv',
-        max_age=0
-    )
+    # Return the contents rather than a file object, so that the export can be compressed
+    response = Response(proxy.getvalue(), mimetype='text/csv')
+    proxy.close()
+    response.headers.set("Content-Disposition", "attachment", filename=filename)
+    response.cache_control.no_cache = True
+    return response
 
 @app.route('/callers/permitted/export', methods=['GET'])
 def callers_permitted_export():
@@ -766,7 +774,7 @@ def import_numbers(table, tempfile):
             lc_upd = 0
             for row in csv_reader:
                 if linecount == 0:
-                    print(f'Column names are {", ".join(row)}')
+                    log.info("Column names are %s", ", ".join(row))
                 record = {
                     'NMBR' : "".join(filter(str.isalnum, row['PhoneNo'])).upper(),
                     'NAME' : row['Name'].strip(),
@@ -781,11 +789,10 @@ def import_numbers(table, tempfile):
                     lc_new += 1
                 linecount += 1
         except Exception as e:
-            print("** Failed to import numbers:")
-            pprint(e)
+            log.error("** Failed to import numbers: %s", e)
             return (0, 0, 0)
 
-        print("Imported {} rows: {} added, {} updated".format(linecount, lc_new, lc_upd))
+        log.info("Imported %s rows: %s added, %s updated", linecount, lc_new, lc_upd)
         return (linecount, lc_new, lc_upd)
 
 def callers_import(table, request):
@@ -803,7 +810,7 @@ def callers_import(table, request):
             with tempfile.NamedTemporaryFile(mode='w+', dir=config.data_path,
                                              prefix='PermitImport_', delete=True) as tf:
                 file.save(os.path.join(config.data_path, tf.name))
-                print("Importing permitted numbers from: {}".format(tf.name))
+                log.info("Importing permitted numbers from: %s", tf.name)
 
                 lc = import_numbers(table, tf)
             if lc[0] > 0:
@@ -831,7 +838,7 @@ def callers_permitted_update(phone_no):
     """
     number = transform_number(phone_no)
 
-    print("Updating " + number + " in whitelist")
+    log.info("Updating %s in whitelist", number)
     whitelist = Whitelist(get_db(), current_app.config)
     whitelist.update_number(number, request.form['name'], request.form['reason'])
 
@@ -845,7 +852,7 @@ def callers_permitted_delete(phone_no):
     """
     number = transform_number(phone_no)
 
-    print("Removing " + number + " from whitelist")
+    log.info("Removing %s from whitelist", number)
     whitelist = Whitelist(get_db(), current_app.config)
     whitelist.remove_number(number)
 
@@ -854,7 +861,9 @@ def callers_permitted_delete(phone_no):
 @app.route('/callers/permitnextcall')
 def Callers_permit_next_call():
     nextcall = NextCall(app.config['MASTER_CONFIG'])
-    if nextcall.toggle_next_call_permitted():
+    permitted = nextcall.toggle_next_call_permitted()
+    event_bus.publish("permit_next", {"on": permitted})
+    if permitted:
         return '1Next call will be permitted.'
     else:
         return '0Next call will be handled normally.'
@@ -871,9 +880,7 @@ def messages():
         page_parameter="page", per_page_parameter="per_page"
     )
     # Get the number of unread messages
-    sql = "SELECT COUNT(*) FROM Message WHERE Played = 0"
-    g.cur.execute(sql)
-    unplayed_count = g.cur.fetchone()[0]
+    unplayed_count = get_unplayed_count(g.conn)
 
     # Get the messages subset, limited to the pagination settings
     sql = """SELECT
@@ -885,7 +892,12 @@ def messages():
         a.Played,
         a.DateTime,
         CASE WHEN c.PhoneNo is null THEN 'N' ELSE 'Y' END Whitelisted,
-        CASE WHEN d.PhoneNo is null THEN 'N' ELSE 'Y' END Blacklisted
+        CASE WHEN d.PhoneNo is null THEN 'N' ELSE 'Y' END Blacklisted,
+        a.FileSize,
+        a.Duration,
+        a.Peak,
+        a.RMS,
+        a.Waveform
     FROM Message AS a
     INNER JOIN CallLog AS b ON a.CallLogID = b.CallLogID
     LEFT JOIN Whitelist AS c ON b.Number = c.PhoneNo
@@ -897,29 +909,24 @@ def messages():
 
     # Create an array of messages that we'll supply to the rendered page
     messages = []
+    format_number = phone_formatter().format
     for row in result_set:
-        # Flask pages use the static folder to get resources.
-        # In the static folder we have created a soft-link to the
-        # data/messsages folder containing the actual messages.
-        # We'll use the static-based path for the wav-file urls
-        # in the web apge
-        basename = os.path.basename(row[4])
-        filepath = os.path.join("../static/messages", basename)
-        number = row[3]
-        # Create a date object from the date time string
-        date_time = datetime.strptime(row[6][:19], '%Y-%m-%d %H:%M:%S')
-
+        date, time = format_date_time(row[6])
         messages.append(dict(
             msg_no=row[0],
             call_no=row[1],
             name=row[2],
-            phone_no=format_phone_no(number),
-            wav_file=filepath,
+            phone_no=format_number(row[3]),
+            wav_file=get_message_audio_url(row[0], row[9]),
             msg_played=row[5],
-            date=date_time.strftime('%d-%b-%y'),
-            time=date_time.strftime('%I:%M %p'),
+            date=date,
+            time=time,
             whitelisted=row[7],
-            blacklisted=row[8]
+            blacklisted=row[8],
+            duration=format_duration(row[10]),
+            peak=format_level(row[11]),
+            rms=format_level(row[12]),
+            waveform=parse_waveform(row[13])
         ))
 
     # Create a pagination object for the page
@@ -944,12 +951,53 @@ def messages():
     )
 
 
+@app.route('/messages/audio/<int:msg_no>', methods=['GET'])
+def message_audio(msg_no):
+    """
+    Serve the audio for a voice message. Range requests (seeking) and
+    conditional requests are supported. A URL with the version arg,
+    the file size after processing, is cached by the browser for good.
+    The "compact" variant serves the compressed copy, if there is one.
+    """
+    sql = "SELECT Filename, CompressedFilename, FileSize FROM Message WHERE MessageID=?"
+    g.cur.execute(sql, (msg_no,))
+    row = g.cur.fetchone()
+    if row is None:
+        return "Message not found", 404
+
+    # Build the path from the config, as does Message.delete(), in case the files have been moved
+    filename = row[0]
+    variant = "wav"
+    if request.args.get("variant") == "compact" and row[1]:
+        filename = row[1]
+        variant = "compact"
+    folder = current_app.config.get("MASTER_CONFIG")["VOICE_MAIL_MESSAGE_FOLDER"]
+    filepath = os.path.join(folder, os.path.basename(filename))
+    try:
+        stat = os.stat(filepath)
+    except OSError:
+        return "Message audio not found", 404
+
+    mimetype = "audio/flac" if filepath.endswith(".flac") else "audio/wav"
+    etag = "{}-{}-{}-{}".format(msg_no, variant, stat.st_size, stat.st_mtime_ns)
+    response = send_file(filepath, mimetype=mimetype, conditional=True, etag=etag)
+    version = request.args.get("v")
+    if version is not None and row[2] is not None and version == str(row[2]):
+        response.cache_control.public = True
+        response.cache_control.max_age = 31536000
+        response.cache_control.immutable = True
+    else:
+        # The message may still be processed, e.g., trimmed; revalidate with the ETag
+        response.cache_control.no_cache = True
+    return response
+
+
 @app.route('/messages/delete/<int:msg_no>', methods=['GET'])
 def messages_delete(msg_no):
     """
     Delete the voice message associated with call number.
     """
-    print("Removing message")
+    log.info("Removing message")
     message = Message(get_db(), current_app.config.get("MASTER_CONFIG"))
     success = message.delete(msg_no)
     # Redisplay the messages page
@@ -970,11 +1018,7 @@ def messages_played():
     played = request.form["status"]
     message = Message(get_db(), current_app.config.get("MASTER_CONFIG"))
     success = message.update_played(msg_no, played)
-
-    # Get the number of unread messages
-    sql = "SELECT COUNT(*) FROM Message WHERE Played = 0"
-    g.cur.execute(sql)
-    unplayed_count = g.cur.fetchone()[0]
+    unplayed_count = message.get_unplayed_count()
 
     # Return the results as JSON
     return jsonify(success=success, msg_no=msg_no, unplayed_count=unplayed_count)
@@ -990,23 +1034,43 @@ def settings():
     # Get the application-wide config object
     config = current_app.config.get("MASTER_CONFIG")
 
-    # Filter out the EMAIL and MQTT passwords
-    saved_email_password = config['EMAIL_SERVER_PASSWORD']
-    config['EMAIL_SERVER_PASSWORD'] = "********"
-    saved_mqtt_password = config['MQTT_PASSWORD']
-    config['MQTT_PASSWORD'] = "********"
-    # Read the current config into a str for display
-    config_contents = pformat(config)
-    # Restore the passwords
-    config['EMAIL_SERVER_PASSWORD'] = saved_email_password
-    config['MQTT_PASSWORD'] = saved_mqtt_password
-
-    # Read the config file contents into a buffer for display
-    file_contents = ""
     file_path = ""
+    file_mtime = None
     file_name = config.get("CONFIG_FILE")
     if file_name:
         file_path = os.path.join(config.data_path, file_name)
+        file_mtime = os.stat(file_path).st_mtime_ns
+
+    # The highlighted settings are reused until the config or the config file changes
+    key = (id(config), config.version, file_path, file_mtime)
+    cached = settings_cache.get("settings")
+    if cached is not None and cached[0] == key:
+        curr_settings, file_settings = cached[1:]
+    else:
+        curr_settings, file_settings = render_settings(config, file_path)
+        settings_cache["settings"] = (key, curr_settings, file_settings)
+
+    return render_template(
+        "settings.html",
+        active_nav_item='settings',
+        config_file=file_path,
+        curr_settings=curr_settings,
+        file_settings=file_settings)
+
+
+def render_settings(config, file_path):
+    """
+    Returns the current settings and the config file contents as highlighted
+    HTML, with the EMAIL and MQTT passwords hidden.
+        :param config: the application-wide config object
+        :param file_path: the config file, if any
+    """
+    # Read the current config into a str for display, filtering out the passwords
+    config_contents = pformat(dict(config, EMAIL_SERVER_PASSWORD="********", MQTT_PASSWORD="********"))
+
+    # Read the config file contents into a buffer for display
+    file_contents = ""
+    if file_path:
         with open(file_path, mode="r") as f:
             file_contents += f.read()
 
@@ -1016,16 +1080,13 @@ def settings():
     file_contents = re.sub(r"(^MQTT_PASSWORD\s*=\s*[\"'])(.*)([\"'])", r"\1********\3",
                            file_contents, flags=re.M)
 
-    # Convert the strings to pretty HTML
+    # Convert the strings to pretty HTML; pygments is only needed by this page
+    from pygments import highlight
+    from pygments.lexers import PythonLexer
+    from pygments.formatters import HtmlFormatter
     curr_settings = highlight(config_contents, PythonLexer(), HtmlFormatter())
     file_settings = highlight(file_contents, PythonLexer(), HtmlFormatter())
-
-    return render_template(
-        "settings.html",
-        active_nav_item='settings',
-        config_file=file_path,
-        curr_settings=curr_settings,
-        file_settings=file_settings)
+    return curr_settings, file_settings
 
 # Utility functions to convert dicts to strings and vice versa
 # for use in html editor forms
@@ -1074,10 +1135,13 @@ def callers_regexlists_save():
     # Get the data from the request and convert each list to a dict
     # Reload im-memory values (config object)
     try:
-        config.get("CALLERID_PATTERNS")['blocknames'] = stringlist2dict(request.form['blocknameslist'])
-        config.get("CALLERID_PATTERNS")['blocknumbers'] = stringlist2dict(request.form['blocknumberslist'])
-        config.get("CALLERID_PATTERNS")['permitnames'] = stringlist2dict(request.form['permitnameslist'])
-        config.get("CALLERID_PATTERNS")['permitnumbers'] = stringlist2dict(request.form['permitnumberslist'])
+        patterns = get_posted_patterns()
+        errors = compile_patterns(patterns)
+        if errors:
+            return "error:\nInvalid regular expression:\n" + "\n".join(
+                "{}: {}".format(error["pattern"], error["error"]) for error in errors)
+        config.get("CALLERID_PATTERNS").update(patterns)
+        config.mark_changed()
 
         # Write the new patterns to a file
         with open(config.get("CALLERID_PATTERNS_FILE"), 'w') as file:
@@ -1090,42 +1154,94 @@ def callers_regexlists_save():
     return 'success'
 
 
+@app.route('/callers/regexlists/dryrun', methods=['POST'])
+def callers_regexlists_dryrun():
+    """
+    Run the edited patterns against the call history without saving them.
+    Returns the per pattern match counts and times, and the calls whose
+    verdict would change, as JSON.
+    """
+    config = current_app.config.get("MASTER_CONFIG")
+    try:
+        patterns = get_posted_patterns()
+    except ValueError as e:
+        return jsonify(errors=[{"list": None, "pattern": str(e), "error": "Improperly formatted 'key: value' entry"}])
+
+    sql = """SELECT
+        a.CallLogID,
+        a.Name,
+        a.Number,
+        b.PhoneNo IS NOT NULL OR c.PhoneNo IS NOT NULL
+    FROM CallLog AS a
+    LEFT JOIN Whitelist AS b ON a.Number = b.PhoneNo
+    LEFT JOIN Blacklist AS c ON a.Number = c.PhoneNo
+    ORDER BY a.CallLogID DESC"""
+    g.cur.execute(sql)
+    calls = [(row[0], row[1], row[2], bool(row[3])) for row in g.cur.fetchall()]
+
+    report = dry_run(patterns, calls, config.get("CALLERID_PATTERNS"))
+    if report["timed_out"]:
+        log.warning("* Pattern dry-run timed out on %s", report["timed_out"]["pattern"])
+    return jsonify(report)
+
+
+def get_posted_patterns():
+    """
+    Returns the pattern lists in the posted regex lists form.
+    Raises a ValueError if an entry is not a 'key: value' pair.
+    """
+    return {name: stringlist2dict(request.form[name + 'list']) for name in PATTERN_LISTS}
+
+
+def get_message_audio_url(msg_no, file_size):
+    '''
+    Returns the URL of a message's audio, versioned by the processed file size, or None if there is no message.
+    '''
+    if msg_no is None:
+        return None
+    if file_size is None:
+        return url_for("message_audio", msg_no=msg_no)
+    return url_for("message_audio", msg_no=msg_no, v=file_size)
+
+
+def format_calls(result_set):
+    '''
+    Returns the formatted call log rows shown in the pages, in a single pass over the result set.
+    The rows are those of the call log queries joined with the lists and messages.
+    '''
+    format_number = phone_formatter().format
+    calls = []
+    for row in result_set:
+        date, time = format_date_time(row[12])
+        calls.append(dict(
+            call_no=row[0],
+            name=row[1],
+            phone_no=format_number(row[2]),
+            date=date,
+            time=time,
+            action=row[5],
+            reason=row[6],
+            whitelisted=row[7],
+            blacklisted=row[8],
+            msg_no=row[9],
+            msg_played=row[10],
+            wav_file=get_message_audio_url(row[9], row[13])))
+    return calls
+
+
+def phone_formatter():
+    '''
+    Returns the PhoneFormatter for the PHONE_DISPLAY_FORMAT configuration setting.
+    '''
+    config = current_app.config.get("MASTER_CONFIG")
+    return get_phone_formatter(config.get("PHONE_DISPLAY_FORMAT"), config.get("PHONE_DISPLAY_SEPARATOR"))
+
+
 def format_phone_no(number):
     '''
     Returns a formatted the phone number based on the PHONE_DISPLAY_FORMAT configuration setting.
     '''
-    config = current_app.config.get("MASTER_CONFIG")
-    template = config.get("PHONE_DISPLAY_FORMAT")
-    separator = config.get("PHONE_DISPLAY_SEPARATOR")
-    if separator == "" or template == "":
-        return number
-
-    # Get the template and split into reverse ordered parts for processing
-    tmpl_parts = template.split(separator)
-    tmpl_parts.reverse()
-
-    # Piece together the phone no from right to left to handle variable len numbers
-    number_len = len(number)
-    end = number_len
-    total_digits = 0
-    phone_parts = []
-    for tmpl in tmpl_parts:
-        # Assemble parts from right to left
-        start = max(0, end - len(tmpl))
-        digits = number[start: end]
-        phone_parts.insert(0, digits)
-        # Prepare for next part
-        end = start
-        total_digits += len(digits)
-        # if number is shorter than template then exit loop
-        if start == 0:
-            break
-    # If number is longer then template, then capture remaining digits
-    if total_digits < number_len:
-        # Prepend remaining digits to parts
-        phone_parts.insert(0, number[0: number_len - total_digits])
-    # Return the formatted number
-    return separator.join(phone_parts)
+    return phone_formatter().format(number)
 
 
 def transform_number(phone_no):
@@ -1208,9 +1324,9 @@ def get_pagination(**kwargs):
     )
 
 
-def run_flask(config):
+def configure(config):
     '''
-    Runs the Flask webapp.
+    Configures the Flask webapp with the application-wide config.
         :param config: the application-wide master config object
     '''
     app.secret_key = get_random_string()
@@ -1220,20 +1336,160 @@ def run_flask(config):
         # Override Flask settings with CallAttendant config settings
         app.config["DEBUG"] = config["DEBUG"]
         app.config["TESTING"] = config["TESTING"]
+        # Leave workers for the pages: each event stream occupies a worker thread
+        app.config["MAX_EVENT_STREAMS"] = max(1, config.get("WEBAPP_WORKERS", 6) // 2)
 
     # Turn off the HTML GET/POST logging
     if not app.config["DEBUG"]:
-        log = logging.getLogger('werkzeug')
-        log.disabled = True
+        logging.getLogger('werkzeug').disabled = True
+
+    # Fingerprint the static files for the templates' URLs
+    static_manifest.clear()
+    static_manifest.update(build_static_manifest())
+
+    # Save the compiled templates so that they are not compiled again after a restart
+    from jinja2 import FileSystemBytecodeCache
+    cache_path = os.path.join(config.data_path, TEMPLATE_CACHE_FOLDER)
+    try:
+        os.makedirs(cache_path, exist_ok=True)
+        app.jinja_env.bytecode_cache = FileSystemBytecodeCache(cache_path)
+    except OSError as e:
+        log.warning("* Cannot create the template cache folder %s: %s", cache_path, e)
+
+
+def build_static_manifest():
+    '''
+    Returns the content hash of each static file, keyed on the filename used with url_for().
+    '''
+    manifest = {}
+    for folder, dirs, files in os.walk(app.static_folder, followlinks=False):
+        for name in files:
+            filepath = os.path.join(folder, name)
+            digest = hashlib.sha256()
+            with open(filepath, "rb") as f:
+                for block in iter(lambda: f.read(65536), b""):
+                    digest.update(block)
+            filename = os.path.relpath(filepath, app.static_folder).replace(os.sep, "/")
+            manifest[filename] = digest.hexdigest()[:12]
+    return manifest
+
+
+def precompile_templates():
+    '''
+    Loads all the templates into the Jinja environment, so that the first
+    request for a page does not wait for its templates to be compiled.
+        :return: the number of templates loaded
+    '''
+    count = 0
+    for name in app.jinja_env.list_templates(extensions=["html"]):
+        try:
+            app.jinja_env.get_template(name)
+            count += 1
+        except Exception as e:
+            log.error("** Error compiling template %s: %s", name, e)
+    return count
+
+
+class WebServer(object):
+    """
+    Serves the webapp from a separate thread, either with the waitress
+    production WSGI server or with the Werkzeug development server.
+    """
+
+    def __init__(self, config):
+        """
+        Constructor. Creates the server and binds the listening socket.
+            :param config: the application-wide master config object
+        """
+        self.config = config
+        self.server_type = config.get("WEBAPP_SERVER", "waitress")
+        self._map = {}
+
+        if self.server_type == "waitress":
+            try:
+                from waitress.server import create_server
+            except ImportError:
+                log.warning("* waitress is not installed; using the development server")
+                self.server_type = "werkzeug"
+
+        if self.server_type == "waitress":
+            self._server = create_server(
+                app,
+                map=self._map,
+                host=config['HOST'],
+                port=config['PORT'],
+                threads=config.get("WEBAPP_WORKERS", 6),
+                channel_timeout=config.get("WEBAPP_TIMEOUT", 60),
+                ident="callattendant")
+        else:
+            from werkzeug.serving import make_server
+            self._server = make_server(config['HOST'], config['PORT'], app, threaded=True)
 
-    print("Running the Flask server")
-    # debug mode prevents app from running in separate thread
-    app.run(host=config['HOST'], port=config['PORT'], debug=False)
+        self._thread = threading.Thread(target=self._run)
+        self._thread.name = "webapp"
+        self._thread.daemon = True
+
+    @property
+    def port(self):
+        """
+        The port the server is listening on, e.g., when PORT is 0.
+        """
+        if self.server_type == "waitress":
+            return self._server.effective_port
+        return self._server.server_port
+
+    def start(self):
+        """
+        Starts serving requests.
+        """
+        log.info("Running the %s server", self.server_type)
+        self._thread.start()
+
+    def stop(self, timeout=5.0):
+        """
+        Stops the server gracefully: stops accepting connections, ends the
+        event streams, and waits for the requests in progress to finish.
+            :param timeout: the number of seconds to wait for the requests
+        """
+        event_bus.close_subscriptions()
+        if self.server_type == "waitress":
+            from waitress.server import BaseWSGIServer
+            from waitress.trigger import trigger
+            from waitress.wasyncore import close_all
+
+            servers = [obj for obj in self._map.values() if isinstance(obj, BaseWSGIServer)]
+            triggers = [obj for obj in self._map.values() if isinstance(obj, trigger)]
+            for server in servers:
+                server.accepting = False
+            # Let the workers finish their requests, then close the connections in the server's loop
+            servers[0].task_dispatcher.shutdown(cancel_pending=True, timeout=timeout)
+            triggers[0].pull_trigger(lambda: close_all(self._map))
+        else:
+            self._server.shutdown()
+            self._server.server_close()
+        self._thread.join(timeout)
+        log.info("The %s server has stopped", self.server_type)
+
+    def _run(self):
+        """
+        Thread function that serves the requests until stopped.
+        """
+        # The listening socket is open: early requests wait for the templates
+        count = precompile_templates()
+        log.debug("%d templates compiled", count)
+        if self.server_type == "waitress":
+            self._server.run()
+        else:
+            self._server.serve_forever()
 
 
 def start(config):
     '''
     Starts the Flask webapp in a separate thread.
         :param config: the application-wide master config object
+        :return: the WebServer
     '''
-    _thread.start_new_thread(run_flask, (config,))
+    configure(config)
+    server = WebServer(config)
+    server.start()
+    return server
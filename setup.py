@@ -40,6 +40,7 @@ setuptools.setup(
         "click>=8.1.7",
         "pygments>=2.17.2",
         "pyserial>=3.5",
+        "waitress>=3.0.0",
     ],
     entry_points={
         "console_scripts": [
@@ -18,6 +18,12 @@ CREATE TABLE IF NOT EXISTS `Message` (
     `Played`    BOOLEAN NOT NULL DEFAULT 0 CHECK(Played IN ( 0 , 1 )),
     `Filename`  TEXT,
     `DateTime`  TEXT,
+    `Duration`  REAL,
+    `FileSize`  INTEGER,
+    `CompressedFilename`    TEXT,
+    `Peak`  REAL,
+    `RMS`   REAL,
+    `Waveform`  TEXT,
     FOREIGN KEY(`CallLogID`) REFERENCES `CallLog`(`CallLogID`)
 );
 DROP TABLE IF EXISTS `CallLog`;
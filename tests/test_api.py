@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#  test_api.py
+#
+#  Copyright 2020 Bruce Schubert  <bruce@emxsys.com>
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+
+import gzip
+import json
+import os
+import tempfile
+
+import pytest
+
+from callattendant.screening.dataversion import DASHBOARD_TABLES, install_version_triggers
+from callattendant.userinterface.webapp import app, get_random_string, get_db
+
+
+with open(os.path.join(os.path.dirname(__file__), "callattendant.db.sql"), "rb") as f:
+    _data_sql = f.read().decode("utf8")
+
+
+@pytest.fixture
+def client():
+    db_fd, db_path = tempfile.mkstemp()
+
+    app.secret_key = get_random_string()
+    with app.app_context():
+        app.config['MASTER_CONFIG'] = {
+            "DB_FILE": db_path,
+            "PHONE_DISPLAY_FORMAT": "###-###-####",
+            "PHONE_DISPLAY_SEPARATOR": "-",
+        }
+        app.config["TESTING"] = True
+        db = get_db()
+        db.executescript(_data_sql)
+        install_version_triggers(db, DASHBOARD_TABLES)
+        for n in range(5):
+            db.execute("""INSERT INTO CallLog(Name, Number, Action, Reason, Date, Time, SystemDateTime)
+                VALUES(?, ?, 'Blocked', 'Test', '01-Jan', '12:00 PM', ?)""",
+                       ("CALLER {}".format(n), "80055500{:02d}".format(n), "2026-01-01 12:00:{:02d}".format(n)))
+        db.execute("""INSERT INTO Message(CallLogID, Played, Filename, DateTime, FileSize)
+            VALUES(1, 0, 'message.wav', '2026-01-01 12:00:00', 1234)""")
+        db.commit()
+
+    yield app.test_client()
+
+    os.close(db_fd)
+    os.unlink(db_path)
+
+
+def test_calls_keyset_pagination(client):
+    response = client.get("/api/v1/calls?limit=3")
+    assert response.status_code == 200
+    page = response.get_json()
+    assert len(page["items"]) == 3
+    ids = [item["id"] for item in page["items"]]
+    assert ids == sorted(ids, reverse=True)
+
+    # The next page starts after the last id of this page
+    assert "before={}".format(ids[-1]) in page["next"]
+    page2 = client.get(page["next"]).get_json()
+    assert all(item["id"] < ids[-1] for item in page2["items"])
+    total = client.get("/api/v1/stats").get_json()["calls"]
+    assert len(ids) + len(page2["items"]) == min(total, 6)
+
+
+def test_messages(client):
+    items = client.get("/api/v1/messages?played=0").get_json()["items"]
+    assert len(items) == 1
+    assert items[0]["played"] is False
+    assert items[0]["audio_url"] == "/messages/audio/{}?v=1234".format(items[0]["id"])
+    assert client.get("/api/v1/messages?played=1").get_json()["items"] == []
+
+
+def test_field_selection(client):
+    items = client.get("/api/v1/calls?fields=number,action").get_json()["items"]
+    assert set(items[0]) == {"number", "action"}
+
+    response = client.get("/api/v1/calls?fields=number,bogus")
+    assert response.status_code == 400
+    assert "bogus" in response.get_json()["error"]
+    assert client.get("/api/v1/blocked?limit=0").status_code == 400
+
+
+def test_conditional_get(client):
+    response = client.get("/api/v1/calls")
+    etag = response.headers["ETag"]
+
+    # Unchanged data is not sent again
+    response = client.get("/api/v1/calls", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+
+    # A change to the call log changes the ETag
+    with app.app_context():
+        db = get_db()
+        db.execute("UPDATE CallLog SET Action='Permitted' WHERE CallLogID=1")
+        db.commit()
+    response = client.get("/api/v1/calls", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+
+
+def test_gzip(client):
+    response = client.get("/api/v1/calls", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert "Accept-Encoding" in response.headers["Vary"]
+    data = json.loads(gzip.decompress(response.data))
+    assert data["items"]
@@ -85,13 +85,13 @@ def app(mocker):
     mocker.patch("hardware.indicators.RingIndicator.blink")
     mocker.patch("hardware.indicators.RingIndicator.close")
 
-    def mock_is_whitelisted(caller):
+    def mock_is_whitelisted(caller, timer=None):
         if caller["NAME"] in ["CALLER1", "CALLER3"]:
             return (True, "whitelisted")
         else:
             return (False, None)
 
-    def mock_is_blacklisted(caller):
+    def mock_is_blacklisted(caller, timer=None):
         if caller["NAME"] in ["CALLER2", "CALLER3"]:
             return True, "blacklisted"
         else:
@@ -316,3 +316,58 @@ def test_answer_call_voice_mail(app):
     assert not play_audio_called
     assert not record_message_called
     assert voice_messaging_menu_called
+
+
+def test_lines_are_independent(mocker):
+    """
+    Tests that a call in progress on one line does not delay another line
+    """
+    config = Config()
+    config['TESTING'] = True
+    config["PERMITTED_ACTIONS"] = ("ignore",)
+    config["MODEM_LINES"] = ({"LINE_NAME": "Home"},
+                             {"LINE_NAME": "Office", "SCREENED_RINGS_BEFORE_ANSWER": 0})
+
+    mocker.patch("hardware.modem.Modem._open_serial_port", return_value=True)
+    mocker.patch("hardware.modem.Modem.start", return_value=True)
+
+    app = CallAttendant(config)
+    assert len(app.lines) == 2
+    assert app.lines[0].modem is app.modem
+    assert app.lines[1].name == "Office"
+    assert app.lines[1].voice_mail.modem is app.lines[1].modem
+
+    hang_up = threading.Event()
+    ignored = threading.Event()
+
+    def mock_pick_up():
+        # Simulate a long call on the first line
+        hang_up.wait(10)
+        return False
+
+    def mock_ignore_call(caller):
+        ignored.set()
+
+    mocker.patch.object(app.lines[0].modem, "pick_up", mock_pick_up)
+    mocker.patch.object(app.screener, "is_whitelisted", lambda caller, timer=None: (caller["NAME"] == "CALLER1", None))
+    mocker.patch.object(app.screener, "is_blacklisted", lambda caller, timer=None: (False, None))
+    mocker.patch.object(app, "ignore_call", mock_ignore_call)
+
+    thread = threading.Thread(target=app.run)
+    thread.start()
+    try:
+        app.handle_caller(caller4)                      # Screened and answered on line 1
+        app.handle_caller(caller1, line=app.lines[1])   # Permitted and ignored on line 2
+
+        assert ignored.wait(5)
+        assert not hang_up.is_set()
+        assert app.get_line_stats()[1]["permitted"] == 1
+    finally:
+        hang_up.set()
+        app.shutdown()
+        thread.join()
+
+    stats = app.get_line_stats()
+    assert stats[0]["screened"] == 1
+    assert stats[0]["answered"] == 1
+    assert stats[1]["ignored"] == 1
@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#  test_audioprocessor.py
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+
+import os
+import wave
+
+import pytest
+
+from callattendant.config import Config
+from callattendant.messaging.audioprocessor import AudioProcessor, get_audio_info, get_audio_levels, trim_silence
+
+
+def write_wav(filepath, frames):
+    with wave.open(filepath, 'wb') as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(1)
+        wf.setframerate(8000)
+        wf.writeframes(frames)
+
+
+@pytest.fixture
+def message_file(tmp_path):
+    # 2 secs of silence, 1 sec of "voice", 5 secs of silence
+    frames = bytes([128]) * 16000 + bytes([64, 192]) * 4000 + bytes([127]) * 40000
+    filepath = str(tmp_path / "1_1234567890_Test_010120_1200.wav")
+    write_wav(filepath, frames)
+    return filepath
+
+
+def test_get_audio_info(message_file):
+    duration, size = get_audio_info(message_file)
+    assert duration == 8.0
+    assert size == os.path.getsize(message_file)
+
+
+def test_get_audio_levels(message_file):
+    peak, rms, waveform = get_audio_levels(message_file, points=16)
+    assert peak == 0.5
+    assert 0.17 < rms < 0.18
+    # 2 secs of silence, 1 sec of voice, 5 secs of silence
+    assert waveform == [0] * 4 + [50] * 2 + [1] * 10
+
+
+def test_trim_silence(message_file):
+    assert trim_silence(message_file, padding=0.25)
+    duration, size = get_audio_info(message_file)
+    # The voice data plus 0.25 secs before and after
+    assert duration == 1.5
+
+    # Already trimmed
+    assert not trim_silence(message_file, padding=0.25)
+
+
+def test_trim_silent_message(tmp_path):
+    filepath = str(tmp_path / "silent.wav")
+    write_wav(filepath, bytes([128]) * 8000)
+    assert not trim_silence(filepath)
+    assert get_audio_info(filepath)[0] == 1.0
+
+
+def test_processor_callback(message_file):
+    config = Config()
+    config["VOICE_MAIL_COMPRESSION"] = ""
+
+    results = {}
+
+    def callback(msg_no, info):
+        results[msg_no] = info
+
+    processor = AudioProcessor(config)
+    future = processor.submit(7, message_file, callback)
+    processor.shutdown()
+
+    info = future.result()
+    assert results[7] == info
+    assert info["duration"] < 8.0
+    assert info["size"] == os.path.getsize(message_file)
+    assert info["compressed_filename"] is None
+    assert info["peak"] == 0.5
+    assert len(info["waveform"]) == 48
+
+
+def test_processor_backfill(message_file):
+    config = Config()
+    results = {}
+
+    def callback(msg_no, info):
+        results[msg_no] = info
+
+    processor = AudioProcessor(config)
+    size = os.path.getsize(message_file)
+    future = processor.backfill([(3, message_file), (4, "/nonexistent.wav")], callback)
+    assert future.result(timeout=10) == 1
+    processor.shutdown()
+
+    # The file is analyzed but not modified; a missing file is reported with None
+    assert results[3]["duration"] == 8.0
+    assert results[3]["peak"] == 0.5
+    assert results[4] is None
+    assert os.path.getsize(message_file) == size
+
+
+def test_backfill_yields_to_new_messages(message_file, tmp_path):
+    config = Config()
+    config["VOICE_MAIL_TRIM_SILENCE"] = False
+    order = []
+    processor = AudioProcessor(config)
+
+    # A new message is processed after at most one of the saved messages
+    future = processor.backfill([(n, message_file) for n in range(1, 6)], lambda msg_no, info: order.append(msg_no))
+    processor.submit(99, message_file, lambda msg_no, info: order.append(msg_no)).result(timeout=10)
+    assert future.result(timeout=10) == 5
+    processor.shutdown()
+    assert order.index(99) <= 1
+    assert sorted(order) == [1, 2, 3, 4, 5, 99]
@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#  test_benchmark.py
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+
+
+import sys
+
+import pytest
+
+from callattendant.benchmark import percentile, run_benchmark, summarize, synthetic_transcript
+from callattendant.screening.calltiming import CallTimer
+
+# The simulated modem requires a pseudo-terminal
+pytestmark = pytest.mark.skipif(not sys.platform.startswith("linux"), reason="Requires a Linux pty")
+
+
+def test_percentile():
+    values = list(range(1, 101))
+    assert percentile(values, 50) == 50
+    assert percentile(values, 99) == 99
+    assert percentile([3.0], 90) == 3.0
+
+
+def test_summarize():
+    timer = CallTimer()
+    for stage, t in (("cid", 1.0), ("dequeue", 1.001), ("next_call", 1.002), ("whitelist", 1.004),
+                     ("logged", 1.010)):
+        timer.mark(stage, t)
+    stats = summarize([timer])
+    assert stats["screening"]["p50"] == pytest.approx(0.003)
+    assert stats["total"]["max"] == pytest.approx(0.010)
+    assert "blacklist" not in stats
+
+
+def test_replay_synthetic_calls(tmp_path):
+    transcript = synthetic_transcript(25, seed=1)
+    results = run_benchmark(transcript, speed=200.0, data_path=str(tmp_path), timeout=60.0)
+    assert results["calls"] == results["expected"] == 25
+    assert results["calls_per_sec"] > 0
+    assert results["stages"]["logged"]["count"] == 25
+    assert results["stages"]["cid"]["count"] == 25
+    assert (tmp_path / "callattendant.db").exists()
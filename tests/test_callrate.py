@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#  test_callrate.py
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+
+
+import sqlite3
+import time
+
+from callattendant.config import Config
+from callattendant.screening.calllogger import CallLogger
+from callattendant.screening.callrate import CallRateDetector, SlidingSketch, get_prefix
+
+
+def test_get_prefix():
+    assert get_prefix("8055554567") == "805555"
+    assert get_prefix("1-805-555-4567") == "805555"
+    assert get_prefix("P") is None
+    assert get_prefix("0061730001234") is None
+
+
+def test_sliding_window():
+    sketch = SlidingSketch(60)
+    for n in range(3):
+        sketch.add("8055554567", 1000.0 + n)
+    sketch.add("8005551212", 1030.0)
+    assert sketch.estimate("8055554567", 1030.0) == 3
+    assert sketch.estimate("8005551212", 1030.0) == 1
+    assert sketch.estimate("8885550000", 1030.0) == 0
+
+    # The counts expire with their bucket
+    assert sketch.estimate("8055554567", 1065.0) == 0
+    assert sketch.estimate("8005551212", 1065.0) == 1
+
+
+def test_repeat_caller():
+    config = Config()
+    config["CALL_RATE_MAX_CALLS"] = 3
+    detector = CallRateDetector(config)
+    now = time.time()
+    for n in range(2):
+        detector.record("8005551212", now + n)
+    assert detector.check("8005551212", now + 2) == (False, None)
+
+    detector.record("8005551212", now + 2)
+    is_flood, reason = detector.check("8005551212", now + 3)
+    assert is_flood
+    assert reason == "3 calls in 60 minutes"
+    assert not detector.check("8005551213", now + 3)[0]
+
+    # The rate decays after the window
+    assert not detector.check("8005551212", now + 3700)[0]
+
+
+def test_neighbor_spoofing():
+    config = Config()
+    config["CALL_RATE_MAX_PREFIX_NUMBERS"] = 3
+    config["CALL_RATE_HOME_PREFIX"] = "805-555"
+    detector = CallRateDetector(config)
+    now = time.time()
+    for number in ("8055550001", "8055550002", "8055550002", "3105550001", "3105550002", "3105550003"):
+        detector.record(number, now)
+    assert not detector.check("8055550003", now)[0]
+    assert not detector.check("3105550004", now)[0]
+
+    detector.record("8055550003", now)
+    assert detector.check("8055550004", now)[0]
+    assert not detector.check("3105550004", now)[0]
+
+
+def test_logged_calls():
+    db = sqlite3.connect(":memory:")
+    config = Config()
+    config["CALL_RATE_MAX_CALLS"] = 2
+    caller = {"NAME": "ROBOCALLER", "NMBR": "8005551212", "DATE": "1012", "TIME": "0600"}
+
+    # The logger feeds the detector
+    detector = CallRateDetector(config)
+    logger = CallLogger(db, config, detector)
+    logger.log_caller(caller)
+    logger.log_caller(caller)
+    assert detector.check(caller["NMBR"])[0]
+
+    # A new detector counts the logged calls in the window
+    detector = CallRateDetector(config)
+    detector.load(db)
+    assert detector.check(caller["NMBR"])[0]
+    db.close()
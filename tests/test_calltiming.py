@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#  test_calltiming.py
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+
+
+import sqlite3
+
+import pytest
+
+from callattendant.screening.calltiming import CallTimer, CallTiming, get_histograms, get_metrics
+
+
+@pytest.fixture
+def calltiming():
+    db = sqlite3.connect(":memory:")
+    config = {"DEBUG": True, "TESTING": True}
+    return CallTiming(db, config)
+
+
+def make_timer(screening_secs):
+    timer = CallTimer()
+    timer.mark("ring", 100.0)
+    timer.mark("cid", 104.0)
+    timer.mark("dequeue", 104.001)
+    timer.mark("next_call", 104.002)
+    timer.mark("whitelist", 104.002 + screening_secs)
+    timer.mark("logged", 104.1)
+    return timer
+
+
+def test_timer_durations():
+    timer = make_timer(0.003)
+    durations = timer.durations()
+    assert list(durations) == ["cid", "dequeue", "next_call", "whitelist", "logged"]
+    assert durations["cid"] == pytest.approx(4.0)
+    assert durations["whitelist"] == pytest.approx(0.003)
+    assert timer.offsets()["ring"] == 0.0
+
+
+def test_record_and_histograms(calltiming):
+    calltiming.record(1, make_timer(0.003))
+    calltiming.record(2, make_timer(0.2))
+
+    timers = calltiming.get_timers()
+    assert len(timers) == 2
+    assert timers[0].offsets()["logged"] == pytest.approx(4.1)
+
+    histograms = calltiming.get_histograms()
+    screening = histograms["screening"]
+    assert screening.count == 2
+    assert screening.sum == pytest.approx(0.001 + 0.003 + 0.001 + 0.2)
+    assert histograms["stages"]["answered"].count == 0
+
+
+def test_metrics_format(calltiming):
+    calltiming.record(1, make_timer(0.003))
+    text = calltiming.get_metrics()
+    assert "# TYPE callattendant_screening_seconds histogram" in text
+    assert 'callattendant_call_stage_seconds_bucket{stage="whitelist",le="0.005"} 1' in text
+    assert 'callattendant_call_stage_seconds_bucket{stage="whitelist",le="0.0025"} 0' in text
+    assert 'callattendant_screening_seconds_bucket{le="+Inf"} 1' in text
+    assert "callattendant_screening_seconds_count 1" in text
+
+
+def test_histograms_match_timers(calltiming):
+    calltiming.record(1, make_timer(0.003))
+    calltiming.record(2, make_timer(0.2))
+    timer = CallTimer()
+    timer.mark("dequeue", 10.0)
+    timer.mark("blacklist", 10.02)
+    calltiming.record(3, timer)
+
+    # The database buckets the durations as the timers compute them
+    histograms = get_histograms(calltiming.db)
+    for stage, histogram in histograms["stages"].items():
+        durations = [t.durations()[stage] for t in calltiming.get_timers() if stage in t.durations()]
+        assert histogram.count == len(durations)
+        assert histogram.sum == pytest.approx(sum(durations))
+    assert histograms["stages"]["blacklist"].counts[:5] == [0, 0, 0, 0, 1]
+    assert histograms["screening"].count == 3
+
+
+def test_metrics_without_table():
+    # A scrape does not create the table
+    db = sqlite3.connect(":memory:")
+    assert "callattendant_screening_seconds_count 0" in get_metrics(db)
+    assert db.execute("SELECT COUNT(*) FROM sqlite_master WHERE name='CallTiming'").fetchone()[0] == 0
@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#  test_database.py
+#
+#  Copyright 2020 Bruce Schubert  <bruce@emxsys.com>
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+
+import sqlite3
+import threading
+
+from callattendant import database
+from callattendant.config import Config
+from callattendant.messaging.message import Message
+from callattendant.screening.calllogger import CallLogger
+
+
+def test_shared_lock(tmp_path):
+    db = database.connect(str(tmp_path / "callattendant.db"))
+    config = Config()
+    config["MESSAGE_EVENT"] = threading.Event()
+    config["VOICE_MAIL_MESSAGE_FOLDER"] = str(tmp_path)
+
+    # The users of a shared connection hold the same lock
+    logger = CallLogger(db, config)
+    messages = Message(db, config)
+    assert database.get_lock(db) is db.lock
+    assert logger._db_lock is db.lock
+    assert messages._db_lock is db.lock
+
+    # A connection used by a single thread is not locked
+    with database.get_lock(sqlite3.connect(":memory:")):
+        pass
+
+    # Two lines and an audio worker writing at the same time
+    caller = {"NAME": "Bruce", "NMBR": "1234567890", "DATE": "1012", "TIME": "0600"}
+    errors = []
+
+    def log_calls():
+        try:
+            for n in range(50):
+                call_no = logger.log_caller(caller, "Screened", "Test")
+                msg_no = messages.add(call_no, str(tmp_path / "{}.wav".format(call_no)))
+                assert messages.update_audio_info(msg_no, 1.0, 100, waveform=[])
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=log_calls) for n in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors
+
+    # Everything was committed
+    other_db = sqlite3.connect(str(tmp_path / "callattendant.db"))
+    assert other_db.execute("SELECT COUNT(*) FROM CallLog").fetchone()[0] == 150
+    assert other_db.execute("SELECT COUNT(*) FROM Message WHERE Duration = 1.0").fetchone()[0] == 150
+    assert other_db.execute("SELECT Count FROM MessageCount").fetchone()[0] == 150
+    other_db.close()
+    db.close()
@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#  test_eventbus.py
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+
+
+import threading
+
+from callattendant.eventbus import EventBus, HISTORY_SIZE, SUBSCRIBER_QUEUE_SIZE
+
+
+def test_publish_and_subscribe():
+    bus = EventBus()
+    bus.publish("line", {"state": "idle"})
+    subscription = bus.subscribe()
+    assert bus.subscriber_count == 1
+
+    thread = threading.Thread(target=bus.publish, args=("call", {"number": "8005551212"}))
+    thread.start()
+    event = subscription.get(timeout=5)
+    thread.join()
+    assert event.name == "call"
+    assert event.data == {"number": "8005551212"}
+    assert event.id == 2
+    assert subscription.get(timeout=0.01) is None
+
+    bus.unsubscribe(subscription)
+    assert bus.subscriber_count == 0
+
+
+def test_replay_missed_events():
+    bus = EventBus()
+    for n in range(HISTORY_SIZE + 5):
+        bus.publish("messages", {"unplayed": n})
+    subscription = bus.subscribe(last_event_id=HISTORY_SIZE + 2)
+    assert [subscription.get(0).id for n in range(3)] == [HISTORY_SIZE + 3, HISTORY_SIZE + 4, HISTORY_SIZE + 5]
+    assert subscription.get(0) is None
+
+
+def test_slow_subscriber():
+    bus = EventBus()
+    subscription = bus.subscribe()
+    for n in range(SUBSCRIBER_QUEUE_SIZE + 10):
+        bus.publish("messages", {"unplayed": n})
+    assert subscription.dropped == 10
+    assert subscription.get(0).data == {"unplayed": 10}
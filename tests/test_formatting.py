@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#  test_formatting.py
+#
+#  Copyright 2020 Bruce Schubert  <bruce@emxsys.com>
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+
+import pytest
+
+from callattendant.userinterface.formatting import PhoneFormatter, format_date_time, format_duration, \
+    format_level, get_phone_formatter, parse_waveform
+
+
+@pytest.mark.parametrize("number, expected", [
+    ("8005551212", "800-555-1212"),
+    ("5551212", "555-1212"),
+    ("212", "212"),
+    ("18005551212", "1-800-555-1212"),
+    ("448005551212", "44-800-555-1212"),
+    ("", ""),
+])
+def test_phone_formatter(number, expected):
+    formatter = PhoneFormatter("###-###-####", "-")
+    assert formatter.format(number) == expected
+    # Compiled plans are reused
+    assert formatter.format(number) == expected
+
+
+def test_phone_formatter_settings():
+    assert PhoneFormatter("###.###.####", ".").format("8005551212") == "800.555.1212"
+    assert PhoneFormatter("", "-").format("8005551212") == "8005551212"
+    assert PhoneFormatter("###-####", "").format("8005551212") == "8005551212"
+    assert get_phone_formatter("###-####", "-") is get_phone_formatter("###-####", "-")
+
+
+def test_format_date_time():
+    assert format_date_time("2026-01-05 13:45:59.123") == ("05-Jan-26", "01:45 PM")
+    assert format_date_time("2026-12-31 00:05:00") == ("31-Dec-26", "12:05 AM")
+
+
+def test_format_message_info():
+    assert format_duration(65.4) == "1:05"
+    assert format_duration(None) == ""
+    assert format_level(0.5) == "-6 dB"
+    assert format_level(0.0) == "silent"
+    assert parse_waveform("0,50,100") == [0, 50, 100]
+    assert parse_waveform(None) == []
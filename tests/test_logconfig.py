@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#  test_logconfig.py
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+
+
+import json
+import threading
+
+import pytest
+
+from callattendant.config import Config
+from callattendant.logconfig import get_logger, setup_logging, shutdown_logging
+
+
+@pytest.fixture
+def config(tmp_path):
+    config = Config(data_path=str(tmp_path))
+    config["LOG_FILE"] = "callattendant.log"
+    config.normalize_paths()
+    yield config
+    shutdown_logging()
+
+
+def read_log(config):
+    with open(config["LOG_FILE"]) as file:
+        return file.read().splitlines()
+
+
+def test_json_output(config):
+    config["LOG_FORMAT"] = "json"
+    setup_logging(config)
+
+    thread = threading.Thread(target=get_logger("modem").info, args=("Ring %d", 1), name="modem_thread")
+    thread.start()
+    thread.join()
+    shutdown_logging()
+
+    entries = [json.loads(line) for line in read_log(config)]
+    assert entries == [dict(entries[0], level="INFO", logger="callattendant.modem",
+                            thread="modem_thread", message="Ring 1")]
+
+
+def test_subsystem_levels(config):
+    config["LOG_LEVEL"] = "WARNING"
+    config["LOG_LEVELS"] = {"screening": "DEBUG"}
+    setup_logging(config)
+
+    get_logger("screening").debug("Checking whitelist")
+    get_logger("modem").info("Going off hook")
+    get_logger("modem").error("Modem error")
+    shutdown_logging()
+
+    lines = read_log(config)
+    assert len(lines) == 2
+    assert "callattendant.screening" in lines[0] and "Checking whitelist" in lines[0]
+    assert "ERROR" in lines[1] and "Modem error" in lines[1]
+
+
+def test_invalid_settings(config):
+    config["LOG_FORMAT"] = "xml"
+    config["LOG_LEVELS"] = {"modem": "LOUD"}
+    assert not config.validate()
+
+
+def test_non_str_log_level(config):
+    config["LOG_LEVELS"] = {"screening": 10}
+    assert not config.validate()
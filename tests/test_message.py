@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#  test_message.py
+#
+#  Copyright 2020 Bruce Schubert  <bruce@emxsys.com>
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+
+import sqlite3
+import threading
+
+import pytest
+
+from callattendant.config import Config
+from callattendant.messaging.message import Message, get_unplayed_count
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = sqlite3.connect(str(tmp_path / "callattendant.db"))
+    yield db
+    db.close()
+
+
+@pytest.fixture
+def config(tmp_path):
+    config = Config()
+    config["MESSAGE_EVENT"] = threading.Event()
+    config["VOICE_MAIL_MESSAGE_FOLDER"] = str(tmp_path)
+    return config
+
+
+def test_unplayed_counter(db, config, tmp_path):
+    # Messages saved before the counter existed are counted
+    db.execute("""CREATE TABLE Message (
+        MessageID INTEGER PRIMARY KEY AUTOINCREMENT,
+        CallLogID INTEGER,
+        Played BOOLEAN DEFAULT 0 NOT NULL CHECK (Played IN (0,1)),
+        Filename TEXT,
+        DateTime TEXT)""")
+    db.execute("INSERT INTO Message(CallLogID, Played, Filename) VALUES(1, 0, 'old1.wav'), (2, 1, 'old2.wav')")
+    db.commit()
+    messages = Message(db, config)
+    assert messages.get_unplayed_count() == 1
+
+    msg_no = messages.add(3, str(tmp_path / "new.wav"))
+    assert messages.get_unplayed_count() == 2
+    assert messages.update_played(msg_no, 1)
+    assert messages.get_unplayed_count() == 1
+    # An unchanged status does not change the count
+    assert messages.update_played(msg_no, 1)
+    assert messages.get_unplayed_count() == 1
+    assert messages.update_played(msg_no, 0)
+    assert messages.get_unplayed_count() == 2
+    assert messages.delete(msg_no)
+    assert messages.get_unplayed_count() == 1
+
+
+def test_unplayed_count_other_connection(db, config, tmp_path):
+    from callattendant.messaging.message import event_bus
+
+    messages = Message(db, config)
+    subscription = event_bus.subscribe()
+    try:
+        msg_no = messages.add(1, str(tmp_path / "message.wav"))
+        assert subscription.get(timeout=1).data == {"unplayed": 1}
+
+        # A change made through another connection, e.g., by the webapp, is counted
+        webapp_db = sqlite3.connect(str(tmp_path / "callattendant.db"))
+        Message(webapp_db, config).update_played(msg_no, 1)
+        assert subscription.get(timeout=1).data == {"unplayed": 0}
+        webapp_db.close()
+        assert get_unplayed_count(db) == 0
+    finally:
+        event_bus.unsubscribe(subscription)
+
+
+def test_unanalyzable_message_not_queued_again(db, config, tmp_path):
+    messages = Message(db, config)
+    filepath = tmp_path / "broken.wav"
+    filepath.write_bytes(b"not a wav file")
+    msg_no = messages.add(1, str(filepath))
+    assert [row[0] for row in messages.get_unanalyzed()] == [msg_no]
+
+    # The empty waveform marks the message as analyzed
+    assert messages.update_waveform(msg_no, [])
+    assert messages.get_unanalyzed() == []
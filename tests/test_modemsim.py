@@ -0,0 +1,191 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#  test_modemsim.py
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+
+import os
+import queue
+import sys
+from tempfile import gettempdir
+
+import pytest
+
+from callattendant.config import Config
+from callattendant.hardware.modem import Modem
+from callattendant.hardware.modemsim import ModemSimulator
+
+# The simulator requires a pseudo-terminal
+pytestmark = pytest.mark.skipif(not sys.platform.startswith("linux"), reason="Requires a Linux pty")
+
+
+@pytest.fixture(params=["USR", "CONEXANT"])
+def simulator(request):
+    # Run the clock 20 times faster than real time
+    sim = ModemSimulator(model=request.param, speed=20.0, jitter=0.1, message_secs=1.0)
+    sim.start()
+    yield sim
+    sim.stop()
+
+
+@pytest.fixture
+def modem(simulator):
+    config = Config()
+    config["MODEM_DEVICE"] = simulator.device
+    config["VOICE_MAIL_MESSAGE_FOLDER"] = gettempdir()
+
+    modem = Modem(config)
+    yield modem
+    modem.stop()
+
+
+def test_modem_detected(simulator, modem):
+    assert modem.is_open
+    assert modem.model == simulator.model
+    assert not simulator.echo
+
+
+def test_incoming_call(simulator, modem):
+    callers = queue.Queue()
+    simulator.add_call("8055554567", "Test Caller", rings=2, digits="1")
+    modem.start(callers.put)
+
+    caller = callers.get(timeout=10)
+    assert caller["NMBR"] == "8055554567"
+    assert caller["NAME"] == "Test Caller"
+    assert modem.ring_event.is_set() is False
+
+    # Answer the call and read the caller's key press
+    assert modem.pick_up()
+    try:
+        success, digit = modem.wait_for_keypress(5)
+    finally:
+        assert modem.hang_up()
+    assert success
+    assert digit == "1"
+
+
+def test_play_and_record(simulator, modem):
+    currentdir = os.path.dirname(os.path.realpath(__file__))
+    success, _ = modem.play_audio(os.path.join(currentdir, "../callattendant/resources/goodbye.wav"))
+    assert success
+    assert simulator.audio_bytes_received > 0
+
+    filename = os.path.join(gettempdir(), "modemsim_message.wav")
+    assert modem.record_audio(filename)
+    assert os.path.getsize(filename) > 0
+    os.remove(filename)
+
+
+@pytest.mark.parametrize("concatenation", [True, False])
+def test_voice_settings_not_resent(concatenation):
+    sim = ModemSimulator(speed=20.0, message_secs=0.5, concatenation=concatenation)
+    sim.start()
+    config = Config()
+    config["MODEM_DEVICE"] = sim.device
+    modem = Modem(config)
+    currentdir = os.path.dirname(os.path.realpath(__file__))
+    try:
+        assert modem.pick_up()
+        try:
+            # The voice mode, silence detection and line settings are in effect;
+            # only the compression setting is added before AT+VTX
+            sent = sim.commands_received
+            success, _ = modem.play_audio(os.path.join(currentdir, "../callattendant/resources/goodbye.wav"))
+            assert success
+            assert sim.commands_received - sent == 2
+
+            # Only the beep and AT+VRX are sent before recording
+            sent = sim.commands_received
+            filename = os.path.join(gettempdir(), "modemsim_message.wav")
+            modem.record_audio(filename)
+            assert sim.commands_received - sent == 2
+        finally:
+            assert modem.hang_up()
+
+        # Hanging up resets the settings
+        sent = sim.commands_received
+        assert modem.pick_up()
+        assert modem.hang_up()
+        assert sim.commands_received - sent == (2 if concatenation else 4)
+        assert modem.settings_skipped == 6
+    finally:
+        modem.stop()
+        sim.stop()
+        if os.path.exists(filename):
+            os.remove(filename)
+
+
+def test_cached_modem_device(tmp_path):
+    sim = ModemSimulator(speed=20.0)
+    sim.start()
+    config = Config(data_path=str(tmp_path))
+    config["MODEM_DEVICE"] = "/dev/null/nomodem," + sim.device
+    try:
+        # The first startup probes the ports and saves the profile
+        modem = Modem(config)
+        assert modem.is_open
+        assert "probe" in modem.timings
+        modem.stop()
+        first_startup = sim.commands_received
+        assert os.path.exists(os.path.join(str(tmp_path), "modem_cache.json"))
+
+        # The next startup uses the last known device and skips the
+        # probe, the firmware queries and the profile write
+        modem = Modem(config)
+        assert modem.is_open
+        assert modem.model == "USR"
+        assert "probe" not in modem.timings
+        modem.stop()
+        assert first_startup == 11
+        assert sim.commands_received - first_startup == 6
+
+        # A changed setting is saved to the profile
+        config["OPTIONAL_MODEM_INIT"] = "ATV1"
+        sent = sim.commands_received
+        modem = Modem(config)
+        modem.stop()
+        assert sim.commands_received - sent == 9
+    finally:
+        sim.stop()
+
+
+@pytest.mark.parametrize("errors, picked_up, combined", [(1, True, False), (2, False, True)])
+def test_concatenation_fallback(errors, picked_up, combined):
+    sim = ModemSimulator(speed=20.0)
+    sim.start()
+    config = Config()
+    config["MODEM_DEVICE"] = sim.device
+    modem = Modem(config)
+    try:
+        # The concatenated settings are rejected once: concatenation is
+        # turned off only if the individual settings are then accepted
+        sim.errors = errors
+        assert modem.pick_up() is picked_up
+        if picked_up:
+            assert modem.hang_up()
+        assert modem._combine_commands is combined
+
+        # The settings are applied on the next call either way
+        assert modem.pick_up()
+        assert modem.hang_up()
+    finally:
+        modem.stop()
+        sim.stop()
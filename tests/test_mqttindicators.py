@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#  test_mqttindicators.py
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+
+
+import time
+
+import pytest
+
+pytest.importorskip("paho.mqtt.client")
+
+from callattendant.hardware import mqttindicators
+from callattendant.hardware.mqttindicators import MQTTIndicator, MQTTIndicatorClient
+
+
+@pytest.fixture
+def client():
+    # Nothing listens on this port, so the messages stay queued
+    client = MQTTIndicatorClient("127.0.0.1", port=1, queue_size=3)
+    yield client
+    client.close(timeout=0.1)
+    assert mqttindicators.mqtt_client is None
+
+
+def test_publish_does_not_wait_for_broker(client):
+    start = time.time()
+    for n in range(10):
+        client.publish("RING", "BLINK {}".format(n))
+    assert time.time() - start < 0.5
+    assert client.published == 0
+
+
+def test_state_changes_are_coalesced(client):
+    indicator = MQTTIndicator("Approved")
+    indicator.turn_on()
+    indicator.blink(2)
+    indicator.turn_off()
+    assert client.pending_count == 1
+    assert client.coalesced == 3
+    assert client._pending["Approved"].startswith("OFF")
+
+
+def test_queue_is_bounded(client):
+    for topic in ("RING", "Approved", "Blocked", "Messages"):
+        client.publish(topic, "ON")
+    assert client.pending_count == 3
+    assert client.dropped == 1
+    assert "RING" not in client._pending
@@ -0,0 +1,265 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#  test_notifier.py
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+
+import socketserver
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from callattendant import database
+from callattendant.config import Config
+import callattendant.messaging.notifier as notifier
+from callattendant.messaging.notifier import EmailNotifier
+
+caller1 = {"NAME": "CALLER1", "NMBR": "1111111111", "DATE": "0101", "TIME": "0101"}
+caller2 = {"NAME": "CALLER2", "NMBR": "2222222222", "DATE": "0202", "TIME": "0202"}
+caller3 = {"NAME": "CALLER3", "NMBR": "3333333333", "DATE": "0303", "TIME": "0303"}
+
+
+class SMTPStubHandler(socketserver.StreamRequestHandler):
+    """
+    A minimal SMTP server session that stores the messages it receives.
+    """
+
+    def reply(self, line):
+        self.wfile.write((line + "\r\n").encode())
+
+    def handle(self):
+        server = self.server
+        server.connections += 1
+        self.reply("220 localhost SMTP stub")
+        while True:
+            line = self.rfile.readline().decode().strip()
+            if not line:
+                break
+            verb = line.split(" ")[0].upper()
+            if verb == "EHLO":
+                self.reply("250-localhost")
+                self.reply("250 8BITMIME")
+            elif verb == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                data = b""
+                while not data.endswith(b"\r\n.\r\n"):
+                    data += self.rfile.readline()
+                if server.failures > 0:
+                    server.failures -= 1
+                    self.reply("451 Temporary failure")
+                else:
+                    server.messages.append(data.decode())
+                    self.reply("250 OK")
+            elif verb == "QUIT":
+                self.reply("221 Bye")
+                break
+            else:
+                self.reply("250 OK")
+
+
+class SMTPStub(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), SMTPStubHandler)
+        self.connections = 0
+        self.failures = 0
+        self.messages = []
+
+
+@pytest.fixture
+def smtp_server():
+    server = SMTPStub()
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def config(smtp_server):
+    config = Config()
+    config["EMAIL_ENABLE"] = True
+    config["EMAIL_SERVER"] = "127.0.0.1"
+    config["EMAIL_PORT"] = smtp_server.server_address[1]
+    config["EMAIL_SECURITY"] = "NONE"
+    config["EMAIL_SERVER_USERNAME"] = ""
+    config["EMAIL_FROM"] = "callattendant@localhost"
+    config["EMAIL_TO"] = "user@localhost"
+    return config
+
+
+def wait_for_delivery(email, timeout=10):
+    deadline = time.time() + timeout
+    while email.get_pending_count() > 0 and time.time() < deadline:
+        time.sleep(0.05)
+    return email.get_pending_count() == 0
+
+
+def test_burst_reuses_session(smtp_server, config):
+    db = database.connect(":memory:")
+    email = EmailNotifier(db, config)
+    try:
+        for caller in (caller1, caller2, caller3):
+            email.queue(caller, "message.wav")
+        assert wait_for_delivery(email)
+    finally:
+        email.stop()
+
+    assert len(smtp_server.messages) == 3
+    assert "Voicemail message received from: 1111111111" in smtp_server.messages[0]
+    assert smtp_server.connections == 1
+    assert email.emails_sent == 3
+
+
+def test_retry_with_backoff(smtp_server, config, monkeypatch):
+    monkeypatch.setattr(notifier, "RETRY_DELAY", 0.2)
+    smtp_server.failures = 1
+
+    db = database.connect(":memory:")
+    email = EmailNotifier(db, config)
+    try:
+        email.queue(caller1, "message.wav")
+        assert wait_for_delivery(email)
+    finally:
+        email.stop()
+
+    assert len(smtp_server.messages) == 1
+    attempts, status, error = db.execute("SELECT Attempts, Status, LastError FROM EmailOutbox").fetchone()
+    assert attempts == 2
+    assert status == "sent"
+    assert "Temporary failure" in error
+
+
+def test_gives_up_after_max_attempts(smtp_server, config, monkeypatch):
+    monkeypatch.setattr(notifier, "RETRY_DELAY", 0.1)
+    smtp_server.failures = 10
+    config["EMAIL_MAX_ATTEMPTS"] = 2
+
+    db = database.connect(":memory:")
+    email = EmailNotifier(db, config)
+    try:
+        email.queue(caller1, "message.wav")
+        assert wait_for_delivery(email)
+    finally:
+        email.stop()
+
+    assert smtp_server.messages == []
+    assert db.execute("SELECT Status FROM EmailOutbox").fetchone()[0] == "failed"
+
+
+def test_digest(smtp_server, config):
+    config["EMAIL_DIGEST_DELAY"] = 0.5
+
+    db = database.connect(":memory:")
+    email = EmailNotifier(db, config)
+    try:
+        for caller in (caller1, caller2, caller3):
+            email.queue(caller, "message.wav")
+        assert wait_for_delivery(email)
+    finally:
+        email.stop()
+
+    assert len(smtp_server.messages) == 1
+    assert "3 voicemail messages received" in smtp_server.messages[0]
+    assert "CALLER3" in smtp_server.messages[0]
+
+
+def test_pending_survive_restart(config):
+    # An unreachable server leaves the notification in the outbox
+    config["EMAIL_PORT"] = 1
+    db = database.connect(":memory:")
+    email = EmailNotifier(db, config)
+    email.queue(caller1, "message.wav")
+    time.sleep(0.5)
+    email.stop()
+    assert email.get_pending_count() == 1
+
+
+def test_errors_do_not_stop_sender(smtp_server, config, monkeypatch):
+    monkeypatch.setattr(notifier, "RETRY_DELAY", 0.1)
+    # An incomplete configuration fails the first attempt
+    config["EMAIL_TO"] = None
+
+    db = database.connect(":memory:")
+    email = EmailNotifier(db, config)
+    get_due = email._get_due
+    failures = []
+
+    def failing_get_due(now):
+        # A database error on the first check
+        if not failures:
+            failures.append(now)
+            raise sqlite3.OperationalError("database is locked")
+        return get_due(now)
+
+    monkeypatch.setattr(email, "_get_due", failing_get_due)
+    try:
+        email.queue(caller1, "message.wav")
+        deadline = time.time() + 10
+        while db.execute("SELECT Attempts FROM EmailOutbox").fetchone()[0] == 0 and time.time() < deadline:
+            time.sleep(0.05)
+        config["EMAIL_TO"] = "user@localhost"
+        assert wait_for_delivery(email)
+    finally:
+        email.stop()
+
+    assert failures
+    assert len(smtp_server.messages) == 1
+    attempts, error = db.execute("SELECT Attempts, LastError FROM EmailOutbox").fetchone()
+    assert attempts >= 2
+    assert "NoneType" in error
+
+
+def test_held_until_released(smtp_server, config):
+    db = database.connect(":memory:")
+    email = EmailNotifier(db, config)
+    try:
+        outbox_no = email.queue(caller1, "message.wav", hold=True)
+        time.sleep(0.3)
+        assert smtp_server.messages == []
+
+        # Released with the processed file
+        email.release(outbox_no, "message.flac")
+        assert wait_for_delivery(email)
+    finally:
+        email.stop()
+
+    assert len(smtp_server.messages) == 1
+    assert db.execute("SELECT Filename FROM EmailOutbox").fetchone()[0] == "message.flac"
+
+
+def test_held_released_at_restart(config):
+    config["EMAIL_PORT"] = 1
+    db = database.connect(":memory:")
+    email = EmailNotifier(db, config)
+    email.queue(caller1, "message.wav", hold=True)
+    email.stop()
+    assert email.get_pending_count() == 0
+
+    # The message was being processed when the app stopped: it is sent as is
+    email = EmailNotifier(db, config)
+    email.stop()
+    assert email.get_pending_count() == 1
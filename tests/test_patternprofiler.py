@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#  test_patternprofiler.py
+#
+#  Copyright 2020 Bruce Schubert  <bruce@emxsys.com>
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+
+from callattendant.screening.patternprofiler import compile_patterns, dry_run
+
+CALLS = [
+    (1, "V123456789012345", "8005551212", False),
+    (2, "JOHN DOE", "8005551313", False),
+    (3, "WIRELESS CALLER", "9005550000", False),
+    (4, "V000000000000000", "8005551414", True),
+]
+
+CURRENT = {
+    "blocknames": {"V[0-9]{15}": "Telemarketer Caller ID"},
+    "blocknumbers": {},
+    "permitnames": {},
+    "permitnumbers": {},
+}
+
+
+def test_compile_errors():
+    errors = compile_patterns({"blocknames": {"(unclosed": "Bad"}, "permitnumbers": {"^800": "Good"}})
+    assert len(errors) == 1
+    assert errors[0]["list"] == "blocknames"
+    assert errors[0]["pattern"] == "(unclosed"
+
+    report = dry_run({"blocknames": {"(unclosed": "Bad"}}, CALLS)
+    assert report["errors"]
+    assert report["patterns"] == []
+
+
+def test_dry_run():
+    proposed = dict(CURRENT, blocknumbers={"^900": "Toll numbers"}, permitnames={"doe": "Friends"})
+    report = dry_run(proposed, CALLS, CURRENT)
+    assert not report["errors"]
+    assert report["timed_out"] is None
+
+    matches = {(item["list"], item["pattern"]): item["matches"] for item in report["patterns"]}
+    assert matches == {("blocknames", "V[0-9]{15}"): 2, ("blocknumbers", "^900"): 1, ("permitnames", "doe"): 1}
+
+    # The calls blocked or permitted by the new patterns; call 4 is screened by the lists
+    changes = {change["call_no"]: (change["before"], change["after"]) for change in report["changes"]}
+    assert changes == {2: ("Screened", "Permitted"), 3: ("Screened", "Blocked")}
+    assert report["changed"] == 2
+
+
+def test_dry_run_timeout():
+    calls = [(1, "a" * 40 + "!", "8005551212", False)]
+    report = dry_run({"blocknames": {"^(a+)+$": "Backtracking"}}, calls, timeout=1.0)
+    assert report["timed_out"] == {"list": "blocknames", "pattern": "^(a+)+$"}
+    assert report["elapsed"] < 5
@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#  test_postcall.py
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+
+import threading
+
+from callattendant.config import Config
+from callattendant.postcall import PostCallExecutor
+
+
+def test_tasks_run_after_submit():
+    config = Config()
+    executor = PostCallExecutor(config)
+
+    results = []
+    for n in range(5):
+        assert executor.submit(results.append, n)
+    executor.submit(lambda: 1 / 0)
+    executor.shutdown()
+
+    assert sorted(results) == [0, 1, 2, 3, 4]
+    stats = executor.get_stats()
+    assert stats["submitted"] == 6
+    assert stats["completed"] == 5
+    assert stats["failed"] == 1
+    assert stats["queue_depth"] == 0
+    assert stats["max_latency"] >= stats["avg_latency"] > 0
+
+
+def test_full_queue_runs_inline():
+    config = Config()
+    config["POST_CALL_WORKERS"] = 1
+    config["POST_CALL_QUEUE_SIZE"] = 1
+    executor = PostCallExecutor(config)
+
+    # Block the worker, then fill the queue
+    release = threading.Event()
+    started = threading.Event()
+
+    def blocking_task():
+        started.set()
+        release.wait(5)
+
+    assert executor.submit(blocking_task)
+    assert started.wait(5)
+    assert executor.submit(lambda: None)
+    assert executor.queue_depth == 1
+
+    caller = []
+    assert not executor.submit(lambda: caller.append(threading.current_thread()))
+    assert caller == [threading.current_thread()]
+
+    release.set()
+    executor.shutdown()
+    stats = executor.get_stats()
+    assert stats["ran_inline"] == 1
+    assert stats["completed"] == 3
+    assert stats["max_queue_depth"] == 1
@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#  test_profiling.py
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+
+
+import os
+import subprocess
+import sys
+
+from callattendant.profiling import StartupProfiler
+
+
+def test_phases_and_imports():
+    profiler = StartupProfiler()
+    profiler.mark("ignored")
+    profiler.start()
+    sys.modules.pop("colorsys", None)
+    import colorsys  # noqa: F401
+    profiler.mark("imports")
+    profiler.mark("config")
+    profiler.stop()
+
+    assert [phase for phase, secs in profiler.phases] == ["imports", "config"]
+    cumulative, own = profiler.imports["colorsys"]
+    assert cumulative >= own > 0
+    report = profiler.report()
+    assert "colorsys" in report
+    assert "total" in report
+
+
+def test_app_imports_are_lazy():
+    # The webapp, block services, pygments and e-mail modules are loaded when used
+    appdir = os.path.join(os.path.dirname(os.path.realpath(__file__)), "../callattendant")
+    modules = ("flask", "flask_paginate", "pygments", "requests", "bs4", "gpiozero", "smtplib", "werkzeug")
+    code = "import sys, app; print(','.join(m for m in {!r} if m in sys.modules))".format(modules)
+    result = subprocess.run([sys.executable, "-c", code], cwd=appdir, capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == ""
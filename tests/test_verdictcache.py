@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#  test_verdictcache.py
+#
+#  Permission is hereby granted, free of charge, to any person obtaining a copy
+#  of this software and associated documentation files (the "Software"), to deal
+#  in the Software without restriction, including without limitation the rights
+#  to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#  copies of the Software, and to permit persons to whom the Software is
+#  furnished to do so, subject to the following conditions:
+#
+#  The above copyright notice and this permission notice shall be included in all
+#  copies or substantial portions of the Software.
+#
+#  THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#  IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#  FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#  AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#  LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#  SOFTWARE.
+
+
+import os
+import sqlite3
+import time
+
+import pytest
+
+from callattendant.config import Config
+from callattendant.screening.blacklist import Blacklist
+from callattendant.screening.whitelist import Whitelist
+from callattendant.screening.verdictcache import VerdictCache
+
+caller = {"NAME": "ROBOCALLER", "NMBR": "8005551212", "DATE": "1012", "TIME": "0600"}
+
+
+@pytest.fixture
+def config(tmp_path):
+    config = Config(data_path=str(tmp_path))
+    config.normalize_paths()
+    with open(config["CALLERID_PATTERNS_FILE"], "w") as file:
+        file.write("blocknames: {}\n")
+    return config
+
+
+@pytest.fixture
+def db(config):
+    db = sqlite3.connect(config["DB_FILE"])
+    Whitelist(db, config)
+    Blacklist(db, config)
+    yield db
+    db.close()
+
+
+def test_repeat_caller(db, config):
+    cache = VerdictCache(db, config)
+    assert cache.get(caller) is None
+    cache.put(caller, ("Screened", ""))
+
+    assert cache.get(caller) == ("Screened", "")
+    assert cache.get(dict(caller, NAME="OTHER")) is None
+    assert cache.get_stats() == {"hits": 1, "misses": 2, "invalidations": 0, "entries": 1}
+
+
+def test_expired_verdict(db, config):
+    config["VERDICT_CACHE_TTL"] = 0.01
+    cache = VerdictCache(db, config)
+    cache.put(caller, ("Screened", ""))
+    time.sleep(0.02)
+    assert cache.get(caller) is None
+    assert cache.get_stats()["entries"] == 0
+
+
+def test_disabled(db, config):
+    config["VERDICT_CACHE_TTL"] = 0
+    cache = VerdictCache(db, config)
+    cache.put(caller, ("Screened", ""))
+    assert cache.get(caller) is None
+
+
+def test_list_change_invalidates(db, config):
+    cache = VerdictCache(db, config)
+    cache.put(caller, ("Screened", ""))
+
+    Blacklist(db, config).add_caller(caller, "Robocaller")
+    assert cache.get(caller) is None
+    cache.put(caller, ("Blocked", "Robocaller"))
+    assert cache.get(caller) == ("Blocked", "Robocaller")
+
+    # A change made on another connection, e.g., by the webapp, is detected too
+    webapp_db = sqlite3.connect(config["DB_FILE"])
+    Blacklist(webapp_db, config).remove_number(caller["NMBR"])
+    webapp_db.close()
+    assert cache.get(caller) is None
+    assert cache.get_stats()["invalidations"] == 2
+
+
+def test_patterns_and_flag_invalidate(db, config):
+    cache = VerdictCache(db, config)
+    cache.put(caller, ("Screened", ""))
+
+    with open(config["PERMIT_NEXT_CALL_FLAG"], "w") as file:
+        file.write("Permit")
+    assert cache.get(caller) is None
+
+    cache.put(caller, ("Screened", ""))
+    stat = os.stat(config["CALLERID_PATTERNS_FILE"])
+    os.utime(config["CALLERID_PATTERNS_FILE"], ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000000))
+    assert cache.get(caller) is None
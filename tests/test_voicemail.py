@@ -24,11 +24,14 @@
 #  SOFTWARE.
 
 import os
-import sqlite3
+import queue
+import sys
+import wave
 from tempfile import gettempdir
 
 import pytest
 
+from callattendant import database
 from callattendant.config import Config
 from callattendant.hardware.modem import Modem
 from callattendant.screening.calllogger import CallLogger
@@ -42,7 +45,7 @@ caller = {"NAME": "Bruce", "NMBR": "1234567890", "DATE": "1012", "TIME": "0600"}
 def db():
 
     # Create the test db in RAM
-    db = sqlite3.connect(":memory:")
+    db = database.connect(":memory:")
     return db
 
 
@@ -93,3 +96,59 @@ def test_multiple(voicemail, logger):
     assert count == 1
 
     assert voicemail.delete_message(msg_no)
+
+
+class RecordingModem(object):
+    """Saves a short message instead of recording one from a modem."""
+
+    def record_audio(self, filepath, detect_silence=True):
+        with wave.open(filepath, 'wb') as wf:
+            wf.setnchannels(1)
+            wf.setsampwidth(1)
+            wf.setframerate(8000)
+            wf.writeframes(bytes([64, 192]) * 4000)
+        return True
+
+
+class Outbox(object):
+    """Collects the released e-mail notifications."""
+
+    def __init__(self):
+        self.held = {}
+        self.queued = queue.Queue()
+
+    def queue(self, caller, filepath, hold=False):
+        self.held[len(self.held) + 1] = (caller["NMBR"], filepath)
+        return len(self.held)
+
+    def release(self, outbox_no, filepath=None):
+        number, queued_filepath = self.held.pop(outbox_no)
+        self.queued.put((number, filepath or queued_filepath))
+
+    def stop(self):
+        pass
+
+
+def test_notify_when_processing_fails(tmp_path, monkeypatch):
+    import callattendant.messaging.voicemail as voicemail_module
+    audioprocessor = sys.modules[voicemail_module.AudioProcessor.__module__]
+
+    def analyze_audio(filepath):
+        raise wave.Error("truncated file")
+
+    monkeypatch.setattr(audioprocessor, "analyze_audio", analyze_audio)
+
+    config = Config()
+    config["VOICE_MAIL_MESSAGE_FOLDER"] = str(tmp_path)
+    voicemail = VoiceMail(database.connect(":memory:"), config, RecordingModem())
+    voicemail.notifier = Outbox()
+    try:
+        msg_no = voicemail.record_message(1, caller, detect_silence=False)
+        assert msg_no > 0
+
+        # The owner is notified with the recording as is
+        number, filepath = voicemail.notifier.queued.get(timeout=10)
+        assert number == caller["NMBR"]
+        assert filepath.endswith(".wav") and os.path.exists(filepath)
+    finally:
+        voicemail.stop()
@@ -79,3 +79,270 @@ def test_dashboard(client):
     assert b"Statistics" in response.data
     assert b"Recent Calls" in response.data
     assert b"Calls per Day" in response.data
+
+
+def test_metrics(client):
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert response.mimetype == "text/plain"
+    assert b"callattendant_screening_seconds_count 0" in response.data
+
+
+def test_dashboard_cache(myapp, client, tmp_path, mocker):
+    from callattendant.screening.dataversion import DASHBOARD_TABLES, install_version_triggers
+    from callattendant.userinterface import webapp
+
+    myapp.config['MASTER_CONFIG']["PERMIT_NEXT_CALL_FLAG"] = str(tmp_path / "permitnextcall.flag")
+    with myapp.app_context():
+        install_version_triggers(get_db(), DASHBOARD_TABLES)
+    render = mocker.spy(webapp, "render_dashboard_fragments")
+
+    response = client.get('/')
+    assert response.status_code == 200
+    assert b"Recent Calls" in response.data
+    assert b"Calls per Day" in response.data
+    first_page = response.data
+
+    # Nothing has changed: the cached content is reused
+    assert client.get('/').data == first_page
+    assert render.call_count == 1
+
+    # A new call is shown on the next view
+    with myapp.app_context():
+        db = get_db()
+        db.execute("""INSERT INTO CallLog(Name, Number, Action, Reason, Date, Time, SystemDateTime)
+            VALUES('NEW CALLER', '8005551212', 'Blocked', '', '01-Jan', '12:00 PM', DATETIME('now'))""")
+        db.commit()
+    response = client.get('/')
+    assert render.call_count == 2
+    assert b"NEW CALLER" in response.data
+
+
+def test_events(client):
+    from callattendant.userinterface.webapp import event_bus
+
+    response = client.get('/events')
+    assert response.status_code == 200
+    assert response.mimetype == "text/event-stream"
+    stream = response.response
+    assert next(stream) == b"retry: 5000\n\n"
+
+    event = event_bus.publish("call", {"call_no": 1, "name": "CALLER", "number": "8005551212",
+                                       "action": "Blocked", "reason": "", "date_time": "2026-01-01 12:00:00"})
+    chunk = next(stream).decode()
+    assert chunk.startswith("id: {}\nevent: call\ndata: ".format(event.id))
+    assert '"phone_no": "800-555-1212"' in chunk
+    response.close()
+    assert event_bus.subscriber_count == 0
+
+
+def test_events_limit(client):
+    from callattendant.userinterface.webapp import event_bus
+
+    app.config["MAX_EVENT_STREAMS"] = 1
+    try:
+        response = client.get('/events')
+        assert next(response.response) == b"retry: 5000\n\n"
+
+        # A surplus stream is told to retry later
+        surplus = client.get('/events')
+        assert surplus.data == b"retry: 30000\n\n"
+
+        # Closing the subscriptions ends the stream
+        event_bus.close_subscriptions()
+        with pytest.raises(StopIteration):
+            next(response.response)
+        response.close()
+    finally:
+        app.config.pop("MAX_EVENT_STREAMS")
+
+
+@pytest.mark.parametrize("server_type", ["waitress", "werkzeug"])
+def test_webserver(myapp, server_type):
+    import threading
+    import urllib.request
+    from callattendant.userinterface.webapp import WebServer
+
+    if server_type == "waitress":
+        pytest.importorskip("waitress")
+
+    config = {"HOST": "127.0.0.1", "PORT": 0, "WEBAPP_SERVER": server_type,
+              "WEBAPP_WORKERS": 4, "WEBAPP_TIMEOUT": 10}
+    server = WebServer(config)
+    server.start()
+    url = "http://127.0.0.1:{}".format(server.port)
+    try:
+        # An open event stream does not block the other requests
+        stream = urllib.request.urlopen(url + "/events", timeout=10)
+        assert stream.readline() == b"retry: 5000\n"
+
+        statuses = []
+
+        def get_calls():
+            with urllib.request.urlopen(url + "/calls", timeout=10) as response:
+                statuses.append(response.status)
+
+        threads = [threading.Thread(target=get_calls) for n in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert statuses == [200] * 4
+    finally:
+        server.stop()
+
+    # The event stream was ended and the server thread has exited
+    assert stream.read() == b"\n"
+    stream.close()
+    assert not server._thread.is_alive()
+
+
+def test_message_audio(client, tmp_path):
+    audio = bytes(range(256)) * 40
+    (tmp_path / "1_8005551212_TEST_010126_1200.wav").write_bytes(audio)
+    app.config["MASTER_CONFIG"]["VOICE_MAIL_MESSAGE_FOLDER"] = str(tmp_path)
+    with app.app_context():
+        db = get_db()
+        cur = db.execute("""INSERT INTO Message(CallLogID, Played, Filename, DateTime, FileSize)
+            VALUES(1, 0, '/old/path/1_8005551212_TEST_010126_1200.wav', '2026-01-01 12:00:00', ?)""",
+                         (len(audio),))
+        msg_no = cur.lastrowid
+        db.commit()
+
+    url = "/messages/audio/{}".format(msg_no)
+    response = client.get(url)
+    assert response.status_code == 200
+    assert response.mimetype == "audio/wav"
+    assert response.data == audio
+    assert "no-cache" in response.headers["Cache-Control"]
+    etag = response.headers["ETag"]
+
+    # Seeking requests a byte range
+    response = client.get(url, headers={"Range": "bytes=100-199"})
+    assert response.status_code == 206
+    assert response.data == audio[100:200]
+
+    # A cached copy is revalidated without resending the audio
+    response = client.get(url, headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.data == b""
+
+    # The versioned URL is cached for good
+    response = client.get("{}?v={}".format(url, len(audio)))
+    assert "immutable" in response.headers["Cache-Control"]
+
+    # The compact variant falls back to the wav file
+    response = client.get(url + "?variant=compact")
+    assert response.mimetype == "audio/wav"
+
+    assert client.get("/messages/audio/9999").status_code == 404
+
+
+def test_settings_cache(myapp, client, tmp_path, mocker):
+    from callattendant.config import Config
+    from callattendant.userinterface import webapp
+
+    config_file = tmp_path / "app.cfg"
+    config_file.write_text('EMAIL_SERVER_PASSWORD = "secret"\nPORT = 5000\n')
+    config = Config(data_path=str(tmp_path))
+    config.update(myapp.config['MASTER_CONFIG'])
+    config["CONFIG_FILE"] = "app.cfg"
+    config["EMAIL_SERVER_PASSWORD"] = "secret"
+    myapp.config['MASTER_CONFIG'] = config
+    render = mocker.spy(webapp, "render_settings")
+
+    response = client.get('/settings')
+    assert response.status_code == 200
+    assert b"secret" not in response.data
+    assert config["EMAIL_SERVER_PASSWORD"] == "secret"
+
+    # Nothing has changed: the highlighted settings are reused
+    client.get('/settings')
+    assert render.call_count == 1
+
+    # A changed setting or config file is shown on the next view
+    config["PORT"] = 5001
+    client.get('/settings')
+    assert render.call_count == 2
+    config_file.write_text('PORT = 5002\n')
+    os.utime(config_file, ns=(0, 0))
+    assert b"5002" in client.get('/settings').data
+    assert render.call_count == 3
+
+
+def test_precompile_templates(tmp_path):
+    from callattendant.config import Config
+    from callattendant.userinterface import webapp
+
+    config = Config(data_path=str(tmp_path))
+    webapp.configure(config)
+    try:
+        app.jinja_env.cache.clear()
+        assert webapp.precompile_templates() > 10
+        assert os.listdir(str(tmp_path / webapp.TEMPLATE_CACHE_FOLDER))
+    finally:
+        app.jinja_env.bytecode_cache = None
+
+
+def test_static_fingerprint(client):
+    from flask import url_for
+
+    with app.test_request_context():
+        url = url_for('static', filename='css/callattendant.css')
+    assert "?v=" in url
+
+    response = client.get(url)
+    assert response.status_code == 200
+    assert "immutable" in response.headers["Cache-Control"]
+    response.close()
+
+    # A stale fingerprint is not cached for good
+    response = client.get('/static/css/callattendant.css?v=0123456789ab')
+    assert "immutable" not in response.headers.get("Cache-Control", "")
+    response.close()
+
+
+def test_compression(client):
+    import gzip
+
+    response = client.get('/calls', headers={"Accept-Encoding": "gzip"})
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert "Accept-Encoding" in response.headers["Vary"]
+    assert b"Call Log" in gzip.decompress(response.data)
+
+    response = client.get('/callers/blocked/export', headers={"Accept-Encoding": "gzip"})
+    assert response.mimetype == "text/csv"
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert gzip.decompress(response.data).startswith(b"PhoneNo,Name,Reason")
+
+    response = client.get('/calls')
+    assert "Content-Encoding" not in response.headers
+
+
+def test_regexlists_dryrun(myapp, client):
+    myapp.config['MASTER_CONFIG']["CALLERID_PATTERNS"] = {
+        "blocknames": {}, "blocknumbers": {}, "permitnames": {}, "permitnumbers": {}}
+    form = {"blocknameslist": "V[0-9]{15}: Telemarketer\n", "blocknumberslist": "",
+            "permitnameslist": "", "permitnumberslist": ""}
+    report = client.post('/callers/regexlists/dryrun', data=form).get_json()
+    assert report["errors"] == []
+    assert report["patterns"][0]["pattern"] == "V[0-9]{15}"
+    assert report["calls"] > 0
+
+    # An invalid regex is not saved
+    form["blocknameslist"] = "(unclosed: Bad\n"
+    response = client.post('/callers/regexlists/save', data=form)
+    assert response.data.startswith(b"error:")
+
+
+def test_messages_waveform(client):
+    with app.app_context():
+        db = get_db()
+        db.execute("""INSERT INTO Message(CallLogID, Played, Filename, DateTime, Duration, Peak, RMS, Waveform)
+            VALUES(1, 0, 'message.wav', '2026-01-01 12:00:00', 65.0, 0.5, 0.1, '0,50,100')""")
+        db.commit()
+    response = client.get('/messages')
+    assert response.status_code == 200
+    assert b'aria-label="Waveform"' in response.data
+    assert b"1:05" in response.data
+    assert b"-20 dB" in response.data